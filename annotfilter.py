@@ -0,0 +1,382 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from re import compile as re_compile, error as re_error, escape, IGNORECASE
+
+from PyQt5.QtCore import Qt, QAbstractProxyModel, QModelIndex
+
+from numpy import int64, iinfo, array, arange, full, zeros, where, ones, concatenate, flatnonzero, isin, lexsort, searchsorted, insert
+from pandas import factorize
+
+from annotio import annothdg
+from timecode import timecols
+
+# Sort key of empty times, which sort last
+nokey = iinfo(int64).max
+
+# Rows changed at once up to which they are merged into the view order one by one. Above it, the order is re-sorted
+mergelimit = 64
+
+class AnnotationFilterProxy(QAbstractProxyModel):
+    # Filters and sorts annotation rows for the table view, without copying them. Rows are filtered on label (exact,
+    # prefix or regex, ignoring case), on overlap with a time range and on validation status, and sorted on any
+    # column. Rows shown are held as an array of source rows in view order, with the view row of each source row.
+    # Labels are matched once per distinct label, and sort keys are held per column, so that edits only recheck and
+    # move the rows they change
+    def __init__(self, parent=None):
+        super(AnnotationFilterProxy, self).__init__(parent)
+
+        # Filters. Empty label text, or a time bound of None, does not filter
+        self.labelmode = "exact"
+        self.labeltext = ""
+        self.start, self.end = None, None
+        self.status = "all"
+
+        # Sort column, or -1 for table order
+        self.sortcol, self.sortorder = -1, Qt.AscendingOrder
+
+        # Label ranks and video files ranked, which sort keys of labels and video files are ranks in
+        self.labelranks = None
+        self.videofiles = zeros(0, dtype=object)
+
+        # Label filter result per label id of the source registry, extended as labels are registered
+        self.labelmatch = None
+        self.labelmask = zeros(0, dtype=bool)
+
+        # Sort keys per column, filter result per source row, source rows in view order and view row per source row
+        self.keys = {}
+        self.accepted = zeros(0, dtype=bool)
+        self.rows = arange(0)
+        self.position = arange(0)
+
+        # Proxy signal started before source rows are removed, finished once they are
+        self.removing = None
+
+    def setSourceModel(self, model):
+        self.beginResetModel()
+        super(AnnotationFilterProxy, self).setSourceModel(model)
+
+        model.dataChanged.connect(self._on_data_changed)
+        model.rowsInserted.connect(self._on_rows_inserted)
+        model.rowsAboutToBeRemoved.connect(self._on_rows_about_to_be_removed)
+        model.rowsRemoved.connect(self._on_rows_removed)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._on_model_reset)
+
+        self._rebuild()
+        self.endResetModel()
+
+    # Proxy model interface
+
+    def index(self, row, col, parent=QModelIndex()):
+        if parent.isValid() or (not 0 <= row < len(self.rows)) or (not 0 <= col < self.columnCount()):
+            return QModelIndex()
+
+        return self.createIndex(row, col)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if (parent.isValid() or self.sourceModel() is None) else self.sourceModel().columnCount()
+
+    def mapToSource(self, index):
+        if (not index.isValid()) or (index.row() >= len(self.rows)):
+            return QModelIndex()
+
+        return self.sourceModel().index(int(self.rows[index.row()]), index.column())
+
+    def mapFromSource(self, index):
+        if (not index.isValid()) or (index.row() >= len(self.position)) or (self.position[index.row()] < 0):
+            return QModelIndex()
+
+        return self.index(int(self.position[index.row()]), index.column())
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        # Rows are numbered as in the table, so that filtered and sorted rows can be told apart
+        if (orientation == Qt.Vertical) & (role == Qt.DisplayRole) & (0 <= section < len(self.rows)):
+            return str(int(self.rows[section]) + 1)
+
+        return self.sourceModel().headerData(section, orientation, role)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Columns other than annotation columns restore table order
+        self.sortcol = column if 0 <= column < len(annothdg) else -1
+        self.sortorder = order
+        self._relayout(self._order(flatnonzero(self.accepted)))
+
+    # Filters
+
+    def set_label_filter(self, text, mode="exact"):
+        # Filters on label equal to, starting with, or matching text as a regex, ignoring case. Returns False if regex
+        # is invalid, in which case the filter is unchanged
+        text = text.strip()
+
+        if (mode == "regex") & (text != ""):
+            try:
+                re_compile(text)
+            except re_error:
+                return False
+
+        self.labeltext, self.labelmode = text, mode
+        self.labelmatch = None
+        self.labelmask = zeros(0, dtype=bool)
+        self._refilter()
+        return True
+
+    def set_time_filter(self, start=None, end=None):
+        # Keeps rows overlapping start to end, in ms. Rows with empty times are dropped once a bound is set
+        self.start, self.end = start, end
+        self._refilter()
+
+    def set_status_filter(self, status="all"):
+        # "all", "issues" for rows failing validation, or "valid" for rows passing it
+        self.status = status
+        self._refilter()
+
+    def source_rows(self, first, last):
+        # Returns source rows of view rows first to last
+        return self.rows[first:last+1]
+
+    def view_rows(self, rows):
+        # Returns view row of each source row, or -1 if it is filtered out
+        return self.position[rows]
+
+    def shows_all(self):
+        # Returns True if every row is shown, in table order
+        return (self.sortcol == -1) & (len(self.rows) == self.sourceModel().rowCount())
+
+    # Sort keys and filter results
+
+    def _sort_keys(self, col, rows=None):
+        # Returns sort key of rows, or of all rows if None. Keys of times are themselves, of labels their rank in the
+        # label registry and of video files their rank among the video files in the table. Returns None if rows hold a
+        # label or video file not ranked yet, as all keys of the column then need to be ranked again
+        annot = self.sourceModel().annot
+
+        if annothdg[col] in timecols:
+            # Copied, as keys are updated in place and times without gaps would otherwise share memory with the table
+            values = annot.iloc[:, col] if rows is None else annot.iloc[rows, col]
+            return values.to_numpy(dtype=int64, na_value=nokey, copy=True)
+
+        if annothdg[col] == "label":
+            ranks = self.sourceModel().registry.sort_keys()
+            if rows is None:
+                self.labelranks = ranks
+            elif ranks is not self.labelranks:
+                return None
+
+            codes = annot["label"].cat.codes.to_numpy(dtype=int64)
+            return ranks[(codes if rows is None else codes[rows]).clip(0)]
+
+        if rows is None:
+            codes, uniques = factorize(annot.iloc[:, col], sort=True)
+            self.videofiles = uniques.to_numpy(dtype=object)
+            return where(codes >= 0, codes, nokey).astype(int64)
+
+        values = annot.iloc[rows, col]
+        known = values.notna().to_numpy()
+        values = values[known].to_numpy(dtype=object)
+        ranks = searchsorted(self.videofiles, values).clip(0, max(len(self.videofiles) - 1, 0))
+        if (len(self.videofiles) == 0) & (len(values) > 0) or (self.videofiles[ranks] != values).any():
+            return None
+
+        keys = full(len(known), nokey, dtype=int64)
+        keys[known] = ranks
+        return keys
+
+    def _update_keys(self, cols, rows):
+        # Keys of rows are updated in place, unless the column needs to be ranked again
+        for col in cols:
+            keys = self._sort_keys(col, rows)
+            if keys is None:
+                self.keys[col] = self._sort_keys(col)
+            else:
+                self.keys[col][rows] = keys
+
+    def _label_mask(self):
+        # Returns label filter result per label id. Labels registered since the last call are matched now
+        labels = self.sourceModel().registry.labels
+
+        if len(self.labelmask) < len(labels):
+            if self.labelmatch is None:
+                text = self.labeltext if self.labelmode == "regex" else escape(self.labeltext)
+                self.labelmatch = re_compile({"exact" : r"\A%s\Z", "prefix" : r"\A%s"}.get(self.labelmode, "%s") %text, IGNORECASE)
+
+            matched = [self.labelmatch.search(label) is not None for label in labels[len(self.labelmask):]]
+            self.labelmask = concatenate((self.labelmask, array(matched, dtype=bool)))
+
+        return self.labelmask
+
+    def _accept(self, rows=None):
+        # Returns filter result of rows, or of all rows if None
+        model = self.sourceModel()
+        annot = model.annot
+        rows = arange(annot.shape[0]) if rows is None else rows
+        accepted = ones(len(rows), dtype=bool)
+
+        if self.labeltext != "":
+            # Empty labels are label 0, the empty string
+            codes = annot["label"].cat.codes.to_numpy(dtype=int64)[rows]
+            accepted &= self._label_mask()[codes.clip(0)]
+
+        if self.start is not None:
+            accepted &= annot["end_time"].to_numpy(dtype=int64, na_value=-1)[rows] >= self.start
+
+        if self.end is not None:
+            accepted &= annot["start_time"].to_numpy(dtype=int64, na_value=nokey)[rows] <= self.end
+
+        if self.status != "all":
+            issues = isin(rows, list(model.issues))
+            accepted &= issues if self.status == "issues" else ~issues
+
+        return accepted
+
+    # View order
+
+    def _order(self, rows):
+        # Returns source rows in view order. Rows with the same key keep table order
+        if self.sortcol == -1:
+            return rows
+
+        keys = self.keys[self.sortcol][rows]
+        keys = keys if self.sortorder == Qt.AscendingOrder else -keys
+        return rows[lexsort((rows, keys))]
+
+    def _merge(self, kept, added):
+        # Returns rows of kept, already in view order, with rows of added put in their place. Few rows are put in one by
+        # one, which costs a binary search each instead of sorting every row again
+        if (len(added) > mergelimit) | (len(kept) == 0):
+            return self._order(concatenate((kept, added)))
+
+        added = self._order(added)
+        if self.sortcol == -1:
+            return insert(kept, searchsorted(kept, added), added)
+
+        sign = 1 if self.sortorder == Qt.AscendingOrder else -1
+        keys = sign * self.keys[self.sortcol][kept]
+        places = []
+        for row in added.tolist():
+            key = sign * self.keys[self.sortcol][row]
+            lo, hi = searchsorted(keys, key, "left"), searchsorted(keys, key, "right")
+            places.append(lo + searchsorted(kept[lo:hi], row))
+
+        return insert(kept, places, added)
+
+    def _set_rows(self, rows):
+        self.rows = rows
+        self.position = full(len(self.accepted), -1, dtype=int64)
+        self.position[rows] = arange(len(rows))
+
+    def _rebuild(self):
+        ncols = len(annothdg)
+        self.keys = {col : self._sort_keys(col) for col in range(ncols)}
+        self.accepted = self._accept()
+        self._set_rows(self._order(flatnonzero(self.accepted)))
+
+    def _refilter(self):
+        # Filter changes can show or hide any row, so views are reset. Sort keys are kept
+        self.beginResetModel()
+        self.accepted = self._accept()
+        self._set_rows(self._order(flatnonzero(self.accepted)))
+        self.endResetModel()
+
+    def _relayout(self, rows):
+        # Moves rows shown to a new order. Views keep their current and selected cells on the rows they were on
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        sources = [(int(self.rows[index.row()]), index.column()) for index in persistent]
+
+        self._set_rows(rows)
+
+        self.changePersistentIndexList(persistent, [self.index(int(self.position[row]), col) if self.position[row] >= 0 else QModelIndex()
+                                                    for row, col in sources])
+        self.layoutChanged.emit()
+
+    # Source model changes. Only the rows changed are rechecked
+
+    def _on_data_changed(self, topleft, bottomright, roles=[]):
+        rows = arange(topleft.row(), bottomright.row() + 1)
+        cols = range(topleft.column(), min(bottomright.column(), len(annothdg) - 1) + 1)
+        edited = (len(roles) == 0) | (Qt.DisplayRole in roles) | (Qt.EditRole in roles)
+
+        if edited:
+            self._update_keys(cols, rows)
+
+        accepted = self._accept(rows)
+        moved = accepted != self.accepted[rows]
+        if edited & (self.sortcol in cols):
+            moved |= accepted
+        self.accepted[rows] = accepted
+
+        moved = rows[moved]
+        if len(moved) > 0:
+            kept = self.rows[~isin(self.rows, moved)]
+            self._relayout(self._merge(kept, moved[self.accepted[moved]]))
+
+        shown = self.position[rows]
+        shown = shown[shown >= 0]
+        if len(shown) > 0:
+            self.dataChanged.emit(self.index(int(shown.min()), topleft.column()), self.index(int(shown.max()), bottomright.column()), roles)
+
+    def _on_rows_inserted(self, parent, first, last):
+        count = last - first + 1
+        newrows = arange(first, last + 1)
+
+        for col in self.keys:
+            self.keys[col] = insert(self.keys[col], first, zeros(count, dtype=int64))
+        self._update_keys(self.keys, newrows)
+        self.accepted = insert(self.accepted, first, self._accept(newrows))
+
+        kept = self.rows + count * (self.rows >= first)
+        rows = self._merge(kept, newrows[self.accepted[newrows]])
+        shown = flatnonzero(isin(rows, newrows))
+
+        if len(shown) == 0:
+            self._set_rows(rows)
+        elif shown[-1] - shown[0] + 1 == len(shown):
+            self.beginInsertRows(QModelIndex(), int(shown[0]), int(shown[-1]))
+            self._set_rows(rows)
+            self.endInsertRows()
+        else:
+            self.beginResetModel()
+            self._set_rows(rows)
+            self.endResetModel()
+
+    def _on_rows_about_to_be_removed(self, parent, first, last):
+        shown = self.position[first:last+1]
+        shown = shown[shown >= 0]
+
+        if len(shown) == 0:
+            self.removing = None
+        elif shown.max() - shown.min() + 1 == len(shown):
+            self.removing = "rows"
+            self.beginRemoveRows(QModelIndex(), int(shown.min()), int(shown.max()))
+        else:
+            self.removing = "reset"
+            self.beginResetModel()
+
+    def _on_rows_removed(self, parent, first, last):
+        count = last - first + 1
+        kept = ones(len(self.accepted), dtype=bool)
+        kept[first:last+1] = False
+
+        self.accepted = self.accepted[kept]
+        for col in self.keys:
+            self.keys[col] = self.keys[col][kept]
+
+        rows = self.rows[(self.rows < first) | (self.rows > last)]
+        self._set_rows(rows - count * (rows > last))
+
+        if self.removing == "rows":
+            self.endRemoveRows()
+        elif self.removing == "reset":
+            self.endResetModel()
+        self.removing = None
+
+    def _on_model_reset(self):
+        self._rebuild()
+        self.endResetModel()
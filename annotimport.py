@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from threading import Thread, Event
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from numpy import uint64, empty, concatenate, searchsorted, minimum, sort
+from pandas.util import hash_pandas_object
+
+from annotio import annothdg, annotdtypes, read_table_chunks
+from timecode import decode_time_columns
+
+class RowDeduplicator:
+    # Drops rows already passed on in an earlier chunk, or earlier in the same chunk. Rows of earlier chunks are
+    # compared by 64-bit hash, held sorted, so each chunk is checked with one binary search whatever the rows before it
+    def __init__(self):
+        self.seen = empty(0, dtype=uint64)
+
+    def drop(self, chunk):
+        # Returns new rows of chunk and number of rows dropped
+        hashes = hash_pandas_object(chunk, index=False).to_numpy()
+        keep = ~chunk.duplicated().to_numpy()
+
+        if len(self.seen) > 0:
+            keep &= self.seen[minimum(searchsorted(self.seen, hashes), len(self.seen) - 1)] != hashes
+
+        self.seen = sort(concatenate((self.seen, hashes[keep])))
+        return chunk[keep].reset_index(drop=True), int((~keep).sum())
+
+class AnnotationImporter(QObject):
+    # Reads an annotation file in chunks on a background thread. Times are converted to ms, labels stripped and
+    # duplicate rows dropped chunk by chunk, so each chunk can be shown as soon as it is read. Signals carry the number
+    # of the import they belong to and are queued to the GUI thread, so chunks of a cancelled import can be told apart
+    chunkRead = pyqtSignal(int, object, float)
+    finished = pyqtSignal(int, int, int)
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, chunksize=50000, parent=None):
+        super(AnnotationImporter, self).__init__(parent)
+        self.chunksize = chunksize
+        self.job = 0
+        self.stopped = Event()
+
+    def start(self, fpath, fps=None):
+        # Cancels import running, if any. Returns number of new import
+        self.cancel()
+        self.job += 1
+        self.stopped = Event()
+        Thread(target=self._run, args=(self.job, fpath, fps, self.stopped), daemon=True).start()
+        return self.job
+
+    def cancel(self):
+        # Import stops before its next chunk
+        self.stopped.set()
+
+    def _run(self, job, fpath, fps, stopped):
+        deduplicator = RowDeduplicator()
+        invalid, duplicates = 0, 0
+
+        try:
+            for chunk, progress in read_table_chunks(fpath, annothdg, self.chunksize):
+                if stopped.is_set():
+                    return
+
+                invalid += decode_time_columns(chunk, fps)
+                chunk["label"] = chunk["label"].str.strip()
+                chunk, dropped = deduplicator.drop(chunk.astype(annotdtypes))
+                duplicates += dropped
+
+                self.chunkRead.emit(job, chunk, progress)
+        except (ValueError, OSError) as error:
+            self.failed.emit(job, str(error))
+            return
+
+        if not stopped.is_set():
+            self.finished.emit(job, invalid, duplicates)
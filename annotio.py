@@ -0,0 +1,92 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from os import fstat, fsync, replace
+from os.path import splitext
+
+from pandas import DataFrame, Series, read_csv, unique
+
+from labelregistry import LabelRegistry
+from timecode import decode_time_columns
+
+# Defines column headings for annotation and label files
+annothdg = ["video_file", "start_time", "end_time", "label"]
+labelhdg = ["label"]
+
+# Defines annotation column types. Times are held as integer milliseconds
+annotdtypes = {"video_file" : object, "start_time" : "Int64", "end_time" : "Int64", "label" : object}
+
+def empty_annot():
+    return DataFrame(columns=annothdg).astype(annotdtypes)
+
+def write_atomic(fpath, text):
+    # Writes text next to fpath and renames it over fpath once it is on disk, so readers see the old or the new file,
+    # never part of one
+    tmpfpath = fpath + ".tmp"
+    with open(tmpfpath, "w", encoding="utf-8", newline="") as file:
+        file.write(text)
+        file.flush()
+        fsync(file.fileno())
+
+    replace(tmpfpath, fpath)
+
+def table_columns(fpath, req_hdg):
+    # Reads header of csv file and returns the file's names of required columns. Raises ValueError with a message for
+    # the user if file cannot be used
+    if splitext(fpath)[-1] != ".csv":
+        raise ValueError("Please input a csv file.")
+
+    columns = read_csv(fpath, dtype=str, nrows=0).columns.tolist()
+    names = {}
+    for column in columns:
+        names.setdefault(column.lower().strip(), column)
+
+    missing_columns = [hdg for hdg in req_hdg if hdg not in names]
+    if len(missing_columns) > 0:
+        raise ValueError("The following columns are missing from the file uploaded:\n\n%s" %("\n".join(missing_columns)))
+
+    return [names[hdg] for hdg in req_hdg]
+
+def read_table(fpath, req_hdg):
+    # Reads csv file and returns required columns as text. Raises ValueError with a message for the user if file cannot be used
+    usecols = table_columns(fpath, req_hdg)
+
+    df = read_csv(fpath, usecols=usecols, dtype=dict.fromkeys(usecols, str), na_filter=False)[usecols]
+    df.columns = req_hdg
+    return df
+
+def read_table_chunks(fpath, req_hdg, chunksize=50000):
+    # Reads required columns of csv file as text, chunksize rows at a time. Yields each chunk with the share of the
+    # file read so far. Only required columns are parsed, and empty cells are kept as empty text
+    usecols = table_columns(fpath, req_hdg)
+
+    with open(fpath, "rb") as file:
+        size = max(fstat(file.fileno()).st_size, 1)
+        chunks = read_csv(file, usecols=usecols, dtype=dict.fromkeys(usecols, str), na_filter=False, chunksize=chunksize)
+
+        for chunk in chunks:
+            chunk = chunk[usecols]
+            chunk.columns = req_hdg
+            yield chunk, min(file.tell() / size, 1.0)
+
+def normalize_annot(df, fps=None):
+    # Converts times to ms, removes leading and trailing whitespaces from labels and removes duplicate rows.
+    # Returns annotations and number of times that could not be read
+    invalid = decode_time_columns(df, fps)
+    df["label"] = df["label"].fillna("").astype(str).str.strip()
+
+    return df.drop_duplicates().reset_index(drop=True), invalid
+
+def normalize_labels(df):
+    # Returns labels without leading and trailing whitespaces. Only first of labels differing in case is kept
+    labels = df["label"].fillna("").astype(str).str.strip()
+    return labels[~labels.str.casefold().duplicated()].tolist()
+
+def missing_labels(annotlabels, labels):
+    # Returns labels in annotations that are not in label list, ignoring case. First spelling of each is kept.
+    # Only distinct labels are compared, so this is as quick for a million rows as for the few labels they use
+    known = LabelRegistry([str(label) for label in labels])
+    annotlabels = Series(unique(Series(annotlabels)), dtype=object).dropna().astype(str)
+
+    missing = annotlabels[(annotlabels != "") & (annotlabels != "nan") & (known.lookup(annotlabels) < 0)]
+    return missing[~missing.str.casefold().duplicated()].tolist()
@@ -0,0 +1,395 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QAbstractListModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QColor
+
+from numpy import int64, array, asarray, zeros, ones, maximum, cumsum, argsort, concatenate, flatnonzero
+from pandas import DataFrame, Categorical, concat, isna
+
+from annotio import annothdg, labelhdg, annotdtypes, empty_annot
+from intervals import IntervalIndex
+from labelregistry import LabelRegistry
+from labelsearch import LabelSearch
+from journal import jsonable
+from timecode import timecols, format_timecode
+from validation import check_annotations, check_rows
+
+# Background colours of rows containing the playhead, and of cells failing validation
+activecolor = QColor("LemonChiffon")
+issuecolor = QColor("LightPink")
+
+def _ms(value):
+    return None if isna(value) else int(value)
+
+class AnnotationTableModel(QAbstractTableModel):
+    # Emitted when a cell is edited in the view. Annotations are updated by the receiver
+    editRequested = pyqtSignal(int, int, str)
+
+    # Emitted after every mutation
+    annotChanged = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(AnnotationTableModel, self).__init__(parent)
+
+        # Labels are held as a categorical over every label seen, so each row holds an id instead of a string
+        self.registry = LabelRegistry([""])
+        self.annot = self._typed(empty_annot())
+
+        # Display format of times. Chosen when cells are drawn, as times are held in ms
+        self.timeformat = "auto"
+        self.fps = None
+
+        # Edit journal for crash recovery, and annotation store. Every mutation is recorded in each when set
+        self.journal = None
+        self.store = None
+
+        # Index of row times, kept up to date by every mutation. Rows containing the playhead are highlighted
+        self.intervals = IntervalIndex()
+        self.activerows = set()
+
+        # Validation issues as {row: {col: message}}. Rows edited since the last pass are rechecked, or all rows if None
+        self.issues = {}
+        self.dirtyrows = set()
+
+        # Cells cannot be edited while set, e.g. while an import is being read
+        self.readonly = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.annot.shape[0]
+
+    def columnCount(self, parent=QModelIndex()):
+        # Last column holds the delete buttons
+        return 0 if parent.isValid() else len(annothdg) + 1
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+
+        if orientation == Qt.Horizontal:
+            return (annothdg + [""])[section]
+
+        return str(section + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        if (index.column() < len(annothdg)) & (not self.readonly):
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if (not index.isValid()) or (index.column() >= len(annothdg)):
+            return None
+
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.text(index.row(), index.column())
+
+        issue = self.issues.get(index.row(), {}).get(index.column())
+
+        if role == Qt.ToolTipRole:
+            return issue
+
+        if (role == Qt.BackgroundRole) and (issue is not None):
+            return issuecolor
+
+        if (role == Qt.BackgroundRole) and (index.row() in self.activerows):
+            return activecolor
+
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if (role != Qt.EditRole) or (not index.isValid()) or (index.column() >= len(annothdg)):
+            return False
+
+        self.editRequested.emit(index.row(), index.column(), str(value))
+        return True
+
+    def text(self, row, col):
+        value = self.annot.iat[row, col]
+
+        if annothdg[col] in timecols:
+            return format_timecode(value, self.timeformat, self.fps)
+
+        return "" if isna(value) else str(value)
+
+    def set_time_format(self, timeformat, fps=None):
+        self.timeformat, self.fps = timeformat, fps
+
+        if self.rowCount() > 0:
+            self.dataChanged.emit(self.index(0, 1), self.index(self.rowCount()-1, 2))
+
+    def times(self, row):
+        # Returns start and end time of row in ms, or None if empty
+        return _ms(self.annot.iat[row, 1]), _ms(self.annot.iat[row, 2])
+
+    def set_active_rows(self, rows):
+        # Highlights rows. Only rows whose highlight changes are repainted. Returns True if any changed
+        rows = set(map(int, rows))
+        changed = rows ^ self.activerows
+        self.activerows = rows
+
+        for row in changed:
+            if row < self.rowCount():
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(annothdg)-1), [Qt.BackgroundRole])
+
+        return len(changed) > 0
+
+    def validate(self, duration=None):
+        # Rechecks rows edited since the last pass and repaints rows whose issues changed. Returns number of issues
+        if self.dirtyrows is None:
+            issues = check_annotations(self.annot, duration)
+            rows = set(self.issues) | set(issues["row"].tolist())
+            self.issues = {}
+        else:
+            issues = check_rows(self.annot, self.intervals, self.dirtyrows, duration)
+            rows = self.dirtyrows
+
+        oldissues = {row : self.issues.pop(row, None) for row in rows}
+        for row, col, issue, message in issues.itertuples(index=False):
+            self.issues.setdefault(row, {})[col] = message
+
+        for row in rows:
+            if (oldissues[row] != self.issues.get(row)) & (row < self.rowCount()):
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(annothdg)-1), [Qt.BackgroundRole, Qt.ToolTipRole])
+
+        self.dirtyrows = set()
+        return sum(map(len, self.issues.values()))
+
+    def invalidate(self):
+        # Marks all rows for validation, e.g. when video duration changes
+        self.dirtyrows = None
+
+    def _touch(self, row):
+        # Marks row for validation, with rows it overlaps, as their overlap issues may change with it
+        if self.dirtyrows is not None:
+            self.dirtyrows.add(row)
+            start, end = self.times(row)
+            if (start is not None) & (end is not None):
+                self.dirtyrows.update(self.intervals.overlap(start, end).tolist())
+
+    def _log(self, record):
+        if self.journal is not None:
+            self.journal.append(record)
+
+        if self.store is not None:
+            self.store.apply(record)
+
+        self.annotChanged.emit()
+
+    def _typed(self, annot):
+        # Returns annotations with the column types of the model
+        annot = annot.reset_index(drop=True).astype({hdg : dtype for hdg, dtype in annotdtypes.items() if hdg != "label"})
+        annot["label"] = self.registry.categorical(annot["label"])
+        return annot
+
+    def _widen(self):
+        # Adds labels registered since to categories of label column. Ids are stable, so codes are kept
+        if self.annot["label"].dtype is not self.registry.categories():
+            self.annot["label"] = Categorical.from_codes(self.annot["label"].cat.codes, dtype=self.registry.categories())
+
+    def _register(self, labels):
+        self.registry.add(labels)
+        self._widen()
+
+    # Mutators. Each one notifies attached views of the rows or cells affected only
+
+    def set_annot(self, annot, log=True):
+        self.beginResetModel()
+        self.annot = self._typed(annot)
+        self.intervals.build(self.annot["start_time"], self.annot["end_time"])
+        self.activerows = set()
+        self.dirtyrows = None
+        self.endResetModel()
+
+        if log:
+            self._log({"op" : "reset", "rows" : self.annot.copy()})
+
+    def append_rows(self, annot):
+        # Shows rows of an import still being read. Not logged, as the import is recorded by set_annot once it is done
+        if annot.shape[0] == 0:
+            return
+
+        first = self.annot.shape[0]
+        self.beginInsertRows(QModelIndex(), first, first + annot.shape[0] - 1)
+        annot = self._typed(annot)
+        self._widen()
+        self.annot = concat([self.annot, annot], ignore_index=True) if first > 0 else annot
+        self.intervals.build(self.annot["start_time"], self.annot["end_time"])
+        if self.dirtyrows is not None:
+            self.dirtyrows.update(range(first, self.annot.shape[0]))
+        self.endInsertRows()
+
+    def set_value(self, row, col, value):
+        if annothdg[col] == "label":
+            self._register([value])
+
+        oldtimes = self.times(row)
+        self._touch(row)
+        self.annot.iat[row, col] = value
+
+        if annothdg[col] in timecols:
+            self.intervals.update_row(row, *oldtimes, *self.times(row))
+        self._touch(row)
+
+        index = self.index(row, col)
+        self.dataChanged.emit(index, index)
+
+        self._log({"op" : "set", "row" : row, "col" : col, "value" : jsonable(value)})
+
+    def insert_row(self, row, values):
+        self.beginInsertRows(QModelIndex(), row, row)
+        newrow = self._typed(DataFrame([list(values)], columns=self.annot.columns))
+        self._widen()
+        self.annot = concat([self.annot[:row], newrow, self.annot[row:]]).reset_index(drop=True)
+
+        self.intervals.insert_row(row)
+        self.intervals.update_row(row, None, None, *self.times(row))
+        self.activerows = {r + (r >= row) for r in self.activerows}
+        self.issues = {r + (r >= row) : issue for r, issue in self.issues.items()}
+        if self.dirtyrows is not None:
+            self.dirtyrows = {r + (r >= row) for r in self.dirtyrows}
+        self._touch(row)
+        self.endInsertRows()
+
+        self._log({"op" : "insert", "row" : row, "values" : jsonable(list(values))})
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self._touch(row)
+        self.annot = self.annot.drop(row).reset_index(drop=True)
+
+        self.intervals.remove_row(row)
+        self.activerows = {r - (r > row) for r in self.activerows if r != row}
+        self.issues = {r - (r > row) : issue for r, issue in self.issues.items() if r != row}
+        if self.dirtyrows is not None:
+            self.dirtyrows = {r - (r > row) for r in self.dirtyrows if r != row}
+        self.endRemoveRows()
+
+        self._log({"op" : "delete", "row" : row})
+
+    def set_values(self, rows, col, values):
+        self.set_block(rows, [col], [values])
+
+    def set_block(self, rows, cols, columns):
+        # Sets rows of each of cols to the values in columns, e.g. a block pasted or segments shifted. Views are notified
+        # once for the whole block
+        if len(rows) == 0:
+            return
+
+        for col, values in zip(cols, columns):
+            if annothdg[col] == "label":
+                # Writes label ids, which is quicker than matching each label to the categories
+                codes = self.annot["label"].cat.codes.to_numpy(dtype=int64)
+                codes[rows] = self.registry.add(values)
+                self.annot["label"] = Categorical.from_codes(codes, dtype=self.registry.categories())
+            else:
+                self.annot.iloc[rows, col] = values
+
+        # Rebuilding once and checking all rows column-wise is cheaper than updating many rows one at a time
+        if any(annothdg[col] in timecols for col in cols):
+            self.intervals.build(self.annot["start_time"], self.annot["end_time"])
+        self.dirtyrows = None
+        self.dataChanged.emit(self.index(int(min(rows)), min(cols)), self.index(int(max(rows)), max(cols)))
+
+        for col, values in zip(cols, columns):
+            self._log({"op" : "setmany", "rows" : jsonable(rows), "col" : col, "values" : jsonable(values)})
+
+    def insert_rows(self, rows, annot):
+        # Inserts rows of annot so that they end up at rows, given in ascending order. Rows in one block are inserted as
+        # such. Otherwise views are reset once
+        if len(rows) == 0:
+            return
+
+        rows = asarray(rows, dtype=int64)
+        inserted = zeros(self.annot.shape[0] + len(rows), dtype=bool)
+        inserted[rows] = True
+        oldrows = flatnonzero(~inserted)
+        block = rows[-1] - rows[0] + 1 == len(rows)
+
+        if block:
+            self.beginInsertRows(QModelIndex(), int(rows[0]), int(rows[-1]))
+        else:
+            self.beginResetModel()
+
+        newrows = self._typed(annot)
+        self._widen()
+        annot = concat([self.annot, newrows], ignore_index=True)
+        self.annot = annot.iloc[argsort(concatenate((oldrows, rows)), kind="stable")].reset_index(drop=True)
+
+        self.intervals.build(self.annot["start_time"], self.annot["end_time"])
+        self.activerows = {int(oldrows[r]) for r in self.activerows}
+        self.issues = {int(oldrows[r]) : issue for r, issue in self.issues.items()}
+        self.dirtyrows = None
+
+        if block:
+            self.endInsertRows()
+        else:
+            self.endResetModel()
+
+        self._log({"op" : "insertmany", "rows" : jsonable(rows), "values" : newrows.copy()})
+
+    def remove_rows(self, rows):
+        # Removes rows, given in ascending order. Rows in one block are removed as such. Otherwise views are reset once
+        if len(rows) == 0:
+            return
+
+        rows = asarray(rows, dtype=int64)
+        kept = ones(self.annot.shape[0], dtype=bool)
+        kept[rows] = False
+        newrows = cumsum(kept) - 1
+        block = rows[-1] - rows[0] + 1 == len(rows)
+
+        if block:
+            self.beginRemoveRows(QModelIndex(), int(rows[0]), int(rows[-1]))
+        else:
+            self.beginResetModel()
+
+        self.annot = self.annot[kept].reset_index(drop=True)
+
+        self.intervals.build(self.annot["start_time"], self.annot["end_time"])
+        self.activerows = {int(newrows[r]) for r in self.activerows if kept[r]}
+        self.issues = {int(newrows[r]) : issue for r, issue in self.issues.items() if kept[r]}
+        self.dirtyrows = None
+
+        if block:
+            self.endRemoveRows()
+        else:
+            self.endResetModel()
+
+        self._log({"op" : "deletemany", "rows" : jsonable(rows)})
+
+class LabelListModel(QAbstractListModel):
+    # Holds label list shared by all label editors, indexed for type-ahead search. First item is an empty label.
+    # Repeated labels are listed once
+    def __init__(self, parent=None):
+        super(LabelListModel, self).__init__(parent)
+        self.registry = LabelRegistry([""])
+        self.labels = self.registry.labels
+        self.search = LabelSearch(self.labels)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.labels)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() & (role in (Qt.DisplayRole, Qt.EditRole)):
+            return self.labels[index.row()]
+
+        return None
+
+    def set_labels(self, labels):
+        self.beginResetModel()
+        self.registry = LabelRegistry([""] + list(map(str, labels)))
+        self.labels = self.registry.labels
+        self.search = LabelSearch(self.labels)
+        self.endResetModel()
+
+    def find(self, label):
+        # Returns row of label, ignoring case. First spelling in list wins. Labels not in the list are at the empty label
+        return max(self.registry.find(label), 0)
+
+    def canonical(self, labels):
+        # Maps labels to their case in label drop-down list. Labels not in the list are removed
+        return array(self.labels, dtype=object)[maximum(self.registry.lookup(labels), 0)]
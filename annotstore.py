@@ -0,0 +1,222 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from sys import exit, stderr
+from os.path import join, basename, splitext
+from argparse import ArgumentParser
+from time import perf_counter
+import sqlite3
+
+from pandas import DataFrame, concat, read_sql_query
+
+from annotio import annothdg, annotdtypes, empty_annot, read_table, normalize_annot, write_atomic
+from batch import find_files
+from timecode import encode_time_columns
+
+# Stores annotations of many videos in one SQLite file, as an alternative to one csv file per video:
+#   python annotstore.py project.db import annotations/
+#   python annotstore.py project.db query --label walking
+#   python annotstore.py project.db export annotations/
+#
+# Rows are grouped by source, the video they were annotated with, and kept in table order by position. Times are ms.
+
+schema = """
+create table if not exists annotations (
+    id integer primary key,
+    source text not null,
+    position integer not null,
+    video_file text,
+    start_ms integer,
+    end_ms integer,
+    label text
+);
+create index if not exists annotations_source on annotations (source, position);
+create index if not exists annotations_label on annotations (label, video_file, start_ms, end_ms);
+create index if not exists annotations_video_file_start on annotations (video_file, start_ms, end_ms, label);
+"""
+
+# Label and video indexes hold every column queried, so queries are answered from the index alone, already sorted.
+# Lookups by video_file alone use the (video_file, start_ms) index
+
+# Store columns of annotation columns
+storecols = ["video_file", "start_ms", "end_ms", "label"]
+
+def _rows(annot):
+    # Returns annotation rows as tuples of Python values, with None for empty cells
+    return annot[annothdg].astype(object).where(annot[annothdg].notna(), None).values.tolist()
+
+def _frame(rows):
+    annot = DataFrame(rows, columns=annothdg) if len(rows) > 0 else empty_annot()
+    return annot.astype(annotdtypes)
+
+class AnnotationStore:
+    # SQLite annotation store. Edits of the video open in the annotator are applied row by row as the annotation
+    # model records them, each in its own transaction. Imports and exports run in a single transaction
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.connection = sqlite3.connect(fpath)
+
+        # Write-ahead log lets queries run while edits are written, and commits without waiting for the disk
+        self.connection.execute("pragma journal_mode=wal")
+        self.connection.execute("pragma synchronous=normal")
+        self.connection.executescript(schema)
+
+        # Source whose rows the model holds, set when a video is opened
+        self.source = None
+
+    def close(self):
+        self.connection.close()
+
+    def load(self, source):
+        # Returns annotations of source in table order
+        rows = self.connection.execute("select %s from annotations where source = ? order by position" %", ".join(storecols),
+                                       (source,)).fetchall()
+        return _frame(rows)
+
+    def sources(self):
+        return [source for source, in self.connection.execute("select distinct source from annotations order by source")]
+
+    def query(self, video_file=None, label=None, start=None, end=None):
+        # Returns annotations matching all conditions given, across videos. start and end select rows overlapping them
+        conditions, params = [], []
+        for condition, value in (("video_file = ?", video_file), ("label = ?", label), ("end_ms >= ?", start), ("start_ms <= ?", end)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        where = (" where " + " and ".join(conditions)) if len(conditions) > 0 else ""
+        rows = self.connection.execute("select %s from annotations%s order by video_file, start_ms" %(", ".join(storecols), where),
+                                       params).fetchall()
+        return _frame(rows)
+
+    # Row-level writes, given the records the annotation model logs for each mutation
+
+    def apply(self, record):
+        if self.source is None:
+            return
+
+        op = record["op"]
+        with self.connection:
+            if op == "set":
+                self._set(self.connection, [(record["value"], record["row"])], record["col"])
+            elif op == "setmany":
+                self._set(self.connection, list(zip(record["values"], record["rows"])), record["col"])
+            elif op == "insert":
+                self.connection.execute("update annotations set position = position + 1 where source = ? and position >= ?",
+                                        (self.source, record["row"]))
+                self.connection.execute("insert into annotations (source, position, %s) values (?, ?, ?, ?, ?, ?)" %", ".join(storecols),
+                                        [self.source, record["row"]] + list(record["values"]))
+            elif op == "delete":
+                self.connection.execute("delete from annotations where source = ? and position = ?", (self.source, record["row"]))
+                self.connection.execute("update annotations set position = position - 1 where source = ? and position > ?",
+                                        (self.source, record["row"]))
+            elif op == "insertmany":
+                self._insert(self.connection, record["rows"], record["values"])
+            elif op == "deletemany":
+                self._delete(self.connection, record["rows"])
+            elif op == "reset":
+                self._replace(self.connection, self.source, record["rows"])
+
+    def _set(self, connection, values, col):
+        connection.executemany("update annotations set %s = ? where source = ? and position = ?" %storecols[col],
+                               [(value, self.source, row) for value, row in values])
+
+    def _insert(self, connection, rows, annot):
+        # Rows are where inserted rows end up, ascending. Rows kept are moved once each, by the number of rows inserted
+        # before them. Ranges are moved from the last, so no row is moved twice
+        starts = [row - i for i, row in enumerate(rows)] + [None]
+        for i in reversed(range(len(rows))):
+            if starts[i] != starts[i + 1]:
+                connection.execute("update annotations set position = position + ? where source = ? and position >= ?%s"
+                                   %(" and position < ?" if starts[i + 1] is not None else ""),
+                                   [i + 1, self.source, starts[i]] + ([starts[i + 1]] if starts[i + 1] is not None else []))
+
+        connection.executemany("insert into annotations (source, position, %s) values (?, ?, ?, ?, ?, ?)" %", ".join(storecols),
+                               [[self.source, row] + values for row, values in zip(rows, _rows(annot))])
+
+    def _delete(self, connection, rows):
+        # Rows are ascending. Rows kept are moved once each, by the number of rows deleted before them
+        connection.executemany("delete from annotations where source = ? and position = ?", [(self.source, row) for row in rows])
+        bounds = list(rows) + [None]
+        for i in range(len(rows)):
+            connection.execute("update annotations set position = position - ? where source = ? and position > ?%s"
+                               %(" and position < ?" if bounds[i + 1] is not None else ""),
+                               [i + 1, self.source, bounds[i]] + ([bounds[i + 1]] if bounds[i + 1] is not None else []))
+
+    def _replace(self, connection, source, annot):
+        connection.execute("delete from annotations where source = ?", (source,))
+        connection.executemany("insert into annotations (source, position, %s) values (?, ?, ?, ?, ?, ?)" %", ".join(storecols),
+                               [[source, position] + row for position, row in enumerate(_rows(annot))])
+
+    # Batch import and export of csv files
+
+    def import_csv(self, fpaths, fps=None):
+        # Imports annotation files, replacing rows of their videos. Nothing is imported if any file cannot be read.
+        # Returns number of rows imported
+        frames = [normalize_annot(read_table(fpath, annothdg), fps)[0] for fpath in fpaths]
+        if len(frames) == 0:
+            return 0
+
+        annot = concat(frames, ignore_index=True)
+        with self.connection:
+            for source, rows in annot.groupby("video_file", sort=False):
+                self._replace(self.connection, source, rows)
+
+        return int(annot["video_file"].notna().sum())
+
+    def export_csv(self, dpath, fmt="auto", fps=None):
+        # Writes one annotation file per source to dpath, in the format saved by the annotator. Returns file paths
+        with self.connection:
+            annot = read_sql_query("select source, %s from annotations order by source, position" %", ".join(storecols), self.connection)
+
+        annot.columns = ["source"] + annothdg
+        fpaths = []
+        for source, rows in annot.groupby("source", sort=False):
+            fpath = join(dpath, splitext(basename(source))[0] + "_annotations.csv")
+            write_atomic(fpath, encode_time_columns(_frame(_rows(rows)), fmt, fps).to_csv(index=None))
+            fpaths.append(fpath)
+
+        return fpaths
+
+def main(argv=None):
+    parser = ArgumentParser(description="Imports annotation files into an SQLite store, queries it, and exports it back to csv files.")
+    parser.add_argument("store", help="SQLite file. Created if it does not exist")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importparser = commands.add_parser("import", help="import annotation files, or folders searched for files matching --pattern")
+    importparser.add_argument("paths", nargs="+")
+    importparser.add_argument("--pattern", default="*_annotations.csv", help="file name pattern used in folders")
+    importparser.add_argument("--fps", type=float, help="frame rate used to read HH:MM:SS:FF times")
+
+    queryparser = commands.add_parser("query", help="print annotations matching all conditions given as csv")
+    queryparser.add_argument("--video", help="video file")
+    queryparser.add_argument("--label", help="label")
+
+    exportparser = commands.add_parser("export", help="write one annotation file per video to a folder")
+    exportparser.add_argument("dpath")
+
+    args = parser.parse_args(argv)
+    store = AnnotationStore(args.store)
+    start = perf_counter()
+
+    try:
+        if args.command == "import":
+            count = store.import_csv(find_files(args.paths, args.pattern), args.fps)
+            print("Imported %d rows in %.2f s" %(count, perf_counter() - start))
+        elif args.command == "query":
+            annot = store.query(video_file=args.video, label=args.label)
+            print(encode_time_columns(annot).to_csv(index=None), end="")
+            print("%d rows in %.1f ms" %(len(annot), (perf_counter() - start) * 1000), file=stderr)
+        else:
+            fpaths = store.export_csv(args.dpath)
+            print("Exported %d files in %.2f s" %(len(fpaths), perf_counter() - start))
+    except (ValueError, OSError) as error:
+        print(error)
+        return 1
+    finally:
+        store.close()
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
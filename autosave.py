@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from threading import Thread, Condition, Lock
+from time import perf_counter, time
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from annotio import write_atomic
+
+def save_tables(tables):
+    # Saves (fpath, serialize) pairs, where serialize returns file contents. Raises OSError naming the file that failed
+    for fpath, serialize in tables:
+        try:
+            write_atomic(fpath, serialize())
+        except OSError as error:
+            raise OSError("Could not save %s: %s" %(fpath, error.strerror or error))
+
+class AutoSaver(QObject):
+    # Saves once edits stop for delay ms, or at the latest maxwait ms after the first unsaved edit. Snapshots are taken
+    # on the GUI thread, and serialized and written on a worker thread. Snapshots taken while a save is running replace
+    # each other, and only the latest is written. Signals carry the edit generation saved
+    saved = pyqtSignal(int, float, float)
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, snapshot, delay=3000, maxwait=30000, parent=None):
+        super(AutoSaver, self).__init__(parent)
+
+        # snapshot returns (fpath, serialize) pairs to save, or None if there is nothing to save
+        self.snapshot = snapshot
+        self.delay = delay
+        self.maxwait = maxwait
+        self.generation = 0
+        self.savedgeneration = 0
+        self.firstedit = None
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+        # Held while files are written, so that saves made elsewhere do not interleave with autosaves
+        self.lock = Lock()
+        self.condition = Condition()
+        self.pending = None
+        Thread(target=self._run, daemon=True).start()
+
+    def schedule(self):
+        # Called after every edit
+        self.generation += 1
+
+        if self.delay is None:
+            return
+
+        if not self.timer.isActive():
+            self.firstedit = perf_counter()
+
+        if (perf_counter() - self.firstedit) * 1000 + self.delay <= self.maxwait:
+            self.timer.start(self.delay)
+        elif not self.timer.isActive():
+            self.timer.start(0)
+
+    def flush(self):
+        self.timer.stop()
+        tables = self.snapshot()
+
+        if tables is not None:
+            with self.condition:
+                self.pending = (self.generation, tables, perf_counter())
+                self.condition.notify()
+
+    def cancel(self):
+        # Drops edits not yet saved, e.g. when they are saved by hand
+        self.timer.stop()
+        with self.condition:
+            self.pending = None
+
+    def save(self, tables):
+        # Saves on the calling thread, e.g. when saving by hand. Raises OSError
+        self.cancel()
+        with self.lock:
+            save_tables(tables)
+            self.savedgeneration = self.generation
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                generation, tables, start = self.pending
+                self.pending = None
+
+            with self.lock:
+                # Snapshot may be older than a save made meanwhile
+                if generation <= self.savedgeneration:
+                    continue
+
+                try:
+                    save_tables(tables)
+                except OSError as error:
+                    self.failed.emit(generation, str(error))
+                    continue
+
+                self.savedgeneration = generation
+
+            self.saved.emit(generation, time(), (perf_counter() - start) * 1000)
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from sys import exit
+from os import cpu_count
+from os.path import isdir, join, getsize
+from glob import glob
+from time import perf_counter
+from argparse import ArgumentParser
+from multiprocessing import Pool
+
+from numpy import array
+from pandas import DataFrame, concat
+
+from annotio import annothdg, labelhdg, read_table, normalize_annot, normalize_labels, missing_labels
+from labelregistry import LabelRegistry
+from timecode import encode_time_columns
+from validation import check_annotations
+
+# Processes annotation files without the GUI, using the same import and normalization steps as the annotator:
+#   python batch.py annotations/ --labels labels/labels.csv --output merged.csv --workers 8
+
+def find_files(paths, pattern="*_annotations.csv"):
+    # Returns files given, and files matching pattern anywhere under folders given
+    fpaths = []
+    for path in paths:
+        fpaths += sorted(glob(join(path, "**", pattern), recursive=True)) if isdir(path) else [path]
+
+    return fpaths
+
+def process_file(task):
+    # Imports one annotation file. Returns summary, and annotations if keep is set. Errors are returned, not raised
+    fpath, labels, fps, duration, keep = task
+    result = {"fpath" : fpath, "bytes" : getsize(fpath), "rows" : 0, "duplicates" : 0, "invalid" : 0,
+              "missing_labels" : [], "issues" : [], "error" : None, "annot" : None}
+
+    try:
+        csv = read_table(fpath, annothdg)
+        annot, result["invalid"] = normalize_annot(csv, fps)
+    except (ValueError, OSError) as error:
+        result["error"] = str(error)
+        return result
+
+    result["rows"] = len(annot)
+    result["duplicates"] = len(csv) - len(annot)
+
+    if labels is not None:
+        # Matches labels to their case in label list. Labels not in list are kept and reported
+        result["missing_labels"] = missing_labels(annot["label"], labels)
+        registry = LabelRegistry(labels)
+        ids = registry.lookup(annot["label"])
+        known = ids >= 0
+        annot.loc[known, "label"] = array(registry.labels, dtype=object)[ids[known]]
+
+    issues = check_annotations(annot, duration)
+    result["issues"] = [(row, annothdg[col], issue, message) for row, col, issue, message in issues.itertuples(index=False)]
+
+    if keep:
+        result["annot"] = annot
+
+    return result
+
+def run(fpaths, labels=None, fps=None, duration=None, output=None, workers=None, quiet=False):
+    # Processes files across a process pool and prints one line per file as results arrive. Returns results in file order
+    tasks = [(fpath, labels, fps, duration, output is not None) for fpath in fpaths]
+    workers = max(1, min(workers or cpu_count() or 1, len(tasks)))
+    results = {}
+    start = perf_counter()
+
+    def report(result):
+        results[result["fpath"]] = result
+        if quiet:
+            return
+
+        if result["error"] is not None:
+            print("%s: error: %s" %(result["fpath"], result["error"].replace("\n\n", " ").replace("\n", ", ")))
+            return
+
+        print("%s: %d row(s), %d duplicate(s), %d unreadable time(s), %d missing label(s), %d issue(s)" %(result["fpath"],
+            result["rows"], result["duplicates"], result["invalid"], len(result["missing_labels"]), len(result["issues"])))
+        for row, col, issue, message in result["issues"]:
+            print("    row %d: %s: %s: %s" %(row + 1, col, issue, message))
+
+    if workers == 1:
+        for task in tasks:
+            report(process_file(task))
+    else:
+        # Small chunks keep output streaming while limiting inter-process overhead for many small files
+        with Pool(workers) as pool:
+            for result in pool.imap_unordered(process_file, tasks, chunksize=max(1, len(tasks) // (workers * 16))):
+                report(result)
+
+    results = [results[fpath] for fpath in fpaths]
+    elapsed = perf_counter() - start
+
+    if output is not None:
+        annots = [result["annot"] for result in results if result["annot"] is not None]
+        merged = concat(annots, ignore_index=True).drop_duplicates().reset_index(drop=True) if annots else DataFrame(columns=annothdg)
+        encode_time_columns(merged).to_csv(output, index=None)
+        print("Merged %d row(s) to: %s" %(len(merged), output))
+
+    summarize(results, elapsed, workers)
+    return results
+
+def summarize(results, elapsed, workers):
+    nfiles = len(results)
+    nrows = sum(result["rows"] for result in results)
+    nbytes = sum(result["bytes"] for result in results)
+    nerrors = sum(result["error"] is not None for result in results)
+    nissues = sum(len(result["issues"]) for result in results)
+    elapsed = max(elapsed, 1e-9)
+
+    print("%d file(s), %d row(s), %d error(s), %d issue(s) in %.2f s with %d worker(s)" %(nfiles, nrows, nerrors, nissues, elapsed, workers))
+    print("%.1f files/s, %.0f rows/s, %.2f MB/s" %(nfiles / elapsed, nrows / elapsed, nbytes / elapsed / 1e6))
+
+def main(argv=None):
+    parser = ArgumentParser(description="Validates, normalizes and merges annotation files without the GUI.")
+    parser.add_argument("paths", nargs="+", help="annotation files, or folders searched for files matching --pattern")
+    parser.add_argument("--pattern", default="*_annotations.csv", help="file name pattern used in folders")
+    parser.add_argument("--labels", help="label file. Labels are matched to its case, and labels missing from it are reported")
+    parser.add_argument("--fps", type=float, help="frame rate used to read HH:MM:SS:FF times")
+    parser.add_argument("--duration", type=int, help="video duration in ms. Times past it are reported")
+    parser.add_argument("--output", help="file to write merged, deduplicated annotations to")
+    parser.add_argument("--workers", type=int, help="number of worker processes. Defaults to number of CPUs")
+    parser.add_argument("--quiet", action="store_true", help="only print summary")
+    args = parser.parse_args(argv)
+
+    labels = normalize_labels(read_table(args.labels, labelhdg)) if args.labels is not None else None
+    fpaths = find_files(args.paths, args.pattern)
+
+    results = run(fpaths, labels, args.fps, args.duration, args.output, args.workers, args.quiet)
+
+    # Fails if any file could not be read or has issues, so it can be used as a check
+    failed = any((result["error"] is not None) or (len(result["issues"]) > 0) for result in results)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+# Compares the old 200 ms polling timer with event-driven playhead updates while a video plays:
+# GUI thread wakeups per second, playhead updates per second, and playhead error, the gap between the time
+# the player reports and the time shown.
+# Usage: python benchmarks/bench_playhead.py video [seconds]
+
+from sys import argv, path
+from os.path import abspath, dirname
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+from PyQt5.QtCore import QTimer, QEventLoop
+from PyQt5.QtWidgets import QApplication
+
+from vlc import MediaPlayer, Media, EventType
+
+from playhead import PlayheadStats, PlayheadTracker
+
+def play(player, fpath, seconds):
+    player.set_media(Media(fpath))
+    player.play()
+
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    loop.exec_()
+    player.stop()
+
+def run_polling(player, fpath, seconds):
+    stats = PlayheadStats()
+    shown = [None]
+
+    def poll():
+        stats.wakeups += 1
+        shown[0] = player.get_time()
+        stats.updates += 1
+
+    player.event_manager().event_attach(EventType.MediaPlayerTimeChanged, lambda event : stats.sample(event.u.new_time, shown[0]))
+
+    timer = QTimer()
+    timer.setInterval(200)
+    timer.timeout.connect(poll)
+    timer.start()
+
+    stats.reset()
+    play(player, fpath, seconds)
+    timer.stop()
+    player.event_manager().event_detach(EventType.MediaPlayerTimeChanged)
+    return stats.report()
+
+def run_events(player, fpath, seconds, refreshrate):
+    tracker = PlayheadTracker(player, refreshrate)
+    tracker.stats.reset()
+    play(player, fpath, seconds)
+    player.event_manager().event_detach(EventType.MediaPlayerTimeChanged)
+    return tracker.stats.report()
+
+if __name__ == "__main__":
+    app = QApplication(argv)
+    fpath = argv[1]
+    seconds = float(argv[2]) if len(argv) >= 3 else 10.0
+    refreshrate = app.primaryScreen().refreshRate() if app.primaryScreen() is not None else 60.0
+
+    player = MediaPlayer()
+    for name, report in (("polling 200 ms", run_polling(player, fpath, seconds)),
+                         ("events %.0f Hz" %refreshrate, run_events(player, fpath, seconds, refreshrate))):
+        print("%-16s %6.1f wakeups/s %6.1f updates/s   error %5.0f ms mean %5.0f ms p95 %5.0f ms max" %(name,
+              report["wakeups_per_s"], report["updates_per_s"], report["mean_error_ms"], report["p95_error_ms"], report["max_error_ms"]))
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+# Measures widget count and refresh time of the annotation table as the number of rows grows.
+# Usage: python benchmarks/bench_table.py [rows ...]
+
+from sys import argv, path
+from os import environ
+from os.path import abspath, dirname
+from time import perf_counter
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication, QTableView
+
+from pandas import DataFrame
+
+from annotmodel import annothdg, AnnotationTableModel, LabelListModel
+from delegates import LabelDelegate, DeleteButtonDelegate
+
+def make_annot(size, nlabels=2000):
+    return DataFrame({"video_file" : ["sample_video.mkv"] * size,
+                      "start_time" : [i * 1000 for i in range(size)],
+                      "end_time" : [i * 1000 + 500 for i in range(size)],
+                      "label" : ["label_%d" % (i % nlabels) for i in range(size)]}, columns=annothdg)
+
+def run(sizes):
+    app = QApplication.instance() or QApplication(argv)
+
+    annotmodel = AnnotationTableModel()
+    labelmodel = LabelListModel()
+    labelmodel.set_labels(["label_%d" % i for i in range(2000)])
+
+    tableview = QTableView()
+    tableview.setModel(annotmodel)
+    tableview.setItemDelegateForColumn(3, LabelDelegate(labelmodel, tableview))
+    tableview.setItemDelegateForColumn(4, DeleteButtonDelegate(tableview))
+    tableview.resize(760, 600)
+    tableview.show()
+    app.processEvents()
+
+    basewidgets = len(QApplication.allWidgets())
+    print("%8s %10s %12s %12s" % ("rows", "widgets", "refresh ms", "edit ms"))
+
+    for size in sizes:
+        annot = make_annot(size)
+
+        # Full refresh: replaces annotations and repaints visible rows
+        start = perf_counter()
+        annotmodel.set_annot(annot)
+        tableview.viewport().repaint()
+        refreshms = (perf_counter() - start) * 1000
+
+        # Single cell edit in the middle of the table
+        start = perf_counter()
+        annotmodel.set_value(size // 2, 1, 2000)
+        tableview.viewport().repaint()
+        editms = (perf_counter() - start) * 1000
+
+        app.processEvents()
+        widgets = len(QApplication.allWidgets()) - basewidgets
+        print("%8d %10d %12.2f %12.2f" % (size, widgets, refreshms, editms))
+
+if __name__ == "__main__":
+    sizes = list(map(int, argv[1:])) if len(argv) >= 2 else [100, 1000, 5000, 20000, 100000]
+    run(sizes)
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from PyQt5.QtCore import Qt, QTimer, QEvent, QPersistentModelIndex, QStringListModel, pyqtSignal
+from PyQt5.QtGui import QColor, QPalette
+from PyQt5.QtWidgets import QApplication, QStyledItemDelegate, QStyleOptionButton, QStyle, QLineEdit, \
+    QCompleter
+
+class LabelEditor(QLineEdit):
+    # Label entry with type-ahead. Each keystroke searches the label list and shows the best matches only, so the
+    # popup stays small however many labels there are. Picking a match commits it. Otherwise the label typed is taken
+    # if it is in the list, ignoring case, or else the best match. Labels not in the list cannot be entered
+    picked = pyqtSignal()
+
+    def __init__(self, labelmodel, matches=20, parent=None):
+        super(LabelEditor, self).__init__(parent)
+        self.labelmodel = labelmodel
+        self.matches = matches
+
+        self.completer = QCompleter(QStringListModel(self), self)
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.completer.setMaxVisibleItems(matches)
+        self.completer.setWidget(self)
+        self.completer.activated[str].connect(self._pick)
+
+        self.textEdited.connect(self.show_matches)
+
+    def show_matches(self, text):
+        self.completer.model().setStringList(self.labelmodel.search.search(text, self.matches))
+        self.completer.complete()
+
+    def _pick(self, label):
+        self.setText(label)
+        self.picked.emit()
+
+    def label(self):
+        # Returns label entered, or None if text matches no label
+        text = self.text().strip()
+        if text == "":
+            return ""
+
+        labelid = self.labelmodel.registry.find(text)
+        if labelid >= 0:
+            return self.labelmodel.labels[labelid]
+
+        matches = self.labelmodel.search.search(text, 1)
+        return matches[0] if len(matches) > 0 else None
+
+class LabelDelegate(QStyledItemDelegate):
+    # Creates a label editor for the cell being edited only. All editors share one label model
+    def __init__(self, labelmodel, parent=None):
+        super(LabelDelegate, self).__init__(parent)
+        self.labelmodel = labelmodel
+
+    def createEditor(self, parent, option, index):
+        editor = LabelEditor(self.labelmodel, parent=parent)
+        editor.picked.connect(lambda: self._commit(editor))
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setText(index.data(Qt.EditRole) or "")
+        editor.selectAll()
+
+        # Lists first labels as soon as editing starts
+        QTimer.singleShot(0, lambda: editor.show_matches(""))
+
+    def setModelData(self, editor, model, index):
+        label = editor.label()
+        if (label is not None) and (label != index.data(Qt.EditRole)):
+            model.setData(index, label, Qt.EditRole)
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
+
+    def _commit(self, editor):
+        self.commitData.emit(editor)
+        self.closeEditor.emit(editor)
+
+class DeleteButtonDelegate(QStyledItemDelegate):
+    # Paints a delete button in each cell of the column. Clicks are hit-tested, so no widgets are created per row
+    deleteClicked = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super(DeleteButtonDelegate, self).__init__(parent)
+        self.pressed = QPersistentModelIndex()
+
+    def _button_rect(self, option):
+        return option.rect.adjusted(6, 3, -6, -3)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = self._button_rect(option)
+        button.text = "Delete"
+        button.palette = QPalette(option.palette)
+        button.palette.setColor(QPalette.Button, QColor("NavajoWhite"))
+        button.state = QStyle.State_Enabled
+
+        if self.pressed == QPersistentModelIndex(index):
+            button.state |= QStyle.State_Sunken
+        else:
+            button.state |= QStyle.State_Raised
+
+        widget = option.widget
+        style = widget.style() if widget is not None else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonDblClick, QEvent.MouseButtonRelease):
+            return False
+
+        if event.button() != Qt.LeftButton:
+            return False
+
+        hit = self._button_rect(option).contains(event.pos())
+
+        # Repaints pressed state
+        if option.widget is not None:
+            option.widget.viewport().update()
+
+        if event.type() == QEvent.MouseButtonRelease:
+            # Deletes row if mouse is released over the button it was pressed on
+            clicked = hit & (self.pressed == QPersistentModelIndex(index))
+            self.pressed = QPersistentModelIndex()
+            if clicked:
+                self.deleteClicked.emit(index.row())
+            return True
+
+        if hit:
+            self.pressed = QPersistentModelIndex(index)
+            return True
+
+        return False
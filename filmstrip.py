@@ -0,0 +1,306 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from os import makedirs, remove, replace, utime, walk
+from os.path import join, getsize, getmtime, exists
+from collections import OrderedDict
+from hashlib import sha1
+from subprocess import run, PIPE, DEVNULL
+from threading import Thread, Condition, Lock, local
+
+from PyQt5.QtCore import QObject, QRect, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter, QColor
+
+from media import av
+from timeline import TimelineStrip
+
+def video_hash(fpath, blocksize=1 << 16):
+    # Hashes file size with first and last blocks of file. Tells videos apart without reading them in full
+    size = getsize(fpath)
+    digest = sha1(str(size).encode())
+
+    with open(fpath, "rb") as file:
+        digest.update(file.read(blocksize))
+        if size > 2 * blocksize:
+            file.seek(size - blocksize)
+            digest.update(file.read(blocksize))
+
+    return digest.hexdigest()
+
+def nice_interval(span, count):
+    # Returns largest interval in ms from a 1-2-5 series that fits count thumbnails in span. Thumbnail times then
+    # repeat across zoom levels and can be cached
+    interval = max(span / max(count, 1), 1)
+    best, scale = 1, 1
+    while scale <= interval:
+        for step in (1, 2, 5):
+            if step * scale <= interval:
+                best = step * scale
+        scale *= 10
+    return best
+
+class ThumbnailCache:
+    # Keeps thumbnails in memory and on disk, each capped in bytes. Least recently used thumbnails are dropped first.
+    # Keys are (video hash, time in ms). Thread-safe
+    def __init__(self, dpath, maxmemory=64 << 20, maxdisk=512 << 20):
+        self.dpath = dpath
+        self.maxmemory = maxmemory
+        self.maxdisk = maxdisk
+        self.lock = Lock()
+
+        self.memory = OrderedDict()
+        self.memorybytes = 0
+
+        # Indexes files already on disk, least recently used first
+        self.disk = OrderedDict()
+        self.diskbytes = 0
+        files = []
+        for dirpath, _, filenames in walk(dpath):
+            files += [join(dirpath, filename) for filename in filenames if filename.endswith(".jpg")]
+        for fpath in sorted(files, key=getmtime):
+            self.disk[fpath] = getsize(fpath)
+            self.diskbytes += self.disk[fpath]
+
+    def _fpath(self, key):
+        return join(self.dpath, key[0], "%d.jpg" %key[1])
+
+    def get(self, key):
+        # Returns thumbnail from memory, or None. Does not read disk, so it is safe to call while painting
+        with self.lock:
+            image = self.memory.get(key)
+            if image is not None:
+                self.memory.move_to_end(key)
+            return image
+
+    def load(self, key):
+        # Returns thumbnail from memory or disk, or None
+        image = self.get(key)
+        if image is not None:
+            return image
+
+        fpath = self._fpath(key)
+        with self.lock:
+            if fpath not in self.disk:
+                return None
+            self.disk.move_to_end(fpath)
+
+        image = QImage(fpath)
+        if image.isNull():
+            return None
+
+        try:
+            utime(fpath)
+        except OSError:
+            pass
+
+        self._remember(key, image)
+        return image
+
+    def put(self, key, image):
+        self._remember(key, image)
+
+        fpath = self._fpath(key)
+        makedirs(join(self.dpath, key[0]), exist_ok=True)
+        if not image.save(fpath + ".tmp", "JPG", 85):
+            return
+        replace(fpath + ".tmp", fpath)
+
+        with self.lock:
+            self.diskbytes -= self.disk.pop(fpath, 0)
+            self.disk[fpath] = getsize(fpath)
+            self.diskbytes += self.disk[fpath]
+
+            while (self.diskbytes > self.maxdisk) and (len(self.disk) > 1):
+                oldfpath, size = self.disk.popitem(last=False)
+                self.diskbytes -= size
+                if exists(oldfpath):
+                    remove(oldfpath)
+
+    def _remember(self, key, image):
+        with self.lock:
+            if key in self.memory:
+                return
+
+            self.memory[key] = image
+            self.memorybytes += image.byteCount()
+
+            while (self.memorybytes > self.maxmemory) and (len(self.memory) > 1):
+                _, oldimage = self.memory.popitem(last=False)
+                self.memorybytes -= oldimage.byteCount()
+
+def _decode_with_av(containers, fpath, time, height):
+    # Each worker keeps its own open container. Takes first frame after the keyframe before time, so only one frame is decoded.
+    # Time is taken from the start of the stream, as playback and keyframe times are
+    if fpath not in containers:
+        containers[fpath] = av.open(fpath)
+    container = containers[fpath]
+    stream = container.streams.video[0]
+
+    container.seek(int(time / 1000 / stream.time_base) + (stream.start_time or 0), stream=stream)
+    for frame in container.decode(stream):
+        width = max(1, int(round(frame.width * height / frame.height)))
+        rgb = frame.reformat(width=width, height=height, format="rgb24").to_ndarray()
+        return QImage(rgb.data, width, height, rgb.strides[0], QImage.Format_RGB888).copy()
+
+    return None
+
+def _decode_with_ffmpeg(fpath, time, height):
+    output = run(["ffmpeg", "-v", "error", "-ss", "%.3f" %(time / 1000), "-i", fpath, "-frames:v", "1",
+                  "-vf", "scale=-2:%d" %height, "-f", "image2pipe", "-vcodec", "mjpeg", "-"],
+                 stdout=PIPE, stderr=DEVNULL).stdout
+    image = QImage.fromData(output, "JPG")
+    return None if image.isNull() else image
+
+class ThumbnailExtractor(QObject):
+    # Decodes scaled-down frames on worker threads. Requested times are served nearest to the playhead first, and
+    # requests are replaced whenever view or playhead moves. Emits ready on the GUI thread as each thumbnail arrives
+    ready = pyqtSignal(str, int)
+    opened = pyqtSignal(str, str)
+
+    def __init__(self, cache, height=40, workers=2, parent=None):
+        super(ThumbnailExtractor, self).__init__(parent)
+        self.cache = cache
+        self.height = height
+        self.available = True
+        self.fpath = None
+        self.videohash = None
+        self.queue = []
+        self.condition = Condition()
+        self.threadlocal = local()
+
+        for _ in range(workers):
+            Thread(target=self._run, daemon=True).start()
+
+    def open(self, fpath):
+        # Hashes video in the background, as it may be on a slow share
+        with self.condition:
+            self.fpath, self.videohash, self.queue = fpath, None, []
+
+        def run_hash():
+            try:
+                videohash = video_hash(fpath)
+            except OSError:
+                return
+
+            with self.condition:
+                if self.fpath == fpath:
+                    self.videohash = videohash
+            self.opened.emit(fpath, videohash)
+
+        Thread(target=run_hash, daemon=True).start()
+
+    def request(self, times):
+        # Replaces queue with times, which should be sorted nearest first
+        with self.condition:
+            self.queue = list(times)
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while (len(self.queue) == 0) or (self.videohash is None):
+                    self.condition.wait()
+                time = self.queue.pop(0)
+                fpath, key = self.fpath, (self.videohash, time)
+
+            if self.cache.load(key) is None:
+                image = self._decode(fpath, time)
+                if image is None:
+                    continue
+                self.cache.put(key, image)
+
+            self.ready.emit(key[0], time)
+
+    def _decode(self, fpath, time):
+        try:
+            if av is not None:
+                if not hasattr(self.threadlocal, "containers"):
+                    self.threadlocal.containers = {}
+                return _decode_with_av(self.threadlocal.containers, fpath, time, self.height)
+            return _decode_with_ffmpeg(fpath, time, self.height)
+        except FileNotFoundError:
+            # Neither PyAV nor ffmpeg is installed. Thumbnails still queued are dropped, and no more are requested
+            with self.condition:
+                self.available = False
+                self.queue = []
+            return None
+        except Exception:
+            return None
+
+class Filmstrip(TimelineStrip):
+    # Strip of thumbnails under the seek bar, covering the visible part of the video. Clicking a thumbnail seeks to it.
+    # Slots are left empty if thumbnails cannot be decoded
+    def __init__(self, cachedpath, height=40, parent=None):
+        super(Filmstrip, self).__init__(height, parent)
+        self.setToolTip("Click to seek")
+
+        self.cache = ThumbnailCache(cachedpath)
+        self.extractor = ThumbnailExtractor(self.cache, height)
+        self.extractor.ready.connect(self._on_ready)
+        self.extractor.opened.connect(lambda fpath, videohash : self._schedule())
+
+    def set_video(self, fpath, duration=0):
+        self.extractor.open(fpath)
+        self.duration = duration
+        self.viewstart, self.viewend = 0, duration
+        self.update()
+
+    def set_duration(self, duration):
+        # Slots past the old end of the video are requested
+        super(Filmstrip, self).set_duration(duration)
+        self._schedule()
+
+    def _view_changed(self):
+        self._schedule()
+
+    def set_playhead(self, time):
+        # Thumbnails still waiting are reordered around new playhead
+        self.playhead = time
+        if len(self.extractor.queue) > 0:
+            self._schedule(False)
+
+    def _slots(self):
+        # Returns thumbnail times in view. Interval adapts to view length and widget width
+        span = self.viewend - self.viewstart
+        if (span <= 0) or (self.extractor.videohash is None):
+            return [], 1
+
+        thumbwidth = max(self.height() * 16 // 9, 1)
+        interval = nice_interval(span, max(self.width() // thumbwidth, 1))
+        first = int(self.viewstart // interval) * interval
+        return list(range(first, int(min(self.viewend, self.duration)) + 1, interval)), interval
+
+    def _schedule(self, repaint=True):
+        videohash = self.extractor.videohash
+        times, _ = self._slots() if self.extractor.available else ([], 1)
+        missing = [time for time in times if self.cache.get((videohash, time)) is None]
+        self.extractor.request(sorted(missing, key=lambda time : abs(time - self.playhead)))
+        if repaint:
+            self.update()
+
+    def _on_ready(self, videohash, time):
+        if (videohash == self.extractor.videohash) & (self.viewstart <= time <= self.viewend):
+            self.update()
+
+    def resizeEvent(self, event):
+        self._schedule()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(32, 32, 32))
+
+        times, interval = self._slots()
+        slotwidth = max(int(interval * self._scale()), 1)
+
+        for time in times:
+            x = self._x(time)
+            image = self.cache.get((self.extractor.videohash, time))
+            if image is not None:
+                # Thumbnails wider than their slot are cropped around the middle
+                cropwidth = min(slotwidth * image.height() // self.height(), image.width())
+                painter.drawImage(QRect(x, 0, slotwidth, self.height()),
+                                  image, QRect((image.width() - cropwidth) // 2, 0, cropwidth, image.height()))
+            else:
+                painter.fillRect(QRect(x + 1, 1, slotwidth - 2, self.height() - 2), QColor(64, 64, 64))
+
+        painter.end()
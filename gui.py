@@ -2,19 +2,43 @@
 # -*- coding: utf-8 -*
 
 from sys import argv, exit
-from os import environ, mkdir, remove
-from os.path import dirname, exists, join, splitext
+from os import environ, mkdir, remove, replace
+from os.path import basename, dirname, exists, join, splitext, getmtime
+from glob import glob
+from time import perf_counter, strftime, localtime
 
 import PyQt5
-from PyQt5.QtCore import Qt, QRect, QTimer, QSize
+from PyQt5.QtCore import Qt, QRect, QTimer, QSize, QItemSelection, QItemSelectionModel
 from PyQt5.QtGui import QPalette, QColor, QFont, QKeySequence
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QTableWidget, QTableWidgetItem, QHBoxLayout, QVBoxLayout, QStyle, \
-    QFrame, QSlider, QPushButton, QComboBox, QFileDialog, QMessageBox, QLabel, QShortcut, QHeaderView, QAbstractItemView
-
-from vlc import MediaPlayer, Media
-
-from pandas import DataFrame, read_csv
-from datetime import datetime, timedelta
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QTableView, QHBoxLayout, QVBoxLayout, QStyle, \
+    QFrame, QSlider, QPushButton, QFileDialog, QMessageBox, QLabel, QShortcut, QHeaderView, QAbstractItemView, QProgressBar, QLineEdit, \
+    QComboBox
+
+from vlc import MediaPlayer, Media, EventType
+
+from numpy import arange, asarray, concatenate, unique, sort, diff, append, flatnonzero
+from pandas import DataFrame, Series, read_csv, isna
+from datetime import datetime
+
+from annotio import read_table, table_columns, normalize_labels, missing_labels
+from annotmodel import annothdg, labelhdg, empty_annot, AnnotationTableModel, LabelListModel
+from annotfilter import AnnotationFilterProxy
+from delegates import LabelDelegate, DeleteButtonDelegate
+from undostack import UndoStack, CellChange, RowInsert, RowDelete, BlockChange, RowsInsert, RowsDelete, TableReset, LabelListSwap, \
+    MacroCommand
+from journal import EditJournal, read_journal, replay_journal
+from vlcevents import EventRelay, MediaParser
+from playhead import PlayheadTracker
+from keyframes import KeyframeLoader
+from seeking import SeekScheduler, SkipAccelerator
+from filmstrip import Filmstrip
+from segmenttrack import SegmentTrack
+from timeline import SeekBar
+from waveform import WaveformLoader, WaveformLane
+from autosave import AutoSaver
+from annotstore import AnnotationStore
+from annotimport import AnnotationImporter
+from timecode import timecols, parse_timecode, parse_timecodes, format_timecode, format_timecodes, frame_of, frame_time, snap_to_frame, decode_time_columns, encode_time_columns
 
 pyqt5dpath = dirname(PyQt5.__file__)
 for filename in ("Qt5", "Qt"):
@@ -23,10 +47,6 @@ for filename in ("Qt5", "Qt"):
         environ["QT_QPA_PLATFORM_PLUGIN_PATH"] = plugindpath
         print(plugindpath)
 
-# Defines column headings for annotation and label files
-annothdg = ["video_file", "start_time", "end_time", "label"]
-labelhdg = ["label"]
-
 class KeyboardShortcuts(QMainWindow):
     def __init__(self, parent=None):
         super(KeyboardShortcuts, self).__init__(parent)
@@ -48,8 +68,10 @@ class KeyboardShortcuts(QMainWindow):
         vshortcutbox.addWidget(title)
 
         videoplayershortcuts = {"Spacebar " : "Play/Pause",
-                "Right arrow" : "Fast forward 5s",
-                "Left arrow" : "Rewind 5s"}
+                "Right arrow" : "Fast forward 5s, faster when held",
+                "Left arrow" : "Rewind 5s, faster when held",
+                "." : "Next frame",
+                "," : "Previous frame"}
 
         tableshortcuts = {"Ctrl++" : "Add row",
                 "Ctrl+-" : "Delete selected row",
@@ -62,6 +84,7 @@ class KeyboardShortcuts(QMainWindow):
                 "Ctrl+C": "Copy",
                 "Ctrl+V" : "Paste",
                 "Ctrl+Z" : "Undo",
+                "Ctrl+Y" : "Redo",
                 "Del" : "Delete cell content",
                 "Esc" : "Deselect cell",
                 "Ctrl+S" : "Save"}
@@ -88,7 +111,7 @@ class KeyboardShortcuts(QMainWindow):
         shortcutmenuwidget.setLayout(vshortcutbox)
 
 class VideoAnnotator(QMainWindow):
-    def __init__(self, videodpath=None, annotdpath=None, labeldpath=None, parent=None):
+    def __init__(self, videodpath=None, annotdpath=None, labeldpath=None, undomaxbytes=64*1024*1024, autosavedelay=3000, storefpath=None, parent=None):
         super(VideoAnnotator, self).__init__(parent)
         self.setWindowTitle("Video Annotator")
 
@@ -100,24 +123,78 @@ class VideoAnnotator(QMainWindow):
         self.videofname = None
         self.currtime = 0
         self.duration = 0
+        self.fps = None
         self.ispaused = False
 
+        # Video metadata is read in the background. Duration is also updated when player reports it
+        self.videoparser = None
+        self.videofpath = None
+
+        # Keyframe index is built in the background, or read from sidecar file. Seek bar drags snap to keyframes once it is ready
+        self.keyframes = None
+        self.keyframeloader = KeyframeLoader(self)
+        self.keyframeloader.loaded.connect(self._set_keyframes)
+        self.keyframeloader.failed.connect(lambda fpath, text : print(text))
+
+        # Audio peaks are computed in the background once per video, and read from a memory-mapped peak file after that
+        self.waveformloader = WaveformLoader(self)
+        self.waveformloader.loaded.connect(self._set_waveform)
+        self.waveformloader.failed.connect(lambda fpath, text : print(text))
+
+        self.lengthrelay = EventRelay(self.videoplayer.event_manager(), EventType.MediaPlayerLengthChanged, lambda event : event.u.new_length, self)
+        self.lengthrelay.fired.connect(self._set_duration)
+
         # Adds annotation information
         self.annotdpath = annotdpath
-        self.annot = DataFrame(columns=annothdg)
-
-        # Adds backup file information
-        self.backupdpath = "temp"
-        self.backupfpath = None
+        self.annotmodel = AnnotationTableModel(self)
+        self.annotmodel.editRequested.connect(self._update_annot)
+
+        # Annotation files are read in chunks in the background. Rows are shown as chunks arrive, and the import is
+        # added to edit history once the whole file is read. importold holds annotations to restore if it is cancelled
+        self.importer = AnnotationImporter(parent=self)
+        self.importer.chunkRead.connect(self._import_chunk)
+        self.importer.finished.connect(self._import_finished)
+        self.importer.failed.connect(self._import_failed)
+        self.importold = None
+        self.importstart = None
+
+        # Optional SQLite store holding annotations of all videos. Each edit is written to it as a row-level change
+        self.store = AnnotationStore(storefpath) if storefpath is not None else None
+        self.annotmodel.store = self.store
+
+        # Checks annotations shortly after edits stop. Only rows edited since the last check are checked
+        self.validatetimer = QTimer(self)
+        self.validatetimer.setSingleShot(True)
+        self.validatetimer.setInterval(300)
+        self.validatetimer.timeout.connect(self._validate)
+        self.annotmodel.annotChanged.connect(self.validatetimer.start)
+
+        # Saves in the background once edits stop for autosavedelay ms. Autosave is off if autosavedelay is None
+        self.autosaver = AutoSaver(self._autosave_tables, autosavedelay, parent=self)
+        self.autosaver.saved.connect(self._autosaved)
+        self.autosaver.failed.connect(self._autosave_failed)
+        self.annotmodel.annotChanged.connect(self.autosaver.schedule)
 
         # Adds label information
         self.labeldpath = labeldpath
         self.label = None
-        self.labelbackup = None
-        self.undostate = -1
+        self.labelmodel = LabelListModel(self)
+
+        # Adds edit history. Oldest edits are dropped once history exceeds undomaxbytes
+        self.undostack = UndoStack(maxbytes=undomaxbytes)
+
+        # Step in ms by which selected segments are shifted
+        self.shiftstep = 100
+
+        # Adds edit journal information. Journal is only left behind if annotator does not shut down cleanly
+        self.journaldpath = "temp"
+        self.journal = None
+
+        # Thumbnails are cached on disk so that reopening a video shows them right away
+        self.thumbnaildpath = "thumbnails"
 
         # Checks folders exist
-        for dpath in (self.videodpath, self.annotdpath, self.labeldpath):
+        for dpath in (self.videodpath, self.annotdpath, self.labeldpath, self.journaldpath, self.thumbnaildpath):
             if not exists(dpath):
                 mkdir(dpath)
 
@@ -127,12 +204,78 @@ class VideoAnnotator(QMainWindow):
         self._annot_table_ui()
         self._add_shortcut()
 
-    def _create_new_backup_file(self):
-        if not exists(self.backupdpath):
-            mkdir(self.backupdpath)
+        # Recovers unsaved annotations once window is shown
+        QTimer.singleShot(0, self._recover_journal)
+
+    @property
+    def annot(self):
+        return self.annotmodel.annot
+
+    def _start_journal(self, videofpath, annotfpath=None, labelfpath=None, rows=None):
+        # Edits are replayed onto annotfpath, or onto rows if annotations were not read from a file
+        if self.journal is not None:
+            self.journal.close()
 
-        self.backupfpath = join(self.backupdpath, datetime.now().strftime("%y%m%d%H%M%S") + ".csv")
-        self.annot.to_csv(self.backupfpath, index=False)
+        header = {"op" : "open", "video" : videofpath, "annot" : annotfpath, "label" : labelfpath, "rows" : rows}
+        journalfpath = join(self.journaldpath, datetime.now().strftime("%y%m%d%H%M%S") + ".journal")
+        self.journal = EditJournal(journalfpath, header, snapshot=self._journal_snapshot)
+        self.annotmodel.journal = self.journal
+
+    def _journal_snapshot(self):
+        labels = self.label["label"].tolist() if self.label is not None else None
+        return [{"op" : "reset", "rows" : self.annot.copy()}, {"op" : "labels", "labels" : labels}]
+
+    def _recover_journal(self):
+        journalfpaths = sorted(glob(join(self.journaldpath, "*.journal")), key=getmtime)
+
+        if len(journalfpaths) == 0:
+            return
+
+        journalfpath = journalfpaths[-1]
+        try:
+            header, records = read_journal(journalfpath)
+        except (OSError, ValueError) as error:
+            self._move_journal_aside(journalfpath, error)
+            return
+
+        if (header is None) or (len(records) == 0):
+            remove(journalfpath)
+            return
+
+        reply = self._confirm_action("Video Annotator did not shut down cleanly.\n\nRecover unsaved annotations for %s?" %header["video"])
+
+        if reply == QMessageBox.Yes:
+            if not exists(header["video"]):
+                self._error("Could not find video %s." %header["video"])
+                return
+
+            # Replays edits onto last saved annotations and labels, or onto rows the journal started from
+            start = perf_counter()
+            try:
+                annot = empty_annot()
+                if header["annot"] is not None:
+                    annot = read_csv(header["annot"], dtype=str, keep_default_na=False)[annothdg]
+                    decode_time_columns(annot)
+                elif header.get("rows") is not None:
+                    annot = DataFrame(header["rows"], columns=annothdg)
+                labels = read_csv(header["label"])["label"].tolist() if header["label"] is not None else None
+                annot, labels, count = replay_journal(records, annot, labels)
+            except Exception as error:
+                self._move_journal_aside(journalfpath, error)
+                return
+            print("Recovered %d edits in %.0f ms" %(count, (perf_counter() - start) * 1000))
+
+            self._open_video(header["video"])
+            self.annotmodel.set_annot(annot)
+            self._set_label_list(DataFrame(labels, columns=["label"]) if labels is not None else None)
+            self._update_btn_states()
+
+        remove(journalfpath)
+
+    def _move_journal_aside(self, journalfpath, error):
+        # Journal that cannot be replayed is kept for inspection, but no longer offered for recovery
+        replace(journalfpath, journalfpath + ".failed")
+        self._error("Unsaved annotations could not be recovered: %s\n\nEdit journal has been moved to %s." %(error, journalfpath + ".failed"))
 
     def _video_player_ui(self):
         videoplayerwidget = QWidget(self)
@@ -146,12 +289,29 @@ class VideoAnnotator(QMainWindow):
         self.videoframe.setAutoFillBackground(True)
         self.videoplayer.set_hwnd(self.videoframe.winId())
 
-        # Seek bar
-        self.seekbar = QSlider(Qt.Horizontal, self)
-        self.seekbar.setToolTip("Seek")
-        self.seekbarmax = 1000
-        self.seekbar.setMaximum(self.seekbarmax)
-        self.seekbar.sliderMoved.connect(self._set_position)
+        # Seek bar. Seeks in ms, and can be zoomed in down to single frames
+        self.seekbar = SeekBar()
+        self.seekbar.moved.connect(self._set_position)
+        self.seekbar.released.connect(lambda time : self._set_position(time, False))
+
+        # Thumbnails under seek bar are decoded in the background, nearest to the playhead first
+        self.filmstrip = Filmstrip(self.thumbnaildpath)
+        self.filmstrip.clicked.connect(self._skip)
+
+        # Annotations drawn as bars, one lane per label. Dragging a bar edge changes its start or end time
+        self.segmenttrack = SegmentTrack(self.annotmodel)
+        self.segmenttrack.clicked.connect(self._skip)
+        self.segmenttrack.rowClicked.connect(lambda row : self._set_current_cell(row, 3))
+        self.segmenttrack.edgeMoved.connect(self._move_edge)
+
+        # Audio waveform
+        self.waveform = WaveformLane()
+        self.waveform.clicked.connect(self._skip)
+
+        # Filmstrip, segment track and waveform show the part of the video in view on the seek bar
+        self.seekbar.viewChanged.connect(self.filmstrip.set_view)
+        self.seekbar.viewChanged.connect(self.segmenttrack.set_view)
+        self.seekbar.viewChanged.connect(self.waveform.set_view)
 
         # Play/Pause button
         self.playbtn = QPushButton()
@@ -167,6 +327,19 @@ class VideoAnnotator(QMainWindow):
         self.time = QLabel()
         self._print_time()
 
+        # Time and latency of last save
+        self.savestatus = QLabel()
+
+        # Progress of annotation import, shown while a file is read
+        self.importprogress = QProgressBar()
+        self.importprogress.setRange(0, 1000)
+        self.importprogress.setTextVisible(False)
+        self.importprogress.setVisible(False)
+
+        self.cancelimportbtn = QPushButton("Cancel import")
+        self.cancelimportbtn.setVisible(False)
+        self.cancelimportbtn.clicked.connect(self._cancel_import)
+
         # Volume control
         self.volume = QLabel()
         pixmap = self.style().standardIcon(QStyle.SP_MediaVolume).pixmap(QSize(64, 64))
@@ -181,6 +354,9 @@ class VideoAnnotator(QMainWindow):
         hbtnbox.addWidget(self.playbtn)
         hbtnbox.addWidget(self.newvideobtn)
         hbtnbox.addWidget(self.time)
+        hbtnbox.addWidget(self.savestatus)
+        hbtnbox.addWidget(self.importprogress)
+        hbtnbox.addWidget(self.cancelimportbtn)
         hbtnbox.addStretch(1)
         hbtnbox.addWidget(self.volume)
         hbtnbox.addWidget(self.volumectrl)
@@ -188,17 +364,27 @@ class VideoAnnotator(QMainWindow):
         vboxlayout = QVBoxLayout()
         vboxlayout.addWidget(self.videoframe)
         vboxlayout.addWidget(self.seekbar)
+        vboxlayout.addWidget(self.filmstrip)
+        vboxlayout.addWidget(self.segmenttrack)
+        vboxlayout.addWidget(self.waveform)
         vboxlayout.addLayout(hbtnbox)
         videoplayerwidget.setLayout(vboxlayout)
 
-        # Timer
-        self.timer = QTimer(self)
-        self.timer.setInterval(200)
-        self.timer.timeout.connect(self._update_position)
+        # Playhead follows player events instead of polling. Updates are limited to the display refresh rate
+        screen = QApplication.primaryScreen()
+        self.playhead = PlayheadTracker(self.videoplayer, screen.refreshRate() if screen is not None else 60.0, self)
+        self.playhead.timeChanged.connect(self._update_position)
+        self.playhead.endReached.connect(self._end_reached)
+        self.playhead.stateChanged.connect(self._update_play_icon)
+
+        # Seeks are coalesced so that seek bar drags and held keys do not queue more seeks than the player can serve
+        self.seeker = SeekScheduler(self.videoplayer, parent=self)
+        self.playhead.timeChanged.connect(self.seeker.on_time)
+        self.skipaccel = SkipAccelerator()
 
     def _btn_panel_ui(self):
-        btnpanelwidget = QWidget(self)
-        btnpanelwidget.setGeometry(QRect(1480, 0, 320, 600))
+        self.btnpanelwidget = QWidget(self)
+        self.btnpanelwidget.setGeometry(QRect(1480, 0, 320, 600))
 
         self.addrowbtn = QPushButton("Add row")
         self.addrowbtn.setEnabled(False)
@@ -250,7 +436,7 @@ class VideoAnnotator(QMainWindow):
         vbtnbox.addWidget(self.adddropdownbtn)
         vbtnbox.addWidget(self.deldropdownbtn)
         vbtnbox.addWidget(self.savebtn)
-        btnpanelwidget.setLayout(vbtnbox)
+        self.btnpanelwidget.setLayout(vbtnbox)
 
     def _add_shortcut(self):
         shortcut_add_row = QShortcut(QKeySequence("Ctrl++"), self)
@@ -287,12 +473,22 @@ class VideoAnnotator(QMainWindow):
         shortcut_paste.activated.connect(self._shortcut_paste)
         shortcut_undo = QShortcut(QKeySequence("Ctrl+Z"), self)
         shortcut_undo.activated.connect(self._undo)
+        shortcut_redo = QShortcut(QKeySequence("Ctrl+Y"), self)
+        shortcut_redo.activated.connect(self._redo)
         shortcut_del = QShortcut(QKeySequence("Del"), self)
         shortcut_del.activated.connect(self._shortcut_del)
         shortcut_esc = QShortcut(QKeySequence("Esc"), self)
         shortcut_esc.activated.connect(self._shortcut_esc)
         shortcut_save = QShortcut(QKeySequence("Ctrl+S"), self)
         shortcut_save.activated.connect(self._save)
+        shortcut_shift_later = QShortcut(QKeySequence("Ctrl+Shift+Right"), self)
+        shortcut_shift_later.activated.connect(lambda: self._shift_segments(self.shiftstep))
+        shortcut_shift_earlier = QShortcut(QKeySequence("Ctrl+Shift+Left"), self)
+        shortcut_shift_earlier.activated.connect(lambda: self._shift_segments(-self.shiftstep))
+        shortcut_next_frame = QShortcut(QKeySequence("."), self)
+        shortcut_next_frame.activated.connect(self._next_frame)
+        shortcut_previous_frame = QShortcut(QKeySequence(","), self)
+        shortcut_previous_frame.activated.connect(self._previous_frame)
 
     def _shortcut_menu(self):
         shortcutmenuwidget = QWidget(self)
@@ -306,9 +502,12 @@ class VideoAnnotator(QMainWindow):
         vshortcutbox.addWidget(title)
 
         shortcuts = {"Ctrl++" : "Add row",
-                "Ctrl+-" : "Delete selected row",
+                "Ctrl+-" : "Delete selected rows",
                 "Ins" : "Insert current time",
-                "Ctrl+F" : "Play from selected time"}
+                "Ctrl+F" : "Play from selected time",
+                "Ctrl+V" : "Paste cells from spreadsheet",
+                "Ctrl+Shift+Right" : "Shift selected segments later",
+                "Ctrl+Shift+Left" : "Shift selected segments earlier"}
 
         for key in shortcuts.keys():
             hshortcutbox = QHBoxLayout()
@@ -333,26 +532,156 @@ class VideoAnnotator(QMainWindow):
         dialog.show()
 
     def _annot_table_ui(self):
-        self.tablewidget = QTableWidget(self)
-        self.tablewidget.setGeometry(QRect(720, 0, 760, 600))
-        self.tablewidget.setObjectName("tablewidget")
-
-        self.tablewidget.setColumnCount(5)
-        self.tablewidget.setHorizontalHeaderLabels(annothdg + [""])
-        self.tablewidget.setColumnWidth(0, 96)
-        self.tablewidget.setColumnWidth(1, 96)
-        self.tablewidget.setColumnWidth(2, 96)
-        self.tablewidget.setColumnWidth(3, 396)
-        self.tablewidget.setColumnWidth(4, 96)
-
-        self.tablewidget.setSelectionBehavior(QAbstractItemView.SelectItems)
-        self.tablewidget.setSelectionMode(QAbstractItemView.SingleSelection)
-        self.tablewidget.selectionModel().selectionChanged.connect(self._on_cell_selection)
-
-        self.tablewidget.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
-        self.tablewidget.setEditTriggers(QAbstractItemView.DoubleClicked)
-
-        self.tablewidget.itemChanged.connect(self._update_annot)
+        tablewidget = QWidget(self)
+        tablewidget.setGeometry(QRect(720, 0, 760, 600))
+
+        # Table shows annotations through a filter and sort proxy. Rows are annotation rows everywhere else, and are
+        # mapped to and from view rows by _current_cell, _set_current_cell and _selected_cells
+        self.annotproxy = AnnotationFilterProxy(self)
+        self.annotproxy.setSourceModel(self.annotmodel)
+
+        self.tableview = QTableView()
+        self.tableview.setObjectName("tableview")
+        self.tableview.setModel(self.annotproxy)
+
+        self.tableview.setColumnWidth(0, 96)
+        self.tableview.setColumnWidth(1, 96)
+        self.tableview.setColumnWidth(2, 96)
+        self.tableview.setColumnWidth(3, 396)
+        self.tableview.setColumnWidth(4, 96)
+
+        self.tableview.setSelectionBehavior(QAbstractItemView.SelectItems)
+        self.tableview.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.tableview.selectionModel().selectionChanged.connect(self._on_cell_selection)
+
+        self.tableview.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        self.tableview.setEditTriggers(QAbstractItemView.DoubleClicked)
+
+        # Sorts by column whose header is clicked. Rows are in table order until then
+        self.tableview.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.tableview.setSortingEnabled(True)
+
+        # Label editor, which searches label drop-down list as labels are typed, is only shown for the cell being edited
+        self.labeldelegate = LabelDelegate(self.labelmodel, self.tableview)
+
+        # Delete buttons are painted, not created per row
+        self.deletedelegate = DeleteButtonDelegate(self.tableview)
+        self.deletedelegate.deleteClicked.connect(lambda row : self._delete_row(int(self.annotproxy.source_rows(row, row)[0])))
+        self.tableview.setItemDelegateForColumn(4, self.deletedelegate)
+
+        # Filters. Rows shown are updated as filters are typed
+        self.labelfilter = QLineEdit()
+        self.labelfilter.setPlaceholderText("Filter by label")
+        self.labelfilter.textChanged.connect(self._filter_labels)
+
+        self.labelfiltermode = QComboBox()
+        self.labelfiltermode.addItems(["Exact", "Prefix", "Regex"])
+        self.labelfiltermode.currentIndexChanged.connect(self._filter_labels)
+
+        self.startfilter = QLineEdit()
+        self.startfilter.setPlaceholderText("From")
+        self.startfilter.textChanged.connect(self._filter_times)
+
+        self.endfilter = QLineEdit()
+        self.endfilter.setPlaceholderText("To")
+        self.endfilter.textChanged.connect(self._filter_times)
+
+        self.statusfilter = QComboBox()
+        self.statusfilter.addItems(["All rows", "Rows with issues", "Rows without issues"])
+        self.statusfilter.currentIndexChanged.connect(self._filter_status)
+
+        self.clearfilterbtn = QPushButton("Clear")
+        self.clearfilterbtn.clicked.connect(self._clear_filters)
+
+        hfilterbox = QHBoxLayout()
+        hfilterbox.addWidget(self.labelfilter, 3)
+        hfilterbox.addWidget(self.labelfiltermode)
+        hfilterbox.addWidget(self.startfilter, 1)
+        hfilterbox.addWidget(self.endfilter, 1)
+        hfilterbox.addWidget(self.statusfilter)
+        hfilterbox.addWidget(self.clearfilterbtn)
+
+        vtablebox = QVBoxLayout()
+        vtablebox.addLayout(hfilterbox)
+        vtablebox.addWidget(self.tableview)
+        tablewidget.setLayout(vtablebox)
+
+    def _current_cell(self):
+        index = self.annotproxy.mapToSource(self.tableview.currentIndex())
+        return index.row(), index.column()
+
+    def _set_current_cell(self, row, col):
+        # Rows filtered out leave no cell selected
+        self.tableview.setCurrentIndex(self.annotproxy.mapFromSource(self.annotmodel.index(row, col)))
+
+    def _set_view_cell(self, viewrow, col):
+        # Moves to row as shown in the table, e.g. for keyboard navigation
+        self.tableview.setCurrentIndex(self.annotproxy.index(viewrow, col))
+
+    def _selected_cells(self):
+        # Returns {col : rows} of selected annotation cells, rows ascending. Selection is read range by range, so
+        # selecting every row costs no more than selecting one
+        cells = {}
+        for selected in self.tableview.selectionModel().selection():
+            for col in range(selected.left(), min(selected.right(), len(annothdg)-1) + 1):
+                cells.setdefault(col, []).append(self.annotproxy.source_rows(selected.top(), selected.bottom()))
+
+        return {col : unique(concatenate(rows)) for col, rows in cells.items()}
+
+    def _selected_rows(self):
+        cells = self._selected_cells()
+        return unique(concatenate(list(cells.values()))) if len(cells) > 0 else arange(0)
+
+    def _select_block(self, rows, left, right):
+        # Rows of the block may be apart once sorted, so each run of rows adjacent in the table is selected as a range
+        viewrows = sort(self.annotproxy.view_rows(rows))
+        viewrows = viewrows[viewrows >= 0]
+        starts = flatnonzero(diff(viewrows, prepend=-2) != 1)
+        ends = append(starts[1:], len(viewrows)) - 1
+
+        selection = QItemSelection()
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            selection.select(self.annotproxy.index(int(viewrows[start]), left), self.annotproxy.index(int(viewrows[end]), right))
+
+        self._set_current_cell(int(rows[0]), left)
+        self.tableview.selectionModel().select(selection, QItemSelectionModel.ClearAndSelect)
+
+    def _filter_labels(self):
+        row, col = self._current_cell()
+        mode = ("exact", "prefix", "regex")[self.labelfiltermode.currentIndex()]
+
+        # Regex that cannot be compiled is shown in red, and rows are filtered on the last valid one
+        valid = self.annotproxy.set_label_filter(self.labelfilter.text(), mode)
+        self.labelfilter.setStyleSheet("" if valid else "color: red")
+        self._set_current_cell(row, col)
+
+    def _filter_times(self):
+        row, col = self._current_cell()
+
+        # Times that cannot be read are shown in red, and do not filter
+        bounds = []
+        for timefilter in (self.startfilter, self.endfilter):
+            text = timefilter.text().strip()
+            ms = parse_timecode(text, self.annotmodel.fps) if text != "" else None
+            timefilter.setStyleSheet("" if (text == "") | (ms is not None) else "color: red")
+            bounds.append(ms)
+
+        self.annotproxy.set_time_filter(*bounds)
+        self._set_current_cell(row, col)
+
+    def _filter_status(self):
+        row, col = self._current_cell()
+        self.annotproxy.set_status_filter(("all", "issues", "valid")[self.statusfilter.currentIndex()])
+        self._set_current_cell(row, col)
+
+    def _clear_filters(self):
+        self.labelfilter.clear()
+        self.startfilter.clear()
+        self.endfilter.clear()
+        self.statusfilter.setCurrentIndex(0)
+
+        # Restores table order
+        self.tableview.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
 
     def _import_video(self):
         # Stops current video
@@ -376,31 +705,53 @@ class VideoAnnotator(QMainWindow):
         if not filename:
             return
 
+        self._open_video(filename)
+
+    def _open_video(self, filename):
         video = Media(filename)
         self.videoplayer.set_hwnd(self.videoframe.winId())
 
         self.videoplayer.set_media(video)
         self._play()
 
-        # Parses video metadata
-        video.parse()
-        self.videofname = video.get_meta(0)
-        self.duration = self.videoplayer.get_length()
-        #self.fps = self.videoplayer.get_fps()
-
+        # Parses video metadata in the background. File name is used until title is known
+        self.videofpath = filename
+        self.videofname = basename(filename)
+        self.duration = 0
+        self.fps = None
         self.setWindowTitle(self.videofname)
+        self._print_time()
 
-        # Clears annotations
-        self.annot = DataFrame(columns=annothdg)
-        self._refresh_table()
-        self.labelbackup = None
-        self.undostate = -1
-
-        # Creates new backup file
-        if self.backupfpath is not None:
-            if exists(self.backupfpath):
-                remove(self.backupfpath)
-        self._create_new_backup_file()
+        if self.videoparser is not None:
+            self.videoparser.cancel()
+
+        self.videoparser = MediaParser(video, parent=self)
+        self.videoparser.parsed.connect(self._set_video_info)
+        self.videoparser.failed.connect(lambda text : print(text, "Duration is read once playback starts."))
+        self.videoparser.start()
+
+        self.keyframes = None
+        self.keyframeloader.start(filename)
+        self.filmstrip.set_video(filename)
+        self.seekbar.set_duration(0)
+        self.seekbar.set_fps(None)
+        self.segmenttrack.set_duration(0)
+        self.waveform.set_peaks(None)
+        self.waveformloader.start(filename)
+
+        # Clears edit history
+        self.undostack.clear()
+
+        # Loads annotations of video from store, if any, or clears them. Rows loaded are not written back, and are
+        # what the journal replays edits onto
+        if self.store is not None:
+            self.store.source = None
+            self.annotmodel.set_annot(self.store.load(basename(filename)), log=False)
+            self.store.source = basename(filename)
+            self._start_journal(filename, rows=self.annot.copy())
+        else:
+            self.annotmodel.set_annot(empty_annot(), log=False)
+            self._start_journal(filename)
 
         # Updates button states
         self.playbtn.setEnabled(True)
@@ -409,16 +760,49 @@ class VideoAnnotator(QMainWindow):
         self.adddropdownbtn.setEnabled(True)
         self._update_btn_states(False)
 
+    def _set_video_info(self, info):
+        # Title is only shown. Annotations stay saved under, and rows added with, the video file name
+        if info["title"] and (info["title"] != self.videofname):
+            self.setWindowTitle("%s (%s)" %(info["title"], self.videofname))
+
+        if info["duration"] is not None:
+            self._set_duration(info["duration"])
+
+        if info["fps"] is not None:
+            self.fps = info["fps"]
+            self.seekbar.set_fps(self.fps)
+            self.annotmodel.set_time_format(self.annotmodel.timeformat, self.fps)
+
+    def _set_keyframes(self, fpath, keyframes):
+        # Ignores index of a video that is no longer open
+        if fpath == self.videofpath:
+            self.keyframes = keyframes
+
+    def _set_waveform(self, fpath, pyramid):
+        # Ignores peaks of a video that is no longer open
+        if fpath == self.videofpath:
+            self.waveform.set_peaks(pyramid)
+
+    def _set_duration(self, duration):
+        # Duration is known once video is parsed, or once playback starts. Times are checked against it again
+        if (duration > 0) & (duration != self.duration):
+            self.duration = duration
+            self._print_time()
+            self.seekbar.set_duration(duration)
+            self.filmstrip.set_duration(duration)
+            self.segmenttrack.set_duration(duration)
+            self.waveform.set_duration(duration)
+            self.annotmodel.invalidate()
+            self.validatetimer.start()
+
     def _play(self):
         self.videoplayer.play()
         self.playbtn.setIcon(self.style().standardIcon(QStyle.SP_MediaPause))
-        self.timer.start()
         self.ispaused = False
 
     def _pause(self):
         self.videoplayer.pause()
         self.playbtn.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
-        self.timer.stop()
         self.ispaused = True
 
     def _play_pause(self):
@@ -430,69 +814,102 @@ class VideoAnnotator(QMainWindow):
     def _stop(self):
         self.videoplayer.stop()
         self.playbtn.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
-        self.timer.stop()
 
-    def _set_position(self, position):
-        if self.videofname is not None:
+    def _update_play_icon(self, state):
+        # Keeps play button in step with player, e.g. when playback stops on its own
+        icon = QStyle.SP_MediaPause if state == "playing" else QStyle.SP_MediaPlay
+        self.playbtn.setIcon(self.style().standardIcon(icon))
+
+    def _set_position(self, time, snap=True):
+        # Seek bar drags snap to keyframes within a few pixels, so that zoomed in drags stay precise. Time is set
+        # precisely when seek bar is released
+        if (self.videofname is not None) & (self.duration > 0):
             if (not self.videoplayer.is_playing()) & (not self.ispaused):
                 self._play()
-            self.videoplayer.set_position(position/self.seekbarmax)
-            self.currtime = self.videoplayer.get_time()
-            self._print_time()
 
-    def _update_position(self):
-        self.seekbar.setValue(int(self.videoplayer.get_position()*self.seekbarmax))
-        self.currtime = self.videoplayer.get_time()
+            if snap & (self.keyframes is not None):
+                keyframe = self.keyframes.nearest(time)
+                if abs(keyframe - time) <= 4 * self.seekbar.ms_per_pixel():
+                    time = keyframe
+
+            self._seek(time)
+
+    def _update_position(self, time):
+        self.currtime = time
+        self.seekbar.set_time(time)
         self._print_time()
+        self.filmstrip.set_playhead(time)
+        self.segmenttrack.set_playhead(time)
+        self.waveform.set_playhead(time)
+        self._follow_playhead()
 
+    def _end_reached(self):
         # Stops video player when video ends
-        if (not self.videoplayer.is_playing()) & (not self.ispaused):
-            self._stop()
-            self.seekbar.setValue(self.seekbarmax)
-            self.currtime = self.duration
-            self._print_time()
+        self._stop()
+        self.currtime = self.duration
+        self.seekbar.set_time(self.currtime)
+        self._print_time()
+        self._follow_playhead()
+
+    def _validate(self):
+        # Marks cells with issues. Issue is shown when cursor is over the cell
+        self.annotmodel.validate(self.duration)
+
+    def _follow_playhead(self):
+        # Highlights rows containing current time, and scrolls first one into view when they change
+        rows = self.annotmodel.intervals.stab(self.currtime)
+        changed = self.annotmodel.set_active_rows(rows)
+
+        # Rows filtered out are not scrolled to
+        viewrows = self.annotproxy.view_rows(asarray(rows, dtype=int))
+        viewrows = viewrows[viewrows >= 0]
+
+        if changed & (len(viewrows) > 0) & (self.tableview.state() != QAbstractItemView.EditingState):
+            self.tableview.scrollTo(self.annotproxy.index(int(viewrows.min()), 0), QAbstractItemView.EnsureVisible)
 
     def _print_time(self):
-        self.time.setText("/".join(map(lambda x : str(timedelta(milliseconds=x)).split(".")[0], (self.currtime, self.duration))))
+        self.time.setText("/".join(map(lambda x : format_timecode(x, "hms"), (self.currtime, self.duration))))
 
     def _get_time(self):
-        row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+        row, col = self._current_cell()
 
         if (row != -1) & (col in [1, 2]):
-            # Backup current annotations
-            self.annot.to_csv(self.backupfpath, index=False)
-            self.labelbackup = None
-            self.undostate = 0
+            # Reads time from player rather than last time shown, and moves it to the start of the frame on screen
+            time = self.videoplayer.get_time() if self.videofname is not None else -1
+            time = snap_to_frame(time if time >= 0 else self.currtime, self._frame_rate())
 
             # Updates annotations
-            self.annot.loc[row, self.annot.columns[col]] = str(timedelta(milliseconds=self.currtime)).split(".")[0]
-            self._refresh_table()
-            self.tablewidget.setCurrentItem(self.tablewidget.item(row, col))
+            self.undostack.push(CellChange(self.annotmodel, row, col, time))
 
             # Updates button states
             self._update_btn_states()
 
+    def _move_edge(self, row, col, time):
+        # Start or end time dragged on segment track. Time is moved to the start of its frame
+        self.undostack.push(CellChange(self.annotmodel, row, col, snap_to_frame(time, self._frame_rate())))
+        self._update_btn_states()
+
     def _find_position(self):
-        row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+        row, col = self._current_cell()
 
-        try:
-            h, m, s = map(int, self.tablewidget.selectedItems()[0].text().split(":"))
-        except:
+        if (row == -1) | (col not in [1, 2]):
+            return
+
+        ms = self.annot.iat[row, col]
+
+        if isna(ms):
             return
 
-        ms = int(timedelta(hours=h, minutes=m, seconds=s).total_seconds()) * 1000
+        ms = int(ms)
 
         if ms <= self.duration:
             # Plays video from selected time
             if (not self.videoplayer.is_playing()) & (not self.ispaused):
                 self._play()
-            self.videoplayer.set_time(ms)
-            self.seekbar.setValue(int(self.videoplayer.get_position()*self.seekbarmax))
-            self.currtime = self.videoplayer.get_time()
-            self._print_time()
+            self._seek(ms)
 
             # Updates annotations
-            self.tablewidget.setCurrentItem(None)
+            self._set_current_cell(-1, -1)
         else:
             self._error("Selected time exceeds video duration." )
 
@@ -500,7 +917,7 @@ class VideoAnnotator(QMainWindow):
         if self.videofname is not None:
             self.videoplayer.audio_set_volume(volume)
 
-    def _import_csv_file(self, dpath, req_hdg=None):
+    def _open_csv_file(self, dpath, req_hdg=None):
         if self.videoplayer.is_playing():
             self._pause()
 
@@ -511,19 +928,20 @@ class VideoAnnotator(QMainWindow):
             return
 
         # Checks file uploaded is in csv format and contains required columns
-        if splitext(filename)[-1] != ".csv":
-            self._file_error("Please input a csv file.")
-            return
-
-        df = read_csv(filename)
-        df.columns = list(map(lambda x : x.lower().strip(), df.columns.tolist()))
+        try:
+            table_columns(filename, req_hdg)
+            return filename
+        except ValueError as error:
+            self._file_error(str(error))
 
-        missing_columns = [hdg for hdg in req_hdg if hdg not in df.columns]
-        if len(missing_columns) > 0:
-            self._file_error("The following columns are missing from the file uploaded:\n\n%s" %("\n".join(missing_columns)))
-            return
+    def _import_csv_file(self, dpath, req_hdg=None):
+        filename = self._open_csv_file(dpath, req_hdg)
 
-        return df[req_hdg].copy()
+        if filename is not None:
+            try:
+                return read_table(filename, req_hdg)
+            except ValueError as error:
+                self._file_error(str(error))
 
     def _file_error(self, text):
         if self.videoplayer.is_playing():
@@ -532,9 +950,9 @@ class VideoAnnotator(QMainWindow):
         self._error(text)
 
     def _import_annot_file(self):
-        csv = self._import_csv_file(self.annotdpath, annothdg)
+        filename = self._open_csv_file(self.annotdpath, annothdg)
 
-        if csv is not None:
+        if filename is not None:
             if not self.annot.empty:
                 # Confirms action
                 reply = self._confirm_action("Are you sure you want to overwrite existing annotations?")
@@ -542,28 +960,77 @@ class VideoAnnotator(QMainWindow):
                 if reply == QMessageBox.No:
                     return
 
-            # Backup current annotations
-            self.annot.to_csv(self.backupfpath, index=False)
-            self.labelbackup = None
-            self.undostate = 0
+            # Clears table, then reads file in the background. Times are converted to ms, leading and trailing
+            # whitespaces removed from labels and duplicates removed as each chunk is read
+            self._set_current_cell(-1, -1)
+            self.importold = self.annot
+            self.importstart = perf_counter()
+            self.annotmodel.set_annot(empty_annot(), log=False)
+            self._set_importing(True)
+            self.importer.start(filename, self.annotmodel.fps)
+
+    def _import_chunk(self, job, chunk, progress):
+        if (job != self.importer.job) | (self.importold is None):
+            return
 
-            # Remove leading and trailing whitespaces from labels
-            annotlabels = list(map(lambda x : str(x).strip(), csv["label"]))
+        self.annotmodel.append_rows(chunk)
+        self.importprogress.setValue(int(progress * 1000))
 
-            if self.label is not None:
-                # Checks all labels in annotations exist in label drop-down list. Otherwise, updates label drop-down list
-                labels = self.label["label"].tolist()
-                labels = self._check_missing_labels(annotlabels, labels)
-                self.label = DataFrame(labels, columns=["label"])
+    def _import_finished(self, job, invalid, duplicates):
+        if (job != self.importer.job) | (self.importold is None):
+            return
 
-            # Updates annotations
-            csv["label"] = annotlabels
-            csv = csv.drop_duplicates().reset_index(drop=True)
-            self.annot = csv
-            self._refresh_table()
+        oldannot, self.importold = self.importold, None
+        self._set_importing(False)
+        print("Imported %d rows in %.2f s, %d duplicate(s) removed" %(self.annot.shape[0], perf_counter() - self.importstart, duplicates))
 
-            # Updates button states
-            self._update_btn_states()
+        if invalid > 0:
+            self._error("%d time(s) could not be read and have been left empty.\n\nPlease input times as H:MM:SS, H:MM:SS.mmm or HH:MM:SS:FF." %invalid)
+
+        # Updates annotations. Import is undone in one step, back to the annotations it replaced
+        commands = [TableReset(self.annotmodel, self.annot, oldannot)]
+
+        if self.label is not None:
+            # Checks all labels in annotations exist in label drop-down list. Otherwise, updates label drop-down list
+            labels = self.label["label"].tolist()
+            labels = self._check_missing_labels(self.annot["label"], labels)
+            commands.append(LabelListSwap(self.annotmodel, self.labelmodel, self._set_label_list, self.label, DataFrame(labels, columns=["label"])))
+
+        self.undostack.push(MacroCommand(commands))
+
+        # Updates button states
+        self._update_btn_states()
+
+    def _import_failed(self, job, text):
+        if (job != self.importer.job) | (self.importold is None):
+            return
+
+        self._restore_import()
+        self._file_error(text)
+
+    def _cancel_import(self):
+        if self.importold is not None:
+            self.importer.cancel()
+            self._restore_import()
+
+    def _restore_import(self):
+        # Puts back annotations the import would have replaced. Nothing was logged, so nothing is undone
+        oldannot, self.importold = self.importold, None
+        self.annotmodel.set_annot(oldannot, log=False)
+        self._set_importing(False)
+
+    def _set_importing(self, importing):
+        # Annotations cannot be changed while an import is read, but rows read so far can be browsed
+        self.importprogress.setValue(0)
+        self.importprogress.setVisible(importing)
+        self.cancelimportbtn.setVisible(importing)
+        self.btnpanelwidget.setEnabled(not importing)
+        self.newvideobtn.setEnabled(not importing)
+        self.segmenttrack.setEnabled(not importing)
+        self.annotmodel.readonly = importing
+
+        for shortcut in self.findChildren(QShortcut):
+            shortcut.setEnabled(not importing)
 
     def _import_label_file(self):
         csv = self._import_csv_file(self.labeldpath, labelhdg)
@@ -576,52 +1043,39 @@ class VideoAnnotator(QMainWindow):
                 if reply == QMessageBox.No:
                     return
 
-            # Backup current annotations
-            self.annot.to_csv(self.backupfpath, index=False)
-            self.labelbackup = self.label.copy() if self.label is not None else None
-            self.undostate = 1
-
             # Remove duplicates and leading and trailing whitespaces from labels
-            csv = csv[list(map(lambda x: not x, csv["label"].str.strip().str.lower().duplicated()))]
-            labels = list(map(lambda x : str(x).strip(), csv["label"]))
+            labels = normalize_labels(csv)
 
             # Checks all labels in annotations exist in label drop-down list. Otherwise, updates label drop-down list
-            annotlabels = self.annot["label"].tolist()
-            labels = self._check_missing_labels(annotlabels, labels)
+            labels = self._check_missing_labels(self.annot["label"], labels)
 
             # Adds label drop-down list
-            self.label = DataFrame(labels, columns=["label"]).sort_values('label').reset_index(drop=True)
-            self._refresh_table()
+            oldlabel = self.label
+            newlabel = DataFrame(labels, columns=["label"]).sort_values('label').reset_index(drop=True)
+            self.undostack.push(LabelListSwap(self.annotmodel, self.labelmodel, self._set_label_list, oldlabel, newlabel))
 
-            if self.labelbackup is not None:
+            if oldlabel is not None:
                 self._success("New label drop-down list added.")
 
-            if self.annot.empty & (self.labelbackup is None):
+            if self.annot.empty & (oldlabel is None):
                 self._success("Label drop-down list added.")
 
             # Updates button states
-            self.deldropdownbtn.setEnabled(True)
             self._update_btn_states()
 
     def _check_missing_labels(self, annotlabels, labels):
         # Checks all labels in annotations exist in label drop-down list
-        missing_labels = []
-
-        for label in annotlabels:
-            label = str(label)
-            if (label != "") & (label != "nan") & (label.lower() not in list(map(lambda x : str(x).lower(), labels))):
-                if label.lower() not in list(map(lambda x : str(x).lower(), missing_labels)):
-                    missing_labels.append(label)
+        missinglabels = missing_labels(annotlabels, labels)
 
-        if len(missing_labels) > 0:
+        if len(missinglabels) > 0:
             if self.videoplayer.is_playing():
                 self._pause()
 
             # Adds missing labels to label drop-down list
-            reply = self._confirm_action("The following label(s) are missing from label drop-down list:\n\n%s\n\nAdd to label drop-down list?" %("\n".join(missing_labels)))
+            reply = self._confirm_action("The following label(s) are missing from label drop-down list:\n\n%s\n\nAdd to label drop-down list?" %("\n".join(missinglabels)))
 
             if reply == QMessageBox.Yes:
-                labels += missing_labels
+                labels += missinglabels
 
         return labels
 
@@ -633,158 +1087,220 @@ class VideoAnnotator(QMainWindow):
         reply = self._confirm_action("Are you sure you want to remove label drop-down list?")
 
         if reply == QMessageBox.Yes:
-            # Backup current annotations
-            self.annot.to_csv(self.backupfpath, index=False)
-            self.labelbackup = self.label.copy() if self.label is not None else None
-            self.undostate = 1
-
             # Removes label drop-down list
-            self.label = None
-            self._refresh_table()
+            self.undostack.push(LabelListSwap(self.annotmodel, self.labelmodel, self._set_label_list, self.label, None))
 
             if self.annot.empty:
                 self._success("Label drop-down list removed.")
 
             # Updates button states
-            self.deldropdownbtn.setEnabled(False)
             self._update_btn_states()
 
     def _on_cell_selection(self):
         self._update_btn_states()
 
-    def _update_annot(self):
-        if len(self.tablewidget.selectedItems()) == 0:
+    def _update_annot(self, row, col, value):
+        # Edit of a selected cell applies to every selected cell of its column, e.g. to relabel rows
+        rows = self._selected_cells().get(col, arange(0))
+        if (len(rows) > 1) & (row in rows):
+            self._fill_cells({col : rows}, value)
             return
 
-        # Backup current annotations
-        self.annot.to_csv(self.backupfpath, index=False)
-        self.labelbackup = None
-        self.undostate = 0
+        value = value.strip()
+
+        # Converts times to ms. Empty times are stored as None
+        if annothdg[col] in timecols:
+            ms = parse_timecode(value, self.annotmodel.fps)
+
+            if (value != "") & (ms is None):
+                self._error("Please input time as H:MM:SS or H:MM:SS.mmm.")
+                return
+
+            value = ms
+
+        # Pasted labels are checked against label drop-down list as bulk edits are
+        elif annothdg[col] == "label":
+            values = self._parse_cells(col, [value])
+            if values is None:
+                return
+
+            value = values[0]
 
         # Updates annotations
-        row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
-        self.annot.loc[row, self.annot.columns[col]] = self.tablewidget.selectedItems()[0].text().strip()
-        self._refresh_table()
+        self.undostack.push(CellChange(self.annotmodel, row, col, value))
 
         # Updates button states
         self._update_btn_states()
 
-    def _refresh_table(self):
-        size = self.annot.shape[0]
+    def _parse_cells(self, col, values):
+        # Returns column values read from text, as stored in annotations, or None if any time or label cannot be read
+        values = Series(values, dtype=object).fillna("").astype(str).str.strip()
 
-        self.tablewidget.clearContents()
-        self.tablewidget.setRowCount(0)
+        if annothdg[col] in timecols:
+            times = parse_timecodes(values, self.annotmodel.fps)
 
-        for i in range(size):
-            rowcount = self.tablewidget.rowCount()
-            self.tablewidget.insertRow(rowcount)
+            if (times.isna() & (values != "")).any():
+                self._error("Please input time as H:MM:SS or H:MM:SS.mmm.")
+                return None
 
-            rowitems = [item if (item != "nan") else "" for item in list(map(str, self.annot.loc[i]))]
+            return times.to_numpy(dtype=object)
 
-            self.tablewidget.setItem(i, 0, QTableWidgetItem(rowitems[0]))
-            self.tablewidget.setItem(i, 1, QTableWidgetItem(rowitems[1]))
-            self.tablewidget.setItem(i, 2, QTableWidgetItem(rowitems[2]))
-            if self.label is None:
-                self.tablewidget.setItem(i, 3, QTableWidgetItem(rowitems[3]))
-            else:
-                self.tablewidget.setCellWidget(i, 3, self._add_combo_box(i, rowitems[3]))
-            self.tablewidget.setCellWidget(i, 4, self._add_delete_btn(i))
-
-    def _add_combo_box(self, row, label):
-        # Creates label drop-down list
-        combobox = QComboBox()
-        comboitems = self.label["label"].tolist()
-        comboitems.insert(0, "")
-
-        for item in comboitems:
-            combobox.addItem(item)
-
-        # Checks label exists in label drop-down list. If not, remove label
-        label = label.lower()
-        comboitems = list(map(lambda x : x.lower(), comboitems))
-        if label in comboitems:
-            currentindex = comboitems.index(label)
-            self.annot.loc[row, "label"] = comboitems[currentindex]
+        # Labels must be in label drop-down list, if there is one, as in the label editor. They take its case
+        if (annothdg[col] == "label") & (self.label is not None):
+            unknown = values[(self.labelmodel.registry.lookup(values) < 0) & (values != "")]
+
+            if len(unknown) > 0:
+                self._error("Label %s is not in the label drop-down list." %unknown.iloc[0])
+                return None
+
+            return self.labelmodel.canonical(values)
+
+        return values.to_numpy(dtype=object)
+
+    def _fill_cells(self, cells, text):
+        # Sets {col : rows} cells to text, as one edit. Columns selected on the same rows are set together
+        blocks = {}
+        for col, rows in cells.items():
+            blocks.setdefault(rows.tobytes(), (rows, []))[1].append(col)
+
+        commands = []
+        for rows, cols in blocks.values():
+            columns = [self._parse_cells(col, [text] * len(rows)) for col in cols]
+            if any(values is None for values in columns):
+                return
+
+            commands.append(BlockChange(self.annotmodel, rows, cols, columns))
+
+        if len(commands) > 0:
+            self.undostack.push(commands[0] if len(commands) == 1 else MacroCommand(commands))
+
+        # Updates button states
+        self._update_btn_states()
+
+    def _paste_block(self, lines):
+        # Pastes tab-separated lines, e.g. copied from a spreadsheet, from the top left selected cell on, as one edit.
+        # Lines go to rows as shown in the table, so that rows filtered out are left alone. Cells past the label column
+        # are dropped. Lines past the last row are added as rows if all rows are shown in table order, and are
+        # dropped otherwise
+        selection = self.tableview.selectionModel().selection()
+        if len(selection) > 0:
+            viewtop, left = min(selected.top() for selected in selection), min(selected.left() for selected in selection)
         else:
-            currentindex = 0
-            self.annot.loc[row, "label"] = ""
+            viewtop, left = self.tableview.currentIndex().row(), self.tableview.currentIndex().column()
+        block = DataFrame([line.split("\t") for line in lines], dtype=object)
+        cols = list(range(left, min(left + block.shape[1], len(annothdg))))
+        if len(cols) == 0:
+            return
 
-        combobox.setCurrentIndex(currentindex)
+        columns = []
+        for i, col in enumerate(cols):
+            values = self._parse_cells(col, block[i])
+            if values is None:
+                return
 
-        combobox.currentIndexChanged.connect(lambda: self._selection_change(combobox, row))
+            columns.append(values)
 
-        return combobox
+        nrows = self.annotmodel.rowCount()
+        rows = self.annotproxy.source_rows(viewtop, viewtop + block.shape[0] - 1)
+        inside = len(rows)
+        commands = []
 
-    def _selection_change(self, combobox, row):
-        # Backup current annotations
-        self.annot.to_csv(self.backupfpath, index=False)
-        self.labelbackup = None
-        self.undostate = 0
+        if inside > 0:
+            commands.append(BlockChange(self.annotmodel, rows, cols, [values[:inside] for values in columns]))
 
-        # Updates annotations
-        self.annot.loc[row, "label"] = combobox.currentText()
+        if (block.shape[0] > inside) & self.annotproxy.shows_all():
+            newrows = DataFrame({"video_file" : self.videofname, "start_time" : None, "end_time" : None, "label" : ""},
+                                index=range(block.shape[0] - inside), columns=annothdg)
+            for col, values in zip(cols, columns):
+                newrows[annothdg[col]] = values[inside:]
+            commands.append(RowsInsert(self.annotmodel, arange(nrows, nrows + newrows.shape[0]), newrows))
+            rows = concatenate([rows, arange(nrows, nrows + newrows.shape[0])])
 
-        # Updates button state
+        if len(commands) == 0:
+            return
+
+        self.undostack.push(commands[0] if len(commands) == 1 else MacroCommand(commands))
+        self._select_block(rows, left, cols[-1])
+
+        # Updates button states
         self._update_btn_states()
 
-    def _add_delete_btn(self, row):
-        deletebtnwidget = QWidget()
-        deletebtn = QPushButton("Delete")
-        deletebtn.setStyleSheet(""" text-align : center;
-                              background-color : NavajoWhite;
-                              height : 32px;
-                              border-style: outset """)
+    def _shift_segments(self, delta):
+        # Shifts start and end times of selected rows by delta ms, as one edit. Segments stop at the start of the video
+        rows = self._selected_rows()
+        if (len(rows) == 0) | self.annotmodel.readonly:
+            return
 
-        deletebtn.clicked.connect(lambda:self._delete_row(row))
+        times = self.annot.iloc[rows, [1, 2]]
+        earliest = times.min().min()
+        if isna(earliest):
+            return
 
-        hlayout = QHBoxLayout()
-        hlayout.addWidget(deletebtn)
-        hlayout.setContentsMargins(6, 3, 6, 3)
-        deletebtnwidget.setLayout(hlayout)
+        delta = max(delta, -int(earliest))
+        if delta != 0:
+            self.undostack.push(BlockChange(self.annotmodel, rows, [1, 2], [(times[hdg] + delta).to_numpy(dtype=object) for hdg in timecols]))
 
-        return deletebtnwidget
+        # Updates button states
+        self._update_btn_states()
 
-    def _add_row(self):
-        # Backup current annotation data
-        self.annot.to_csv(self.backupfpath, index=False)
-        self.labelbackup = None
-        self.undostate = 0
+    def _set_label_list(self, label):
+        self.label = label
 
+        if self.journal is not None:
+            self.journal.append({"op" : "labels", "labels" : label["label"].tolist() if label is not None else None})
+        self.autosaver.schedule()
+
+        if label is None:
+            self.tableview.setItemDelegateForColumn(3, None)
+        else:
+            self.labelmodel.set_labels(label["label"])
+            self.tableview.setItemDelegateForColumn(3, self.labeldelegate)
+
+        self.deldropdownbtn.setEnabled(label is not None)
+
+    def _add_row(self):
         # Updates annotations
-        row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+        row, col = self._current_cell()
         col = 0 if col == -1 else col
-        newrow = (row+1) if (row!=-1) else self.tablewidget.rowCount()
+        newrow = (row+1) if (row!=-1) else self.annotmodel.rowCount()
 
-        annotupr = self.annot[:newrow].copy()
-        annotlwr = self.annot[newrow:].copy()
-        annotupr.loc[newrow] = (self.videofname, "", "", "")
-
-        self.annot = annotupr.append(annotlwr).reset_index(drop=True).copy()
-        del annotupr, annotlwr
-        self._refresh_table()
-        self.tablewidget.setCurrentItem(self.tablewidget.item(newrow, col))
+        self.undostack.push(RowInsert(self.annotmodel, newrow, (self.videofname, None, None, "")))
+        self._set_current_cell(newrow, col)
 
         # Updates button states
         self._update_btn_states()
 
     def _delete_row(self, row):
-        # Backup current annotation data
-        self.annot.to_csv(self.backupfpath, index=False)
-        self.labelbackup = None
-        self.undostate = 0
+        if self.annotmodel.readonly:
+            return
 
-        col = self.tablewidget.currentColumn()
+        col = self.tableview.currentIndex().column()
         col = 0 if col == -1 else col
 
         # Updates annotations
-        self.annot.drop(row, inplace=True)
-        self.annot = self.annot.reset_index(drop=True)
-        self._refresh_table()
+        self.undostack.push(RowDelete(self.annotmodel, row))
 
         if row < self.annot.shape[0]:
-            self.tablewidget.setCurrentItem(self.tablewidget.item(row, col))
+            self._set_current_cell(row, col)
         elif row > 0:
-            self.tablewidget.setCurrentItem(self.tablewidget.item(row-1, col))
+            self._set_current_cell(row-1, col)
+
+        # Updates button states
+        self._update_btn_states()
+
+    def _delete_rows(self, rows):
+        # Deletes rows, given in ascending order, as one edit
+        if self.annotmodel.readonly:
+            return
+
+        col = self.tableview.currentIndex().column()
+        col = 0 if col == -1 else col
+
+        # Updates annotations
+        self.undostack.push(RowsDelete(self.annotmodel, rows))
+
+        if self.annot.shape[0] > 0:
+            self._set_current_cell(min(int(rows[0]), self.annot.shape[0]-1), col)
 
         # Updates button states
         self._update_btn_states()
@@ -797,89 +1313,103 @@ class VideoAnnotator(QMainWindow):
         reply = self._confirm_action("Are you sure you want to clear table?")
 
         if reply == QMessageBox.Yes:
-            # Backup current annotations
-            self.annot.to_csv(self.backupfpath, index=False)
-            self.labelbackup = None
-            self.undostate = 0
-
             # Clears annotations
-            self.annot = DataFrame(columns=annothdg)
-            self._refresh_table()
+            self.undostack.push(TableReset(self.annotmodel, empty_annot()))
 
             # Updates button states
             self._update_btn_states()
 
     def _undo(self):
-        if self.undostate == -1:
-            return
+        row, col = self._current_cell()
 
-        row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+        if self.undostack.undo() is not None:
+            self._restore_current_cell(row, col)
 
-        if self.undostate == 0:
-            # Reads data from backup file
-            try:
-                csv = read_csv(self.backupfpath)
-                csv = csv[annothdg]
-            except:
-                return
+    def _redo(self):
+        row, col = self._current_cell()
 
-            # Updates annotations
-            self.annot = csv
-            self._refresh_table()
+        if self.undostack.redo() is not None:
+            self._restore_current_cell(row, col)
 
-        elif self.undostate == 1:
-            # Updates labels
-            printmsg = True if ((self.label is not None) & (self.labelbackup is not None)) else False
-            self.label = self.labelbackup
-            self._refresh_table()
+    def _restore_current_cell(self, row, col):
+        if (row != -1) & (col != -1):
+            self._set_current_cell(min(row, self.annot.shape[0]-1), col)
 
-            if printmsg | (self.annot.empty) & (self.label is not None):
-                self._success("Reverted to previous label drop-down list.")
+        # Updates button states
+        self._update_btn_states()
 
-            if (self.annot.empty) & (self.label is None):
-                self._success("Label drop-down list removed.")
+    def _save_fpaths(self, autosave=False):
+        # Autosaves go to files of their own, so that saved annotations are only replaced when saved by hand
+        videotitle = splitext(self.videofname)[0]
+        suffix = ".autosave.csv" if autosave else ".csv"
+        annotfpath = join(self.annotdpath, videotitle + "_annotations" + suffix)
+        labelfpath = join(self.labeldpath, videotitle + "_labels" + suffix) if self.label is not None else None
+        return annotfpath, labelfpath
 
-        if (row != -1) & (col != -1):
-            self.tablewidget.setCurrentItem(self.tablewidget.item(row, col))
+    def _save_tables(self, autosave=False):
+        # Returns files to save as (fpath, serialize) pairs. Frames are copied, so that they can be serialized on another thread
+        annotfpath, labelfpath = self._save_fpaths(autosave)
+        annot = self.annot.copy()
+        tables = [(annotfpath, lambda : encode_time_columns(annot).to_csv(index=None))]
 
-        self.undostate = -1
+        if labelfpath is not None:
+            label = self.label.copy()
+            tables.append((labelfpath, lambda : label.to_csv(index=None)))
 
-        # Updates button states
-        self._update_btn_states()
-        if self.label is not None:
-            self.deldropdownbtn.setEnabled(True)
-        else:
-            self.deldropdownbtn.setEnabled(False)
+        return tables
 
     def _save(self):
         if self.videofname is not None:
-            videotitle = splitext(self.videofname)[0]
-
-            # Saves annotations
-            annotfpath = join(self.annotdpath, videotitle + "_annotations.csv")
+            # Saves annotations and labels. Files are replaced only once written in full
+            tables = self._save_tables()
             try:
-                self.annot.to_csv(annotfpath, index=None)
-            except:
-                self._error("Could not save annotations to %s.\n\nPlease check that the file is not currently in used by another application." %annotfpath)
+                self.autosaver.save(tables)
+            except OSError as error:
+                self._error("%s\n\nPlease check that the file is not currently in used by another application." %error)
                 return
 
-            print("Annotations saved to: ", annotfpath)
+            for name, (fpath, _) in zip(("Annotations", "Labels"), tables):
+                print("%s saved to: " %name, fpath)
 
-            # Saves labels
-            if self.label is not None:
-                labelfpath = join(self.labeldpath, videotitle + "_labels.csv")
-                try:
-                    self.label.to_csv(labelfpath, index=None)
-                except:
-                    self._error("Could not save labels to %s.\n\nPlease check that the file is not currently in used by another application." %labelfpath)
-                    return
+            self.savestatus.setText("Saved %s" %strftime("%H:%M:%S"))
+            self._saved()
+            return 0
 
-                print("Labels saved to: ", labelfpath)
+    def _saved(self, autosave=False):
+        # Starts journal again from saved files
+        annotfpath, labelfpath = self._save_fpaths(autosave)
+        self.journal.restart(dict(self.journal.header, annot=annotfpath, label=labelfpath, rows=None))
 
-            # Updates button states
-            self._update_btn_states(save=False)
+        if autosave:
+            return
 
-            return 0
+        # Autosaves are out of date once saved by hand
+        for fpath in self._save_fpaths(True):
+            if (fpath is not None) and exists(fpath):
+                remove(fpath)
+
+        # Updates button states
+        self._update_btn_states(save=False)
+
+    def _autosave_tables(self):
+        # Nothing is autosaved until annotations or labels are changed
+        if (self.videofname is None) or (not self.savebtn.isEnabled()) or (self.importold is not None):
+            return None
+
+        return self._save_tables(True)
+
+    def _autosaved(self, generation, savedat, latency):
+        self.savestatus.setText("Autosaved %s (%.0f ms)" %(strftime("%H:%M:%S", localtime(savedat)), latency))
+        self.savestatus.setToolTip("")
+
+        # Edits made since the snapshot was taken are still unsaved
+        if (generation == self.autosaver.generation) & (self.videofname is not None):
+            self._saved(True)
+
+    def _autosave_failed(self, generation, text):
+        self.savestatus.setText("Autosave failed")
+        self.savestatus.setToolTip(text)
+        print(text)
 
     def _confirm_action(self, text):
         dialogbox = QMessageBox()
@@ -912,107 +1442,152 @@ class VideoAnnotator(QMainWindow):
             self._add_row()
 
     def _shortcut_ctrlminus(self):
-        row = self.tablewidget.currentRow()
+        rows = self._selected_rows()
 
-        if row != -1:
-            self._delete_row(row)
+        if len(rows) == 1:
+            self._delete_row(int(rows[0]))
+        elif len(rows) > 1:
+            self._delete_rows(rows)
 
     def _shortcut_up(self):
         if self.videofname is not None:
-            row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+            row, col = self._current_cell()
 
             if (row != -1) & (col != -1):
-                # If table cell selected, move to cell above
-                self.tablewidget.setCurrentItem(self.tablewidget.item(max(0, row-1), col))
+                # If table cell selected, move to cell above, as rows are shown
+                viewrow = self.tableview.currentIndex().row()
+                self._set_view_cell(max(0, viewrow-1), col)
 
     def _shortcut_down(self):
         if self.videofname is not None:
-            row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+            row, col = self._current_cell()
 
             if (row != -1) & (col != -1):
-                # If table cell selected, move to cell below
-                self.tablewidget.setCurrentItem(self.tablewidget.item(min(row+1, self.annot.shape[0]-1), col))
+                # If table cell selected, move to cell below, as rows are shown
+                viewrow = self.tableview.currentIndex().row()
+                self._set_view_cell(min(viewrow+1, self.annotproxy.rowCount()-1), col)
 
     def _shortcut_left(self):
         if self.videofname is not None:
-            row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+            row, col = self._current_cell()
 
             if (row == -1) & (col == -1):
-                # If no table cell selected, rewind video by 5s
-                position = max(0, self.videoplayer.get_position() - 5000/self.duration)
-                self._skip(position)
+                # If no table cell selected, rewind video by 5s, or further while key is held
+                self._skip(max(0, self.currtime - self.skipaccel.step(-1)))
 
             elif (row != -1) & (col != -1):
                 # If table cell selected, move to cell to the left
-                self.tablewidget.setCurrentItem(self.tablewidget.item(row, max(0, col-1)))
+                self._set_current_cell(row, max(0, col-1))
 
     def _shortcut_right(self):
         if self.videofname is not None:
-            row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+            row, col = self._current_cell()
 
             if (row == -1) & (col == -1):
-                # If no table cell selected, fast forward video by 5s
-                position = min(self.videoplayer.get_position() + 5000/self.duration, self.duration)
-                self._skip(position)
+                # If no table cell selected, fast forward video by 5s, or further while key is held
+                self._skip(min(self.currtime + self.skipaccel.step(1), self.duration))
 
             elif (row != -1) & (col != -1):
                 # If table cell selected, move to cell to the right
-                lastcol = 2 if self.label is not None else 3
-                self.tablewidget.setCurrentItem(self.tablewidget.item(row, min(col+1, lastcol)))
+                lastcol = 3
+                self._set_current_cell(row, min(col+1, lastcol))
 
-    def _skip(self, position):
+    def _skip(self, time):
         if self.videoplayer.is_playing() | self.ispaused:
-            self.videoplayer.set_position(position)
-            self.seekbar.setValue(int(self.videoplayer.get_position()*self.seekbarmax))
-            self.currtime = self.videoplayer.get_time()
-            self._print_time()
+            self._seek(time)
+
+    def _seek(self, time):
+        # Seeks to time in ms. Time shown is updated right away rather than read back from player, which lags behind
+        self.seeker.request(int(time))
+        self.currtime = int(time)
+        self.seekbar.set_time(self.currtime)
+        self._print_time()
+        self.filmstrip.set_playhead(self.currtime)
+        self.segmenttrack.set_playhead(self.currtime)
+        self.waveform.set_playhead(self.currtime)
+        self._follow_playhead()
+
+    def _frame_rate(self):
+        # Frame rate is read from video information, or from player once video is playing, and kept
+        if (self.fps is None) & (self.videofname is not None):
+            fps = self.videoplayer.get_fps()
+            if fps > 0:
+                self.fps = fps
+                self.seekbar.set_fps(self.fps)
+                self.annotmodel.set_time_format(self.annotmodel.timeformat, self.fps)
+
+        return self.fps
+
+    def _next_frame(self):
+        # Steps forward by decoding the next frame only. Pauses video
+        if (self.videofname is None) or (not self._frame_rate()):
+            return
+
+        if not self.ispaused:
+            self._pause()
+        self.videoplayer.next_frame()
+
+        self.currtime = frame_time(frame_of(self.currtime, self.fps) + 1, self.fps)
+        self._print_time()
+        self._follow_playhead()
+
+    def _previous_frame(self):
+        # Steps back by seeking to start of previous frame, as player cannot decode backwards. Pauses video
+        if (self.videofname is None) or (not self._frame_rate()):
+            return
+
+        if not self.ispaused:
+            self._pause()
+        self._seek(frame_time(max(0, frame_of(self.currtime, self.fps) - 1), self.fps))
 
     def _shortcut_tab(self):
         if self.videofname is not None:
-            row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+            row, col = self._current_cell()
 
             if (row != -1) & (col != -1):
-                # If table cell selected, move to next cell
-                lastrow = self.annot.shape[0] - 1
-                lastcol = 2 if self.label is not None else 3
-                nextrow = row if (col < lastcol) else (row+1)%(lastrow+1)
+                # If table cell selected, move to next cell, as rows are shown
+                viewrow = self.tableview.currentIndex().row()
+                lastrow = self.annotproxy.rowCount() - 1
+                lastcol = 3
+                nextrow = viewrow if (col < lastcol) else (viewrow+1)%(lastrow+1)
                 nextcol = (col+1) % (lastcol+1)
 
-                self.tablewidget.setCurrentItem(self.tablewidget.item(nextrow, nextcol))
+                self._set_view_cell(nextrow, nextcol)
 
     def _shortcut_backtab(self):
         if self.videofname is not None:
-            row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+            row, col = self._current_cell()
 
             if (row != -1) & (col != -1):
-                # If table cell selected, move to previous cell
-                lastrow = self.annot.shape[0] - 1
-                lastcol = 2 if self.label is not None else 3
-                prevrow = row if (col!=0) else ((row-1) if (row!=0) else lastrow)
+                # If table cell selected, move to previous cell, as rows are shown
+                viewrow = self.tableview.currentIndex().row()
+                lastrow = self.annotproxy.rowCount() - 1
+                lastcol = 3
+                prevrow = viewrow if (col!=0) else ((viewrow-1) if (viewrow!=0) else lastrow)
                 prevcol = (col-1) if (col!=0) else lastcol
 
-                self.tablewidget.setCurrentItem(self.tablewidget.item(prevrow, prevcol))
+                self._set_view_cell(prevrow, prevcol)
 
     def _shortcut_home(self):
         if self.videofname is not None:
-            row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+            row, col = self._current_cell()
 
             if (row != -1) & (col != -1):
                 # If table cell selected, move to first cell in row
-                self.tablewidget.setCurrentItem(self.tablewidget.item(row, 0))
+                self._set_current_cell(row, 0)
 
     def _shortcut_end(self):
         if self.videofname is not None:
-            row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+            row, col = self._current_cell()
 
             if (row != -1) & (col != -1):
                 # If table cell selected, move to last cell in row
-                lastcol = 2 if self.label is not None else 3
-                self.tablewidget.setCurrentItem(self.tablewidget.item(row, lastcol))
+                lastcol = 3
+                self._set_current_cell(row, lastcol)
 
     def _shortcut_space(self):
         if self.videofname is not None:
-            row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+            row, col = self._current_cell()
 
             if (row == -1) & (col == -1):
                 # If no table cell selected, play/pause video
@@ -1020,7 +1595,7 @@ class VideoAnnotator(QMainWindow):
 
             elif (row != -1) & (col != -1):
                 # If table cell selected, edit cell
-                self.tablewidget.editItem(self.tablewidget.item(row, col))
+                self.tableview.edit(self.annotproxy.mapFromSource(self.annotmodel.index(row, col)))
 
     def _shortcut_ins(self):
         self._get_time()
@@ -1030,52 +1605,64 @@ class VideoAnnotator(QMainWindow):
         self._shortcut_del()
 
     def _shortcut_copy(self):
-        row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+        row, col = self._current_cell()
+        cells = self._selected_cells()
+
+        if sum(map(len, cells.values())) > 1:
+            # Copies selected cells as tab-separated lines, which spreadsheets paste as cells. Rows and columns between
+            # selected ones are left out, so each selected row must have the same columns selected. Rows are copied
+            # as shown in the table
+            cols = sorted(cells)
+            rows = cells[cols[0]]
+            if any((len(cells[c]) != len(rows)) or (cells[c] != rows).any() for c in cols):
+                self._error("Please select the same columns on every row to copy.")
+                return
 
-        if (row != -1) & (col != -1):
+            rows = rows[self.annotproxy.view_rows(rows).argsort()]
+
+            block = self.annot.iloc[rows, cols]
+            text = DataFrame({hdg : format_timecodes(block[hdg], self.annotmodel.timeformat, self.annotmodel.fps) if hdg in timecols
+                              else block[hdg].astype(object).fillna("") for hdg in block.columns})
             clipboard = QApplication.clipboard()
-            clipboard.setText(self.tablewidget.selectedItems()[0].text())
+            clipboard.setText("\n".join(text.astype(str).agg("\t".join, axis=1).tolist()))
+        elif (row != -1) & (col != -1):
+            clipboard = QApplication.clipboard()
+            clipboard.setText(self.tableview.currentIndex().data())
 
     def _shortcut_paste(self):
-        row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+        row, col = self._current_cell()
 
         if (row != -1) & (col != -1):
-            # Backup current annotation data
-            self.annot.to_csv(self.backupfpath, index=False)
-            self.labelbackup = None
-            self.undostate = 0
-
             # Updates annotations
             clipboard = QApplication.clipboard()
-            self.annot.loc[row, self.annot.columns[col]] = clipboard.text()
-            self._refresh_table()
-            self.tablewidget.setCurrentItem(self.tablewidget.item(row, col))
-
-            # Updates button states
-            self._update_btn_states()
+            text = clipboard.text()
+            lines = text.rstrip("\r\n").split("\n")
+            cells = self._selected_cells()
+
+            if (len(lines) > 1) | ("\t" in lines[0]):
+                self._paste_block([line.rstrip("\r") for line in lines])
+            elif sum(map(len, cells.values())) > 1:
+                # Single value fills every selected cell
+                self._fill_cells(cells, text)
+            else:
+                self._update_annot(row, col, text)
 
     def _shortcut_del(self):
-        row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
-
-        if (row != -1) & (col != -1):
-            # Backup current annotation data
-            self.annot.to_csv(self.backupfpath, index=False)
-            self.labelbackup = None
-            self.undostate = 0
+        row, col = self._current_cell()
+        cells = self._selected_cells()
 
+        if sum(map(len, cells.values())) > 1:
             # Updates annotations
-            self.annot.loc[row, self.annot.columns[col]] = ""
-            self._refresh_table()
-            self.tablewidget.setCurrentItem(self.tablewidget.item(row, col))
-
-            # Updates button states
-            self._update_btn_states()
+            self._fill_cells(cells, "")
+        elif (row != -1) & (col != -1):
+            # Updates annotations
+            self._update_annot(row, col, "")
 
     def _shortcut_esc(self):
-        self.tablewidget.setCurrentItem(None)
+        self._set_current_cell(-1, -1)
 
     def _update_btn_states(self, save=True):
-        row, col = self.tablewidget.currentRow(), self.tablewidget.currentColumn()
+        row, col = self._current_cell()
 
         if (row != -1) & (col in [1, 2]):
             self.inserttimebtn.setEnabled(True)
@@ -1092,6 +1679,9 @@ class VideoAnnotator(QMainWindow):
         self.savebtn.setEnabled(save)
 
     def closeEvent(self, event):
+        # Import still being read is dropped
+        self._cancel_import()
+
         if (not self.annot.empty) & self.savebtn.isEnabled():
             reply = self._confirm_action("Save changes to annotations?")
             saveoutcome = 0
@@ -1103,9 +1693,20 @@ class VideoAnnotator(QMainWindow):
                  event.ignore()
                  return
 
-        if self.backupfpath is not None:
-            if exists(self.backupfpath):
-                remove(self.backupfpath)
+        # Removes journal, as there is nothing to recover
+        if self.journal is not None:
+            self.journal.close()
+
+        if self.store is not None:
+            self.store.close()
+
+        if self.playhead.stats.updates > 0:
+            print("Playhead: %(wakeups_per_s).1f wakeups/s, %(updates_per_s).1f updates/s, error %(mean_error_ms).0f ms mean, "
+                  "%(p95_error_ms).0f ms p95, %(max_error_ms).0f ms max" %self.playhead.stats.report())
+
+        if self.seeker.sent > 0:
+            print("Seeks: %(sent)d sent, %(dropped)d replaced by later targets, latency %(mean_latency_ms).0f ms mean, "
+                  "%(p95_latency_ms).0f ms p95, %(max_latency_ms).0f ms max" %self.seeker.report())
 
         event.accept()
 
@@ -1115,8 +1716,9 @@ if __name__ == "__main__":
     videodpath = argv[1] if len(argv) >= 2 else "videos"
     annotdpath = argv[2] if len(argv) >= 3 else "annotations"
     labeldpath = argv[3] if len(argv) >= 4 else "labels"
+    storefpath = argv[4] if len(argv) >= 5 else None
 
-    videoannotator = VideoAnnotator(videodpath, annotdpath, labeldpath)
+    videoannotator = VideoAnnotator(videodpath, annotdpath, labeldpath, storefpath=storefpath)
     videoannotator.show()
     videoannotator.setFixedSize(1800, 600)
     exit(app.exec_())
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from numpy import int64, array, arange, empty, full, concatenate, searchsorted, nonzero, maximum, lexsort, iinfo
+
+# Fills tree nodes holding no interval
+noend = iinfo(int64).min
+
+class IntervalIndex:
+    # Holds [start, end] times of annotation rows sorted by start, with a tree of maximum end times over them.
+    # Stabbing and overlap queries visit O(log n) nodes per reported row. Rows with an empty time are not held.
+    def __init__(self):
+        self.starts = empty(0, dtype=int64)
+        self.ends = empty(0, dtype=int64)
+        self.rows = empty(0, dtype=int64)
+        self._build_tree()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def build(self, starts, ends):
+        # Builds index from start and end time columns. NA times are skipped
+        valid = (starts.notna() & ends.notna()).to_numpy()
+        rows = nonzero(valid)[0].astype(int64)
+        starts = starts.to_numpy(dtype=int64, na_value=0)[valid]
+        ends = ends.to_numpy(dtype=int64, na_value=0)[valid]
+
+        order = lexsort((rows, starts))
+        self.starts, self.ends, self.rows = starts[order], ends[order], rows[order]
+        self._build_tree()
+
+    def _build_tree(self):
+        # Leaves hold end times in start order. Each parent holds the maximum of its children
+        self.size = 1
+        while self.size < len(self.ends):
+            self.size *= 2
+
+        self.tree = full(2 * self.size, noend, dtype=int64)
+        self.tree[self.size:self.size + len(self.ends)] = self.ends
+
+        lo = self.size
+        while lo > 1:
+            self.tree[lo // 2:lo] = maximum(self.tree[lo:2 * lo:2], self.tree[lo + 1:2 * lo:2])
+            lo //= 2
+
+    def _update_leaf(self, pos):
+        node = self.size + pos
+        self.tree[node] = self.ends[pos]
+
+        while node > 1:
+            node //= 2
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def _find(self, row, start):
+        # Returns position of row, searching only intervals with the same start
+        lo, hi = searchsorted(self.starts, start, "left"), searchsorted(self.starts, start, "right")
+        found = nonzero(self.rows[lo:hi] == row)[0]
+        return lo + int(found[0]) if len(found) > 0 else -1
+
+    def _collect(self, hi, mintime):
+        # Returns rows at positions below hi whose end time is at least mintime
+        found = []
+        stack = [(1, 0, self.size)]
+
+        while stack:
+            node, lo, width = stack.pop()
+            if (lo >= hi) | (self.tree[node] < mintime):
+                continue
+
+            if width == 1:
+                found.append(self.rows[lo])
+            else:
+                width //= 2
+                stack.append((2 * node + 1, lo + width, width))
+                stack.append((2 * node, lo, width))
+
+        return array(found, dtype=int64)
+
+    def stab(self, time):
+        # Returns rows whose [start, end] contains time
+        return self._collect(searchsorted(self.starts, time, "right"), time)
+
+    def overlap(self, start, end):
+        # Returns rows whose [start, end] overlaps (start, end). Segments that only share a boundary do not overlap
+        return self._collect(searchsorted(self.starts, end, "left"), start + 1)
+
+    # Updates. Table row numbers of later rows shift when rows are inserted or removed
+
+    def insert_row(self, row):
+        self.rows[self.rows >= row] += 1
+
+    def remove_row(self, row):
+        pos = nonzero(self.rows == row)[0]
+        if len(pos) > 0:
+            self._delete(int(pos[0]))
+
+        self.rows[self.rows > row] -= 1
+
+    def update_row(self, row, oldstart, oldend, start, end):
+        # Moves interval of row after its start or end time changes. NA times remove it from the index
+        pos = self._find(row, oldstart) if (oldstart is not None) & (oldend is not None) else -1
+
+        # Only end time changed: updates tree in place
+        if (pos != -1) & (oldstart == start) & (end is not None):
+            self.ends[pos] = end
+            self._update_leaf(pos)
+            return
+
+        if pos != -1:
+            self._delete(pos)
+
+        if (start is not None) & (end is not None):
+            pos = searchsorted(self.starts, start, "right")
+            self.starts = concatenate([self.starts[:pos], [start], self.starts[pos:]])
+            self.ends = concatenate([self.ends[:pos], [end], self.ends[pos:]])
+            self.rows = concatenate([self.rows[:pos], [row], self.rows[pos:]])
+            self._build_tree()
+
+    def _delete(self, pos):
+        keep = arange(len(self.rows)) != pos
+        self.starts, self.ends, self.rows = self.starts[keep], self.ends[keep], self.rows[keep]
+        self._build_tree()
@@ -0,0 +1,187 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from os import fsync, remove, replace
+from os.path import exists
+from json import dumps, loads
+from queue import Queue, Empty
+from threading import Thread
+from time import monotonic
+
+from numpy import ndarray
+from pandas import DataFrame, Series, isna
+from pandas.api.extensions import ExtensionArray
+
+# Journal records, one JSON object per line:
+#   {"op": "open", "video": ..., "annot": ..., "label": ..., "rows": ...}    header. annot and label are the last saved
+#       files, if any. rows are the annotations edits start from if they were not read from a file, e.g. from the store
+#   {"op": "set", "row": r, "col": c, "value": v}
+#   {"op": "setmany", "rows": [...], "col": c, "values": [...]}
+#   {"op": "insert", "row": r, "values": [...]}
+#   {"op": "delete", "row": r}
+#   {"op": "insertmany", "rows": [...], "values": [[...], ...]}    rows are where inserted rows end up, ascending
+#   {"op": "deletemany", "rows": [...]}
+#   {"op": "reset", "rows": [[...], ...]}
+#   {"op": "labels", "labels": [...] or null}
+
+def jsonable(value):
+    if isinstance(value, (list, tuple)):
+        return list(map(jsonable, value))
+
+    # Arrays are converted at once
+    if isinstance(value, (ndarray, ExtensionArray, Series)):
+        values = Series(value, dtype=object)
+        return values.where(values.notna(), None).tolist()
+
+    if isna(value):
+        return None
+
+    return value.item() if hasattr(value, "item") else value
+
+def _encode(record):
+    # Frames are serialized on the writer thread
+    frames = {key : value for key, value in record.items() if isinstance(value, DataFrame)}
+    if len(frames) > 0:
+        record = dict(record, **{key : frame.astype(object).where(frame.notna(), None).values.tolist() for key, frame in frames.items()})
+
+    return dumps(record, ensure_ascii=False) + "\n"
+
+class EditJournal:
+    # Append-only log of annotation edits. Records are written and fsynced in batches on a background thread
+    def __init__(self, fpath, header, snapshot=None, syncinterval=1.0, batchsize=256, compactevery=20000):
+        self.fpath = fpath
+        self.header = header
+        self.snapshot = snapshot
+        self.syncinterval = syncinterval
+        self.batchsize = batchsize
+        self.compactevery = compactevery
+        self.count = 0
+
+        self.queue = Queue()
+        self.queue.put(("restart", header))
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def append(self, record):
+        self.queue.put(("append", record))
+        self.count += 1
+
+        # Rewrites journal from a snapshot of current annotations once it gets long
+        if (self.count >= self.compactevery) and (self.snapshot is not None):
+            self.compact()
+
+    def compact(self):
+        self.queue.put(("compact", (self.header, self.snapshot())))
+        self.count = 0
+
+    def restart(self, header):
+        # Discards all records, e.g. after annotations are saved
+        self.header = header
+        self.queue.put(("restart", header))
+        self.count = 0
+
+    def close(self, delete=True):
+        self.queue.put(("close", delete))
+        self.thread.join()
+
+    def _run(self):
+        file = None
+        pending = 0
+        lastsync = monotonic()
+
+        while True:
+            try:
+                kind, payload = self.queue.get(timeout=self.syncinterval)
+            except Empty:
+                kind, payload = None, None
+
+            if kind == "append":
+                file.write(_encode(payload))
+                pending += 1
+
+            elif kind in ("restart", "compact"):
+                # Writes new journal next to the current one and swaps it in, so a complete journal always exists
+                header, records = (payload, []) if kind == "restart" else payload
+                tmpfpath = self.fpath + ".tmp"
+                with open(tmpfpath, "w", encoding="utf-8") as tmpfile:
+                    for record in [header] + records:
+                        tmpfile.write(_encode(record))
+                    tmpfile.flush()
+                    fsync(tmpfile.fileno())
+
+                if file is not None:
+                    file.close()
+                replace(tmpfpath, self.fpath)
+                file = open(self.fpath, "a", encoding="utf-8")
+                pending = 0
+
+            elif kind == "close":
+                file.close()
+                if payload and exists(self.fpath):
+                    remove(self.fpath)
+                return
+
+            if (pending > 0) & ((pending >= self.batchsize) | (monotonic() - lastsync >= self.syncinterval)):
+                file.flush()
+                fsync(file.fileno())
+                pending = 0
+                lastsync = monotonic()
+
+def read_journal(fpath):
+    # Returns header and records. Stops at the first incomplete record, e.g. one cut short by a crash
+    with open(fpath, "r", encoding="utf-8") as file:
+        lines = file.read().splitlines()
+
+    # Decodes all records at once. A crash can only cut short the last record, so it is dropped if decoding fails
+    records = None
+    for end in (len(lines), len(lines) - 1):
+        try:
+            records = loads("[" + ",".join(lines[:end]) + "]")
+            break
+        except ValueError:
+            pass
+
+    # Falls back to one record at a time if the journal is damaged elsewhere
+    if records is None:
+        records = []
+        for line in lines:
+            try:
+                records.append(loads(line))
+            except ValueError:
+                break
+
+    if (len(records) == 0) or (records[0].get("op") != "open"):
+        return None, []
+
+    return records[0], records[1:]
+
+def replay_journal(records, annot, labels):
+    # Applies records to annotations and labels from the last save. Returns annotations, labels and number of records applied
+    columns = annot.columns
+    rows = annot.astype(object).where(annot.notna(), None).values.tolist()
+
+    for record in records:
+        op = record["op"]
+
+        if op == "set":
+            rows[record["row"]][record["col"]] = record["value"]
+        elif op == "setmany":
+            col = record["col"]
+            for row, value in zip(record["rows"], record["values"]):
+                rows[row][col] = value
+        elif op == "insert":
+            rows.insert(record["row"], record["values"])
+        elif op == "delete":
+            del rows[record["row"]]
+        elif op == "insertmany":
+            for row, values in zip(record["rows"], record["values"]):
+                rows.insert(row, values)
+        elif op == "deletemany":
+            deleted = set(record["rows"])
+            rows = [values for row, values in enumerate(rows) if row not in deleted]
+        elif op == "reset":
+            rows = record["rows"]
+        elif op == "labels":
+            labels = record["labels"]
+
+    return DataFrame(rows, columns=columns), labels, len(records)
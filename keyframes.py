@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from os import stat, replace
+from subprocess import run, PIPE, DEVNULL
+
+from numpy import int64, array, asarray, unique, searchsorted, load, savez
+
+from media import av, BackgroundLoader
+
+# Version of keyframe times written to sidecar files. Sidecars of other versions are indexed again
+sidecarversion = 2
+
+def _read_with_av(fpath):
+    # Reads keyframe times from packet headers only. No frames are decoded. Times are taken from the start of the
+    # stream, as playback times are, since streams such as MPEG-TS or cut files start at a nonzero timestamp
+    with av.open(fpath) as container:
+        stream = container.streams.video[0]
+        timebase = float(stream.time_base)
+        start = stream.start_time or 0
+        return [(packet.pts - start) * timebase * 1000 for packet in container.demux(stream) if packet.is_keyframe and (packet.pts is not None)]
+
+def _read_with_ffprobe(fpath):
+    # Lines are prefixed with their section, packet or stream
+    output = run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=start_time:packet=pts_time,flags",
+                  "-of", "csv=p=1", fpath], stdout=PIPE, stderr=DEVNULL, check=True, universal_newlines=True).stdout
+
+    ptstimes, start = [], 0.0
+    for line in output.splitlines():
+        section, _, fields = line.partition(",")
+        if section == "stream":
+            start = float(fields) if fields not in ("", "N/A") else 0.0
+            continue
+
+        ptstime, _, flags = fields.partition(",")
+        if (section == "packet") and ("K" in flags) and (ptstime not in ("", "N/A")):
+            ptstimes.append(float(ptstime))
+
+    return [(ptstime - start) * 1000 for ptstime in ptstimes]
+
+def read_keyframes(fpath):
+    # Returns sorted keyframe times of first video stream in ms. Raises OSError if no reader is available or file cannot be read
+    try:
+        times = _read_with_av(fpath) if av is not None else _read_with_ffprobe(fpath)
+    except FileNotFoundError as error:
+        if (av is None) and (error.filename == "ffprobe"):
+            raise OSError("Keyframes cannot be read without PyAV or ffprobe.")
+        raise
+    except Exception as error:
+        raise OSError("Keyframes could not be read: %s" %error)
+
+    return unique(array(times, dtype="float64").round().astype(int64))
+
+def sidecar_fpath(fpath):
+    return fpath + ".keyframes.npz"
+
+def load_keyframes(fpath):
+    # Returns keyframes from sidecar file, or None if there is none or video has changed since it was written
+    try:
+        info = stat(fpath)
+        with load(sidecar_fpath(fpath)) as sidecar:
+            if (int(sidecar["version"]) == sidecarversion) and (int(sidecar["size"]) == info.st_size) and \
+               (int(sidecar["mtime"]) == info.st_mtime_ns):
+                return sidecar["times"]
+    except (OSError, KeyError, ValueError):
+        pass
+
+    return None
+
+def save_keyframes(fpath, times):
+    # Writes sidecar next to video. Videos in read-only folders are indexed again when opened
+    tmpfpath = sidecar_fpath(fpath) + ".tmp.npz"
+
+    try:
+        info = stat(fpath)
+        savez(tmpfpath, version=sidecarversion, size=info.st_size, mtime=info.st_mtime_ns, times=times)
+        replace(tmpfpath, sidecar_fpath(fpath))
+    except OSError:
+        pass
+
+class KeyframeIndex:
+    # Sorted keyframe times of a video, in ms
+    def __init__(self, times):
+        self.times = asarray(times, dtype=int64)
+
+    def __len__(self):
+        return len(self.times)
+
+    def before(self, time):
+        # Returns last keyframe at or before time, where decoding for a precise seek to time starts
+        i = searchsorted(self.times, time, "right") - 1
+        return int(self.times[max(i, 0)]) if len(self.times) > 0 else 0
+
+    def nearest(self, time):
+        # Returns keyframe closest to time. Seeking to it shows a frame without decoding any frames before it
+        if len(self.times) == 0:
+            return int(time)
+
+        i = searchsorted(self.times, time)
+        candidates = self.times[max(i-1, 0):i+1]
+        return int(candidates[abs(candidates - time).argmin()])
+
+class KeyframeLoader(BackgroundLoader):
+    # Builds keyframe index on a background thread, or loads it from sidecar cache if video has not changed
+    def load(self, fpath):
+        times = load_keyframes(fpath)
+
+        if times is None:
+            times = read_keyframes(fpath)
+            save_keyframes(fpath, times)
+
+        return KeyframeIndex(times)
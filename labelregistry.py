@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from numpy import int64, array, empty, full, lexsort, where
+from pandas import Categorical, CategoricalDtype, Series, factorize
+
+class LabelRegistry:
+    # Every label seen, numbered in order of first appearance. Ids are never reused or renumbered, so they can be used
+    # as codes of a categorical label column, and memory grows with distinct labels only. Each spelling is its own
+    # label. Labels are also indexed by casefolded text, which finds the first spelling registered
+    def __init__(self, labels=()):
+        self.labels = []
+        self.ids = {}
+        self.keys = {}
+
+        # Categorical type and sort keys over all labels, rebuilt once labels are added
+        self.dtype = None
+        self.sortkeys = None
+
+        self.add(labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, labels):
+        # Registers labels not seen before. Returns id of each label, or -1 for empty cells. Each distinct label is
+        # looked up once
+        codes, uniques = factorize(Series(labels) if not isinstance(labels, Series) else labels)
+        if len(uniques) == 0:
+            return full(len(codes), -1, dtype=int64)
+
+        uniqueids = array([self._add(str(label)) for label in uniques.tolist()], dtype=int64)
+        return where(codes >= 0, uniqueids[codes], -1)
+
+    def _add(self, label):
+        labelid = self.ids.get(label)
+
+        if labelid is None:
+            labelid = self.ids[label] = len(self.labels)
+            self.labels.append(label)
+            self.keys.setdefault(label.casefold(), labelid)
+            self.dtype = self.sortkeys = None
+
+        return labelid
+
+    def find(self, label):
+        # Returns id of first spelling of label, ignoring case, or -1 if there is none
+        return self.keys.get(str(label).casefold(), -1)
+
+    def lookup(self, labels):
+        # Returns id of first spelling of each label, ignoring case, or -1 if there is none. Each distinct label is
+        # looked up once
+        codes, uniques = factorize(Series(labels) if not isinstance(labels, Series) else labels)
+        uniqueids = array([self.find(label) for label in uniques.tolist()] + [-1], dtype=int64)
+        return uniqueids[codes]
+
+    def categories(self):
+        if self.dtype is None:
+            self.dtype = CategoricalDtype(self.labels)
+
+        return self.dtype
+
+    def categorical(self, labels):
+        # Returns labels as a categorical over all registered labels, whose codes are label ids
+        if isinstance(labels, Series) and (labels.dtype is self.dtype):
+            return labels.array
+
+        codes = self.add(labels)
+        return Categorical.from_codes(codes, dtype=self.categories())
+
+    def sort_keys(self):
+        # Returns rank of each label id in sort order, ignoring case first
+        if self.sortkeys is None:
+            labels = array(self.labels, dtype=object)
+            order = lexsort((labels, Series(labels, dtype=object).str.casefold().to_numpy()))
+            self.sortkeys = empty(len(order), dtype=int64)
+            self.sortkeys[order] = range(len(order))
+
+        return self.sortkeys
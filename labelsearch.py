@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from bisect import bisect_left
+from re import compile as re_compile
+
+from numpy import int64, uint32, array, arange, repeat, cumsum, concatenate, frombuffer, lexsort, searchsorted, sort, \
+    bincount, flatnonzero, ones
+
+# Characters after which a word of a label starts. Segments of hierarchical labels, e.g. activity/walk/fast, are words
+wordstart = re_compile(r"(?<=[/\s_\-.:])\S")
+
+# Trigram codes hold three code points of 21 bits each
+bits = 21
+
+def _distinct(ids):
+    # Returns distinct ids in ascending order
+    ids = sort(ids)
+    first = ones(len(ids), dtype=bool)
+    first[1:] = ids[1:] != ids[:-1]
+    return ids[first]
+
+def _gram(text):
+    # Returns code of first three code points of text, padded with zeros
+    points = [ord(c) for c in text[:3]] + [0] * (3 - len(text[:3]))
+    return (points[0] << 2 * bits) | (points[1] << bits) | points[2]
+
+class LabelSearch:
+    # Ranked label lookup for type-ahead entry, ignoring case. Matches are ranked in tiers:
+    #   1. label equals query
+    #   2. label starts with query, e.g. "activity/" lists every label under activity
+    #   3. a word or segment of label starts with query, e.g. "walk" or "fast" for activity/walk/fast
+    #   4. label contains query
+    #   5. label shares at least half of the trigrams of query, which tolerates typos in longer queries
+    # Tiers are searched in turn until enough matches are found, each in sort order of the matching text. Tiers 1 to 3
+    # binary search sorted lists, and tiers 4 and 5 a sorted trigram index, so a search costs about the same for a
+    # hundred labels as for a hundred thousand
+    def __init__(self, labels):
+        # Labels are numbered in sort order, so that lower numbers rank first
+        self.labels = sorted(set(map(str, labels)) - {""}, key=lambda label : (label.casefold(), label))
+        self.folded = [label.casefold() for label in self.labels]
+
+        # Text from the start of each word on, sorted, with the label it belongs to
+        words = sorted((folded[match.start():], i) for i, folded in enumerate(self.folded) for match in wordstart.finditer(folded))
+        self.words = [word for word, _ in words]
+        self.wordlabels = [i for _, i in words]
+
+        self._build_trigrams()
+        self.postings = (None, None)
+
+    def _build_trigrams(self):
+        # Trigram at every position of every label, with labels padded by two zeros so that every substring of up to
+        # three characters starts a trigram. Each (trigram, label) pair is held once, sorted by trigram then label
+        lengths = array([len(folded) for folded in self.folded], dtype=int64)
+        if lengths.sum() == 0:
+            self.grams = self.gramlabels = array([], dtype=int64)
+            return
+
+        points = frombuffer(("\0\0".join(self.folded) + "\0\0").encode("utf-32-le"), dtype=uint32).astype(int64)
+        starts = cumsum(lengths + 2) - lengths - 2
+        positions = repeat(starts - (cumsum(lengths) - lengths), lengths) + arange(lengths.sum())
+        grams = (points[positions] << 2 * bits) | (points[positions + 1] << bits) | points[positions + 2]
+        gramlabels = repeat(arange(len(lengths)), lengths)
+
+        order = lexsort((gramlabels, grams))
+        grams, gramlabels = grams[order], gramlabels[order]
+        first = ones(len(grams), dtype=bool)
+        first[1:] = (grams[1:] != grams[:-1]) | (gramlabels[1:] != gramlabels[:-1])
+        self.grams, self.gramlabels = grams[first], gramlabels[first]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def search(self, query, limit=20):
+        # Returns up to limit labels matching query, best first. Empty query lists labels in sort order
+        query = query.strip().casefold()
+        found, seen = [], set()
+
+        for tier in (self._exact, self._prefix, self._word, self._substring, self._fuzzy):
+            for i in tier(query, limit):
+                if i not in seen:
+                    seen.add(i)
+                    found.append(i)
+                    if len(found) == limit:
+                        return [self.labels[i] for i in found]
+
+        return [self.labels[i] for i in found]
+
+    def _range(self, keys, prefix):
+        # Returns range of sorted keys starting with prefix
+        return bisect_left(keys, prefix), bisect_left(keys, prefix + "\U0010ffff")
+
+    def _exact(self, query, limit):
+        lo, hi = self._range(self.folded, query)
+        return [i for i in range(lo, min(hi, lo + limit)) if self.folded[i] == query]
+
+    def _prefix(self, query, limit):
+        lo, hi = self._range(self.folded, query)
+        return range(lo, min(hi, lo + limit))
+
+    def _word(self, query, limit):
+        lo, hi = self._range(self.words, query)
+        return (self.wordlabels[i] for i in range(lo, hi)) if query != "" else ()
+
+    def _postings(self, gram, width):
+        # Returns labels holding a trigram starting with the first width code points of gram
+        lo = searchsorted(self.grams, gram, "left")
+        hi = searchsorted(self.grams, gram + (1 << (3 - width) * bits), "left")
+        return self.gramlabels[lo:hi]
+
+    def _trigram_postings(self, query):
+        # Returns labels holding each trigram of query. Kept for the next tier
+        if self.postings[0] != query:
+            grams = set(_gram(query[i:i + 3]) for i in range(len(query) - 2))
+            self.postings = (query, [self._postings(gram, 3) for gram in grams])
+
+        return self.postings[1]
+
+    def _substring(self, query, limit):
+        if query == "":
+            return ()
+
+        if len(query) < 3:
+            return _distinct(self._postings(_gram(query), len(query))).tolist()
+
+        # Labels holding the rarest trigram of query, in sort order, are checked for query itself
+        rarest = min(self._trigram_postings(query), key=len)
+        return (i for i in rarest.tolist() if query in self.folded[i])
+
+    def _fuzzy(self, query, limit):
+        if len(query) < 4:
+            return ()
+
+        # Most shared trigrams first
+        postings = self._trigram_postings(query)
+        counts = bincount(concatenate(postings), minlength=len(self.labels))
+        candidates = flatnonzero(counts * 2 >= len(postings))
+        return candidates[lexsort((candidates, -counts[candidates]))].tolist()
@@ -0,0 +1,36 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from threading import Thread
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# PyAV is optional. Readers fall back on ffmpeg or ffprobe if it is installed
+try:
+    import av
+except ImportError:
+    av = None
+
+class BackgroundLoader(QObject):
+    # Reads something about a video on a background thread. Subclasses implement load, which returns the result or
+    # raises OSError or ValueError. Signals are queued to the GUI thread
+    loaded = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super(BackgroundLoader, self).__init__(parent)
+
+    def start(self, fpath):
+        Thread(target=self._run, args=(fpath,), daemon=True).start()
+
+    def load(self, fpath):
+        raise NotImplementedError
+
+    def _run(self, fpath):
+        try:
+            result = self.load(fpath)
+        except (OSError, ValueError) as error:
+            self.failed.emit(fpath, str(error))
+            return
+
+        self.loaded.emit(fpath, result)
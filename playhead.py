@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from collections import deque
+from math import ceil
+from time import perf_counter
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from numpy import array, percentile
+from vlc import EventType
+
+from vlcevents import EventRelay
+
+class PlayheadStats:
+    # Counts GUI thread wakeups and playhead updates, and samples playhead error, the gap between the time
+    # reported by the player and the time shown, each time the player reports its time
+    def __init__(self, maxsamples=10000):
+        self.errors = deque(maxlen=maxsamples)
+        self.reset()
+
+    def reset(self):
+        self.start = perf_counter()
+        self.wakeups = 0
+        self.updates = 0
+        self.errors.clear()
+
+    def sample(self, playertime, showntime):
+        if showntime is not None:
+            self.errors.append(abs(playertime - showntime))
+
+    def report(self):
+        elapsed = max(perf_counter() - self.start, 1e-9)
+        errors = array(self.errors) if len(self.errors) > 0 else array([0])
+
+        return {"seconds" : elapsed, "wakeups_per_s" : self.wakeups / elapsed, "updates_per_s" : self.updates / elapsed,
+                "mean_error_ms" : float(errors.mean()), "p95_error_ms" : float(percentile(errors, 95)),
+                "max_error_ms" : float(errors.max())}
+
+class PlayheadTracker(QObject):
+    # Follows player time through libvlc events instead of polling. Time events arriving faster than the display
+    # refresh rate are coalesced, so the GUI thread wakes about once per frame while playing and not at all otherwise
+    timeChanged = pyqtSignal(int)
+    endReached = pyqtSignal()
+    stateChanged = pyqtSignal(str)
+
+    # Posted from libvlc thread when a new time is waiting
+    _posted = pyqtSignal()
+
+    def __init__(self, player, refreshrate=60.0, parent=None):
+        super(PlayheadTracker, self).__init__(parent)
+        self.interval = 1.0 / (refreshrate if refreshrate > 0 else 60.0)
+        self.latest = None
+        self.shown = None
+        self.pending = False
+        self.stats = PlayheadStats()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._deliver)
+        self._posted.connect(self._deliver)
+
+        # Time events are handled here rather than through a relay, so that only one is queued at a time
+        events = player.event_manager()
+        events.event_attach(EventType.MediaPlayerTimeChanged, self._on_time)
+
+        self.relays = [EventRelay(events, EventType.MediaPlayerEndReached, parent=self)]
+        self.relays[0].fired.connect(lambda _ : self.endReached.emit())
+
+        for eventtype, state in ((EventType.MediaPlayerPlaying, "playing"), (EventType.MediaPlayerPaused, "paused"),
+                                 (EventType.MediaPlayerStopped, "stopped")):
+            relay = EventRelay(events, eventtype, parent=self)
+            relay.fired.connect(lambda _, state=state : self.stateChanged.emit(state))
+            self.relays.append(relay)
+
+    def _on_time(self, event):
+        # Runs on libvlc thread. Only stores time, and posts to GUI thread if nothing is waiting already
+        time = event.u.new_time
+        self.stats.sample(time, self.shown)
+        self.latest = time
+
+        if not self.pending:
+            self.pending = True
+            self._posted.emit()
+
+    def _deliver(self):
+        # Runs when a time is posted, and one frame after each update while times keep coming
+        self.stats.wakeups += 1
+
+        if self.latest == self.shown:
+            self.pending = False
+
+            # Time may have changed before pending was cleared, in which case it was not posted
+            if self.latest == self.shown:
+                return
+            self.pending = True
+
+        self.shown = self.latest
+        self.stats.updates += 1
+        self.timeChanged.emit(self.shown)
+        self.timer.start(int(ceil(self.interval * 1000)))
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from collections import deque
+from time import perf_counter
+
+from PyQt5.QtCore import QObject, QTimer
+
+from numpy import array, percentile
+
+class SeekScheduler(QObject):
+    # Keeps at most one seek in flight. Targets requested meanwhile replace each other, and only the latest is sent
+    # once the player shows a frame near the target in flight, or after timeout ms if it never does
+    def __init__(self, player, tolerance=500, timeout=1000, maxsamples=1000, parent=None):
+        super(SeekScheduler, self).__init__(parent)
+        self.player = player
+        self.tolerance = tolerance
+        self.inflight = None
+        self.pending = None
+        self.requestedat = None
+        self.sent = 0
+        self.dropped = 0
+        self.latencies = deque(maxlen=maxsamples)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(timeout)
+        self.timer.timeout.connect(self._complete)
+
+    def request(self, time):
+        self.requestedat = perf_counter()
+
+        if self.inflight is None:
+            self._send(time)
+        else:
+            self.dropped += self.pending is not None
+            self.pending = time
+
+    def on_time(self, time):
+        # Called with each time shown. A time near the target means the seek has landed
+        if (self.inflight is not None) and (abs(time - self.inflight) <= self.tolerance):
+            self._complete()
+
+    def _send(self, time):
+        self.inflight = time
+        self.sent += 1
+        self.player.set_time(int(time))
+        self.timer.start()
+
+    def _complete(self):
+        self.timer.stop()
+        self.inflight = None
+
+        if self.pending is not None:
+            time, self.pending = self.pending, None
+            self._send(time)
+        elif self.requestedat is not None:
+            # Latency runs from the last seek requested to its frame being shown
+            self.latencies.append((perf_counter() - self.requestedat) * 1000)
+            self.requestedat = None
+
+    def report(self):
+        latencies = array(self.latencies) if len(self.latencies) > 0 else array([0])
+        return {"sent" : self.sent, "dropped" : self.dropped, "mean_latency_ms" : float(latencies.mean()),
+                "p95_latency_ms" : float(percentile(latencies, 95)), "max_latency_ms" : float(latencies.max())}
+
+class SkipAccelerator:
+    # Grows skip distance while a skip key is held down. Key auto-repeat is told apart from separate presses by the
+    # time between skips
+    def __init__(self, step=5000, maxstep=60000, growth=1.2, repeatgap=0.25):
+        self.basestep = step
+        self.maxstep = maxstep
+        self.growth = growth
+        self.repeatgap = repeatgap
+        self.direction = 0
+        self.repeats = 0
+        self.last = 0.0
+
+    def step(self, direction):
+        # Returns skip distance in ms for a skip in direction, -1 or 1
+        now = perf_counter()
+        held = (direction == self.direction) & (now - self.last < self.repeatgap)
+
+        self.repeats = self.repeats + 1 if held else 0
+        self.direction, self.last = direction, now
+        return int(min(self.basestep * self.growth ** self.repeats, self.maxstep))
@@ -0,0 +1,302 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from zlib import crc32
+
+from PyQt5.QtCore import Qt, QRect, pyqtSignal
+from PyQt5.QtGui import QPainter, QPixmap, QColor, QPen
+
+from pandas import factorize
+from numpy import int64, arange, empty, nonzero, maximum, lexsort, searchsorted, floor, ceil, concatenate, minimum, delete, insert, array
+
+from timeline import TimelineStrip
+
+# Edits of more rows than this at once redraw whole track
+maxdirtyrows = 64
+
+# Distance in pixels within which a bar edge can be grabbed
+grabdistance = 4
+
+def label_color(label):
+    # Colour is derived from label text, so each label keeps its colour across sessions
+    if label == "":
+        return QColor(160, 160, 160)
+
+    return QColor.fromHsv(crc32(label.encode("utf-8")) % 360, 160, 220)
+
+def merge_spans(x0, x1):
+    # Merges pixel spans [x0, x1) sorted by x0 that overlap or touch, so bars narrower than a pixel are drawn once
+    if len(x0) == 0:
+        return x0, x1
+
+    reach = maximum.accumulate(x1)
+    first = concatenate(([True], x0[1:] > reach[:-1]))
+    starts = nonzero(first)[0]
+    ends = concatenate((starts[1:], [len(x0)])) - 1
+    return x0[starts], reach[ends]
+
+class LabelLane:
+    # Segments of one label sorted by start, with running maximum of end times so that segments in a time range
+    # are found with two binary searches
+    def __init__(self, label, starts, ends, rows):
+        self.label = label
+        self.color = label_color(label)
+        self.starts, self.ends, self.rows = starts, ends, rows
+        self.maxends = maximum.accumulate(ends) if len(ends) > 0 else ends
+        self.pixmap = None
+
+    def find(self, start, end):
+        # Returns positions of segments overlapping [start, end]
+        lo = searchsorted(self.maxends, start, "left")
+        hi = searchsorted(self.starts, end, "right")
+        positions = arange(lo, max(lo, hi))
+        return positions[self.ends[positions] >= start]
+
+class SegmentTrack(TimelineStrip):
+    # Draws annotation rows as bars on the timeline, one lane and colour per label. Each lane is cached as a pixmap of
+    # the current view, and edits only redraw the time range they touch. Only segments in view are drawn, and those
+    # closer than a pixel are merged. Bar edges can be dragged to change start or end time
+    rowClicked = pyqtSignal(int)
+    edgeMoved = pyqtSignal(int, int, int)
+
+    def __init__(self, annotmodel, height=48, parent=None):
+        super(SegmentTrack, self).__init__(height, parent)
+        self.setMouseTracking(True)
+
+        self.annotmodel = annotmodel
+
+        # Row-ordered copy of times and labels last drawn, so that edits can tell where a row used to be
+        self.rowstarts = empty(0, dtype=int64)
+        self.rowends = empty(0, dtype=int64)
+        self.rowlabels = []
+
+        self.lanes = []
+        self.stale = True
+        self.dirty = {}
+        self.redrawall = True
+
+        # Edge being dragged as (row, col, lane, time)
+        self.drag = None
+
+        annotmodel.modelReset.connect(self._reset)
+        annotmodel.dataChanged.connect(self._on_data_changed)
+        annotmodel.rowsInserted.connect(lambda parent, first, last : self._on_rows(first, last, False))
+        annotmodel.rowsRemoved.connect(lambda parent, first, last : self._on_rows(first, last, True))
+
+    # View
+
+    def _view_changed(self):
+        self.redrawall = True
+        self.update()
+
+    def _lane_height(self):
+        return max(min(self.height() // max(len(self.lanes), 1), 12), 1)
+
+    # Tracking annotation edits
+
+    def _reset(self):
+        self.stale = True
+        self.redrawall = True
+        self.update()
+
+    def _mark(self, label, start, end):
+        if (start >= 0) & (end >= 0):
+            self.dirty.setdefault(label, []).append((min(start, end), max(start, end)))
+
+    def _row(self, row):
+        start, end = self.annotmodel.times(row)
+        label = self.annotmodel.text(row, 3)
+        return label, (-1 if start is None else start), (-1 if end is None else end)
+
+    def _on_data_changed(self, topleft, bottomright, roles=[]):
+        # Highlight and issue changes do not move bars
+        if (len(roles) > 0) & (Qt.DisplayRole not in roles) & (Qt.EditRole not in roles):
+            return
+
+        first, last = topleft.row(), bottomright.row()
+        if (last - first >= maxdirtyrows) | (last >= len(self.rowlabels)):
+            self._reset()
+            return
+
+        for row in range(first, last + 1):
+            old = (self.rowlabels[row], self.rowstarts[row], self.rowends[row])
+            new = self._row(row)
+            if old != new:
+                self._mark(*old)
+                self._mark(*new)
+                self.rowlabels[row], self.rowstarts[row], self.rowends[row] = new
+                self.stale = True
+
+        if self.stale:
+            self.update()
+
+    def _on_rows(self, first, last, removed):
+        # Copy is shifted along with rows, so that later edits are compared with the right row
+        if (last - first >= maxdirtyrows) | (self.redrawall):
+            self._reset()
+            return
+
+        if removed:
+            for row in range(first, last + 1):
+                self._mark(self.rowlabels[row], self.rowstarts[row], self.rowends[row])
+            self.rowstarts = delete(self.rowstarts, slice(first, last + 1))
+            self.rowends = delete(self.rowends, slice(first, last + 1))
+            del self.rowlabels[first:last + 1]
+        else:
+            new = [self._row(row) for row in range(first, last + 1)]
+            for label, start, end in new:
+                self._mark(label, start, end)
+            self.rowstarts = insert(self.rowstarts, first, [start for _, start, _ in new])
+            self.rowends = insert(self.rowends, first, [end for _, _, end in new])
+            self.rowlabels[first:first] = [label for label, _, _ in new]
+
+        self.stale = True
+        self.update()
+
+    def _rebuild(self):
+        # Sorts segments by label, then start. Lanes are redrawn in full if labels come or go
+        if self.redrawall:
+            annot = self.annotmodel.annot
+            self.rowstarts = annot["start_time"].to_numpy(dtype=int64, na_value=-1)
+            self.rowends = annot["end_time"].to_numpy(dtype=int64, na_value=-1)
+            self.rowlabels = annot["label"].fillna("").astype(str).tolist()
+        labels = array(self.rowlabels, dtype=object)
+        self.stale = False
+
+        valid = nonzero((self.rowstarts >= 0) & (self.rowends >= 0))[0]
+        codes, names = factorize(labels[valid], sort=True)
+        names = names.tolist()
+        order = lexsort((self.rowstarts[valid], codes))
+        rows, codes = valid[order], codes[order]
+        bounds = searchsorted(codes, arange(len(names) + 1))
+
+        pixmaps = {lane.label : lane.pixmap for lane in self.lanes}
+        if [lane.label for lane in self.lanes] != names:
+            self.redrawall = True
+
+        self.lanes = []
+        for i, name in enumerate(names):
+            lanerows = rows[bounds[i]:bounds[i+1]]
+            lane = LabelLane(name, self.rowstarts[lanerows], self.rowends[lanerows], lanerows)
+            lane.pixmap = pixmaps.get(name)
+            self.lanes.append(lane)
+
+    # Drawing
+
+    def _draw_lane(self, lane, x0, x1):
+        # Redraws lane pixmap between pixel columns x0 and x1
+        height = self._lane_height()
+        if (lane.pixmap is None) or (lane.pixmap.width() != self.width()) or (lane.pixmap.height() != height):
+            lane.pixmap = QPixmap(max(self.width(), 1), height)
+            x0, x1 = 0, self.width()
+
+        painter = QPainter(lane.pixmap)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.fillRect(QRect(x0, 0, x1 - x0, height), Qt.transparent)
+
+        positions = lane.find(self._time(x0) - 1, self._time(x1) + 1)
+        scale = self._scale()
+        spanx0 = floor((lane.starts[positions] - self.viewstart) * scale).astype(int64)
+        spanx1 = maximum(ceil((lane.ends[positions] - self.viewstart) * scale).astype(int64), spanx0 + 1)
+
+        painter.setClipRect(QRect(x0, 0, x1 - x0, height))
+        for spanstart, spanend in zip(*merge_spans(spanx0, spanx1)):
+            painter.fillRect(QRect(int(spanstart), 0, int(spanend - spanstart), height), lane.color)
+        painter.end()
+
+    def _update_lanes(self):
+        if self.stale:
+            self._rebuild()
+
+        if self.redrawall:
+            for lane in self.lanes:
+                self._draw_lane(lane, 0, self.width())
+        else:
+            for lane in self.lanes:
+                for start, end in self.dirty.get(lane.label, []):
+                    x0, x1 = max(self._x(start) - 1, 0), min(self._x(end) + 2, self.width())
+                    if x0 < x1:
+                        self._draw_lane(lane, x0, x1)
+
+        self.redrawall = False
+        self.dirty = {}
+
+    def resizeEvent(self, event):
+        self.redrawall = True
+
+    def paintEvent(self, event):
+        self._update_lanes()
+
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), QColor(32, 32, 32))
+
+        height = self._lane_height()
+        for i, lane in enumerate(self.lanes):
+            painter.drawPixmap(event.rect().x(), i * height, lane.pixmap,
+                               event.rect().x(), 0, event.rect().width(), height)
+
+        # Edge being dragged is drawn at its new time until released
+        if self.drag is not None:
+            row, col, lanei, time = self.drag
+            painter.setPen(QPen(QColor("white"), 2))
+            painter.drawLine(self._x(time), lanei * height, self._x(time), (lanei + 1) * height - 1)
+
+        self._draw_playhead(painter)
+        painter.end()
+
+    # Mouse
+
+    def _hit(self, x, y):
+        # Returns (lane, position) of segment under cursor and its edge column within grab distance, or None
+        lanei = y // self._lane_height()
+        if (self.stale) | (lanei >= len(self.lanes)) | (self.viewend <= self.viewstart):
+            return None, None, None
+
+        lane = self.lanes[lanei]
+        positions = lane.find(self._time(x - grabdistance), self._time(x + grabdistance))
+        if len(positions) == 0:
+            return lanei, None, None
+
+        scale = self._scale()
+        startgap = abs((lane.starts[positions] - self.viewstart) * scale - x)
+        endgap = abs((lane.ends[positions] - self.viewstart) * scale - x)
+        nearest = int(minimum(startgap, endgap).argmin())
+        position = int(positions[nearest])
+
+        if min(startgap[nearest], endgap[nearest]) > grabdistance:
+            inside = nonzero((lane.starts[positions] <= self._time(x)) & (lane.ends[positions] >= self._time(x)))[0]
+            return lanei, (int(positions[inside[0]]) if len(inside) > 0 else None), None
+
+        return lanei, position, (1 if startgap[nearest] <= endgap[nearest] else 2)
+
+    def mousePressEvent(self, event):
+        if event.button() != Qt.LeftButton:
+            return
+
+        lanei, position, col = self._hit(event.x(), event.y())
+        if col is not None:
+            lane = self.lanes[lanei]
+            time = lane.starts[position] if col == 1 else lane.ends[position]
+            self.drag = (int(lane.rows[position]), col, lanei, int(time))
+        elif position is not None:
+            self.rowClicked.emit(int(self.lanes[lanei].rows[position]))
+        elif self.viewend > self.viewstart:
+            self.clicked.emit(self._time(event.x()))
+
+    def mouseMoveEvent(self, event):
+        if self.drag is not None:
+            row, col, lanei, time = self.drag
+            newtime = max(self._time(event.x()), 0)
+            self.drag = (row, col, lanei, min(newtime, self.duration) if self.duration > 0 else newtime)
+            self.update(QRect(min(self._x(time), event.x()) - 2, 0, abs(self._x(time) - event.x()) + 5, self.height()))
+            return
+
+        _, _, col = self._hit(event.x(), event.y())
+        self.setCursor(Qt.SizeHorCursor if col is not None else Qt.ArrowCursor)
+
+    def mouseReleaseEvent(self, event):
+        if self.drag is not None:
+            row, col, lanei, time = self.drag
+            self.drag = None
+            self.update()
+            self.edgeMoved.emit(row, col, time)
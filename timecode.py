@@ -0,0 +1,230 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from re import compile
+from math import floor, ceil
+
+from numpy import int64, uint32, asarray, ascontiguousarray, zeros, ones, empty, full, nonzero, where, minimum, maximum, unique, char
+from pandas import Series, isna, factorize
+from pandas.api.types import is_integer_dtype
+
+# Defines annotation columns holding times. Times are held as integer milliseconds
+timecols = ["start_time", "end_time"]
+
+# Display and export formats:
+#   hms     H:MM:SS
+#   hmsms   H:MM:SS.mmm
+#   auto    H:MM:SS, or H:MM:SS.mmm if time is not a whole second
+#   smpte   HH:MM:SS:FF, using video fps
+timeformats = ["auto", "hms", "hmsms", "smpte"]
+
+# Matches [H:]MM:SS, followed by either .mmm or :FF (SMPTE frames, ; for drop-frame)
+timecoderegex = compile(r"^\s*(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[.,](\d+)|[:;](\d{1,3}))?\s*$")
+
+def parse_timecode(text, fps=None):
+    # Returns time in ms, or None if text is not a valid time
+    match = timecoderegex.match(str(text))
+
+    if match is None:
+        return None
+
+    h, m, s, frac, frames = match.groups()
+    ms = ((int(h or 0) * 60 + int(m)) * 60 + int(s)) * 1000
+
+    if frac is not None:
+        ms += int(frac[:3].ljust(3, "0"))
+
+    if frames is not None:
+        if not fps:
+            return None
+        ms += round(int(frames) * 1000 / fps)
+
+    return ms
+
+def format_timecode(ms, fmt="auto", fps=None):
+    if (ms is None) or isna(ms):
+        return ""
+
+    ms = int(ms)
+    sign = "-" if ms < 0 else ""
+    s, milli = divmod(abs(ms), 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+
+    if (fmt == "smpte") & bool(fps):
+        return "%s%02d:%02d:%02d:%02d" %(sign, h, m, s, int((milli + 0.5) * fps / 1000))
+
+    if (fmt == "hmsms") | ((fmt == "auto") & (milli != 0)):
+        return "%s%d:%02d:%02d.%03d" %(sign, h, m, s, milli)
+
+    return "%s%d:%02d:%02d" %(sign, h, m, s)
+
+def frame_of(ms, fps):
+    # Returns number of frame shown at time ms
+    return int(floor(ms * fps / 1000 + 1e-6))
+
+def frame_time(frame, fps):
+    # Returns first whole ms at which frame is shown. Seeking to it lands on the frame
+    return int(ceil(frame * 1000 / fps - 1e-6))
+
+def snap_to_frame(ms, fps=None):
+    # Returns start of frame shown at time ms, or ms if fps is not known
+    return frame_time(frame_of(ms, fps), fps) if fps else ms
+
+def _parse_array(text, fps=None):
+    # Parses strings one character position at a time, for all strings at once. Returns ms and validity arrays
+    text = char.strip(asarray(text, dtype=str))
+    n, width = len(text), text.dtype.itemsize // 4
+    chars = ascontiguousarray(text.view(uint32).reshape(n, width).T) if width > 0 else zeros((0, n), dtype=uint32)
+
+    fields = zeros((4, n), dtype=int64)
+    ndigits = zeros((4, n), dtype=int64)
+    field = zeros(n, dtype=int64)
+    frac = zeros(n, dtype=int64)
+    nfrac = zeros(n, dtype=int64)
+    infrac = zeros(n, dtype=bool)
+    semis = zeros(n, dtype=int64)
+    lastsemi = zeros(n, dtype=bool)
+    valid = ones(n, dtype=bool)
+
+    for c in chars:
+        d = c.astype(int64) - 48
+        digit = (d >= 0) & (d <= 9)
+        colon = (c == 58) | (c == 59)
+        dot = (c == 46) | (c == 44)
+        valid &= digit | colon | dot | (c == 0)
+
+        # Keeps first 3 fraction digits only
+        fracdigit = digit & infrac
+        frac = where(fracdigit & (nfrac < 3), frac * 10 + d, frac)
+        nfrac += fracdigit
+
+        timedigit = digit & ~infrac
+        for k in range(4):
+            fielddigit = timedigit & (field == k)
+            fields[k] = where(fielddigit, fields[k] * 10 + d, fields[k])
+            ndigits[k] += fielddigit
+
+        valid &= ~((colon | dot) & infrac) & ~(colon & (field == 3))
+        semis += c == 59
+        lastsemi = where(colon, c == 59, lastsemi)
+        field += colon
+        infrac |= dot
+
+    # Fields are laid out as timecoderegex reads them. Three fields are H:MM:SS, unless the last is only valid as
+    # frames, being 3 digits long or following ;, in which case they are MM:SS:FF
+    nfields = field + 1
+    mmssff = (nfields == 3) & ~infrac & (lastsemi | (ndigits[2] == 3))
+    mmss = (nfields == 2) | mmssff
+    h = where(mmss, 0, fields[0])
+    m = where(mmss, fields[0], fields[1])
+    s = where(mmss, fields[1], fields[2])
+    nm = where(mmss, ndigits[0], ndigits[1])
+    ns = where(mmss, ndigits[1], ndigits[2])
+    hasframes = (nfields == 4) | mmssff
+    frames = where(mmssff, fields[2], fields[3])
+    nframes = where(mmssff, ndigits[2], ndigits[3])
+
+    # Checks each field has digits, and minutes, seconds and frames are not too long. ; only comes before frames
+    valid &= (nfields >= 2) & (nm >= 1) & (nm <= 2) & (ns >= 1) & (ns <= 2)
+    valid &= mmss | (ndigits[0] >= 1)
+    valid &= ~hasframes | ((nframes >= 1) & (nframes <= 3) & ~infrac & bool(fps))
+    valid &= (semis == 0) | ((semis == 1) & lastsemi & hasframes)
+    valid &= ~infrac | (nfrac >= 1)
+
+    ms = ((h * 60 + m) * 60 + s) * 1000 + frac * 10 ** (3 - minimum(nfrac, 3))
+    if fps:
+        ms += where(hasframes, (frames * 1000 / fps).round(), 0).astype(int64)
+
+    return ms, valid
+
+def _format_array(values, fmt="auto", fps=None):
+    # Lays out digits of all times sharing the same layout at once
+    values = asarray(values, dtype=int64)
+    negative = values < 0
+    values = abs(values)
+    milli, s, m, h = values % 1000, values // 1000 % 60, values // 60000 % 60, values // 3600000
+    smpte = (fmt == "smpte") & bool(fps)
+
+    hwidth = ones(len(values), dtype=int64)
+    for limit in (10, 100, 1000, 10000, 100000):
+        hwidth += h >= limit
+
+    if smpte:
+        hwidth = maximum(hwidth, 2)
+        frac = ((milli + 0.5) * fps / 1000).astype(int64)
+        showfrac = ones(len(values), dtype=bool)
+    else:
+        frac = milli
+        showfrac = full(len(values), fmt == "hmsms") | ((fmt == "auto") & (milli != 0))
+
+    text = empty(len(values), dtype=object)
+    for hw in unique(hwidth):
+        for withfrac in (False, True):
+            rows = nonzero((hwidth == hw) & (showfrac == withfrac))[0]
+            if len(rows) == 0:
+                continue
+
+            columns = [h[rows] // 10 ** (hw - 1 - k) % 10 for k in range(hw)]
+            columns += [":", m[rows] // 10, m[rows] % 10, ":", s[rows] // 10, s[rows] % 10]
+            if withfrac & smpte:
+                columns += [":", frac[rows] // 10 % 10, frac[rows] % 10]
+            elif withfrac:
+                columns += [".", frac[rows] // 100, frac[rows] // 10 % 10, frac[rows] % 10]
+
+            chars = zeros((len(rows), len(columns)), dtype=uint32)
+            for k, column in enumerate(columns):
+                chars[:, k] = ord(column) if isinstance(column, str) else column + 48
+
+            text[rows] = chars.view("U%d" % len(columns)).ravel().astype(object)
+
+    text[negative] = ["-" + x for x in text[negative]]
+    return text
+
+def _parse_column(values, fps=None):
+    # Returns column of times in ms, and mask of non-empty times that could not be read. Repeated values are parsed once
+    values = Series(values)
+
+    if is_integer_dtype(values.dtype):
+        return values.astype("Int64"), zeros(len(values), dtype=bool)
+
+    codes, uniques = factorize(values)
+    uniques = char.strip(asarray(uniques, dtype=object).astype(str))
+    ms, valid = _parse_array(uniques, fps)
+
+    unreadable = ~valid & (uniques != "")
+    times = Series(ms[codes], index=values.index, dtype="Int64")
+    times[(codes == -1) | ~valid[codes]] = None
+    return times, (codes != -1) & unreadable[codes]
+
+def parse_timecodes(values, fps=None):
+    # Returns column of times in ms. Empty and invalid times are NA
+    return _parse_column(values, fps)[0]
+
+def format_timecodes(ms, fmt="auto", fps=None):
+    # Returns column of formatted times. NA times are empty
+    ms = Series(ms).astype("Int64")
+    valid = ms.notna().to_numpy()
+
+    text = full(len(ms), "", dtype=object)
+    text[valid] = _format_array(ms[valid].to_numpy(dtype=int64), fmt, fps)
+    return Series(text, index=ms.index, dtype=object)
+
+def decode_time_columns(df, fps=None):
+    # Converts time columns to ms. Returns number of non-empty times that could not be read
+    invalid = 0
+
+    for col in timecols:
+        times, unreadable = _parse_column(df[col], fps)
+        invalid += int(unreadable.sum())
+        df[col] = times
+
+    return invalid
+
+def encode_time_columns(df, fmt="auto", fps=None):
+    df = df.copy()
+
+    for col in timecols:
+        df[col] = format_timecodes(df[col], fmt, fps)
+
+    return df
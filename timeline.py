@@ -0,0 +1,248 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from PyQt5.QtCore import Qt, QRect, pyqtSignal
+from PyQt5.QtGui import QPainter, QColor, QPen
+from PyQt5.QtWidgets import QWidget
+
+from timecode import format_timecode
+
+# Tick intervals in ms, from a millisecond to a day
+tickintervals = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 15000, 30000, 60000, 120000, 300000, 600000,
+                 900000, 1800000, 3600000, 7200000, 10800000, 21600000, 43200000, 86400000]
+
+# Least spacing in pixels of labelled ticks, and of unlabelled ticks between them
+labelspacing = 80
+tickspacing = 8
+
+def tick_interval(span, width, spacing):
+    # Returns shortest tick interval in ms leaving at least spacing pixels between ticks
+    for interval in tickintervals:
+        if interval * width >= spacing * span:
+            return interval
+
+    return tickintervals[-1]
+
+class SeekBar(QWidget):
+    # Seek bar showing a window of the video, which can be zoomed with the wheel down to a few frames and panned
+    # by dragging with the right or middle button, or with the wheel while holding shift. Seeks are given in ms.
+    # Only ticks in view are drawn, so drawing takes as long for a 10 hour video as for a 10 second one
+    moved = pyqtSignal(int)
+    released = pyqtSignal(int)
+    viewChanged = pyqtSignal(int, int)
+
+    def __init__(self, height=32, parent=None):
+        super(SeekBar, self).__init__(parent)
+        self.setFixedHeight(height)
+        self.setToolTip("Seek. Scroll to zoom, shift+scroll or right-drag to pan, double-click to show whole video")
+
+        self.duration = 0
+        self.fps = None
+        self.time = 0
+        self.viewstart, self.viewend = 0, 0
+
+        self.seeking = False
+        self.panfrom = None
+
+    def set_duration(self, duration):
+        self.duration = duration
+        self.set_view(0, duration)
+
+    def set_fps(self, fps):
+        self.fps = fps
+        self.update()
+
+    def set_time(self, time):
+        # While zoomed in, view moves on by a page when the playhead leaves it
+        oldx, self.time = self._x(self.time), time
+        span = self.viewend - self.viewstart
+
+        if (not self.seeking) & (self.panfrom is None) & ((time < self.viewstart) | (time > self.viewend)) & (span < self.duration):
+            self.set_view(time - span // 10, time - span // 10 + span)
+        elif oldx != self._x(time):
+            self.update()
+
+    def min_span(self):
+        # Narrowest view holds ten frames
+        return max(int(10000 / self.fps), 10) if self.fps else 100
+
+    def set_view(self, start, end):
+        # Clamps view to video, keeping its length where possible
+        span = min(max(int(end - start), self.min_span()), self.duration)
+        start = min(max(int(start), 0), self.duration - span)
+
+        if (start, start + span) != (self.viewstart, self.viewend):
+            self.viewstart, self.viewend = start, start + span
+            self.viewChanged.emit(self.viewstart, self.viewend)
+        self.update()
+
+    def zoom(self, factor, center=None):
+        # Zooms view by factor around time center, which stays under the same pixel
+        center = self.time if center is None else center
+        span = self.viewend - self.viewstart
+        newspan = min(max(span * factor, self.min_span()), self.duration)
+        ratio = (center - self.viewstart) / max(span, 1)
+        self.set_view(center - ratio * newspan, center - ratio * newspan + newspan)
+
+    def pan(self, delta):
+        self.set_view(self.viewstart + delta, self.viewend + delta)
+
+    def ms_per_pixel(self):
+        return 1 / self._scale()
+
+    def _scale(self):
+        return self.width() / max(self.viewend - self.viewstart, 1)
+
+    def _x(self, time):
+        return int(round((time - self.viewstart) * self._scale()))
+
+    def _time(self, x):
+        return min(max(int(round(self.viewstart + x / self._scale())), 0), self.duration)
+
+    # Mouse
+
+    def mousePressEvent(self, event):
+        if self.duration <= 0:
+            return
+
+        if event.button() == Qt.LeftButton:
+            self.seeking = True
+            self.time = self._time(event.x())
+            self.moved.emit(self.time)
+            self.update()
+        elif event.button() in (Qt.RightButton, Qt.MiddleButton):
+            self.panfrom = (event.x(), self.viewstart)
+
+    def mouseMoveEvent(self, event):
+        if self.seeking:
+            time = self._time(event.x())
+            if time != self.time:
+                self.time = time
+                self.moved.emit(time)
+                self.update()
+        elif self.panfrom is not None:
+            x, start = self.panfrom
+            span = self.viewend - self.viewstart
+            self.set_view(start - (event.x() - x) / self._scale(), start - (event.x() - x) / self._scale() + span)
+
+    def mouseReleaseEvent(self, event):
+        if self.seeking & (event.button() == Qt.LeftButton):
+            self.seeking = False
+            self.released.emit(self._time(event.x()))
+        elif event.button() in (Qt.RightButton, Qt.MiddleButton):
+            self.panfrom = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.set_view(0, self.duration)
+
+    def wheelEvent(self, event):
+        if self.duration <= 0:
+            return
+
+        delta = event.angleDelta()
+        steps = (delta.y() or delta.x()) / 120
+        span = self.viewend - self.viewstart
+
+        if (event.modifiers() & Qt.ShiftModifier) | (abs(delta.x()) > abs(delta.y())):
+            self.pan(-steps * span / 10)
+        else:
+            self.zoom(0.8 ** steps, self._time(event.x()))
+
+    # Drawing
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().window())
+
+        width, height = self.width(), self.height()
+        span = self.viewend - self.viewstart
+        groove = QRect(0, height // 2 - 3, width, 6)
+        painter.fillRect(groove, QColor(200, 200, 200))
+
+        if span <= 0:
+            painter.end()
+            return
+
+        # Part of view already played
+        painter.fillRect(QRect(0, groove.y(), min(max(self._x(self.time), 0), width), groove.height()), QColor(90, 140, 220))
+
+        # Frame boundaries once frames are far enough apart, otherwise unlabelled ticks
+        painter.setPen(QColor(120, 120, 120))
+        if bool(self.fps) and (1000 / self.fps * self._scale() >= tickspacing):
+            first = int(self.viewstart * self.fps / 1000)
+            ticks = [frame * 1000 / self.fps for frame in range(first, int(self.viewend * self.fps / 1000) + 2)]
+        else:
+            interval = tick_interval(span, width, tickspacing)
+            ticks = range(self.viewstart - self.viewstart % interval, self.viewend + interval, interval)
+
+        for time in ticks:
+            painter.drawLine(self._x(time), groove.bottom() + 1, self._x(time), groove.bottom() + 4)
+
+        # Labelled ticks
+        interval = tick_interval(span, width, labelspacing)
+        fmt = "hmsms" if interval < 1000 else "hms"
+        painter.setPen(self.palette().windowText().color())
+        for time in range(self.viewstart - self.viewstart % interval, self.viewend + interval, interval):
+            x = self._x(time)
+            painter.drawLine(x, groove.y() - 4, x, groove.bottom() + 6)
+            painter.drawText(QRect(x + 3, 0, labelspacing, groove.y()), Qt.AlignLeft | Qt.AlignBottom, format_timecode(time, fmt))
+
+        # Position of view within video, while zoomed in
+        if span < self.duration:
+            painter.fillRect(QRect(int(self.viewstart / self.duration * width), height - 2, max(int(span / self.duration * width), 2), 2),
+                             QColor(90, 140, 220))
+
+        painter.setPen(QPen(QColor("red"), 2))
+        painter.drawLine(self._x(self.time), 0, self._x(self.time), height)
+        painter.end()
+
+class TimelineStrip(QWidget):
+    # Strip under the seek bar drawing the part of the video in view, with a playhead. Shows whole video until a view
+    # is set. Subclasses redraw in _view_changed. Left clicks emit the time clicked
+    clicked = pyqtSignal(int)
+
+    def __init__(self, height, parent=None):
+        super(TimelineStrip, self).__init__(parent)
+        self.setFixedHeight(height)
+
+        self.duration = 0
+        self.viewstart, self.viewend = 0, 0
+        self.playhead = 0
+
+    def set_duration(self, duration):
+        if self.viewend in (0, self.duration):
+            self.set_view(0, duration)
+        self.duration = duration
+
+    def set_view(self, start, end):
+        if (start, end) != (self.viewstart, self.viewend):
+            self.viewstart, self.viewend = start, end
+            self._view_changed()
+
+    def _view_changed(self):
+        self.update()
+
+    def set_playhead(self, time):
+        # Repaints only the columns the playhead leaves and enters
+        oldx, self.playhead = self._x(self.playhead), time
+        newx = self._x(time)
+        if oldx != newx:
+            self.update(QRect(oldx - 1, 0, 3, self.height()))
+            self.update(QRect(newx - 1, 0, 3, self.height()))
+
+    def _scale(self):
+        return self.width() / max(self.viewend - self.viewstart, 1)
+
+    def _x(self, time):
+        return int((time - self.viewstart) * self._scale())
+
+    def _time(self, x):
+        return int(round(self.viewstart + x / self._scale()))
+
+    def _draw_playhead(self, painter):
+        painter.setPen(QColor("red"))
+        painter.drawLine(self._x(self.playhead), 0, self._x(self.playhead), self.height())
+
+    def mousePressEvent(self, event):
+        if (event.button() == Qt.LeftButton) & (self.viewend > self.viewstart):
+            self.clicked.emit(self._time(event.x()))
@@ -0,0 +1,224 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from sys import getsizeof
+
+from numpy import int64, asarray
+from pandas import unique
+
+# Approximate fixed cost of a command object, in bytes
+cmdoverhead = 200
+
+def _frame_size(df):
+    return 0 if df is None else int(df.memory_usage(index=False, deep=True).sum())
+
+class CellChange:
+    # Changes the value of one annotation cell
+    def __init__(self, annotmodel, row, col, value):
+        self.annotmodel = annotmodel
+        self.row, self.col = row, col
+        self.old = annotmodel.annot.iat[row, col]
+        self.new = value
+        self.size = cmdoverhead + getsizeof(self.old) + getsizeof(self.new)
+
+    def redo(self):
+        self.annotmodel.set_value(self.row, self.col, self.new)
+
+    def undo(self):
+        self.annotmodel.set_value(self.row, self.col, self.old)
+
+class RowInsert:
+    # Inserts one annotation row
+    def __init__(self, annotmodel, row, values):
+        self.annotmodel = annotmodel
+        self.row = row
+        self.values = tuple(values)
+        self.size = cmdoverhead + sum(map(getsizeof, self.values))
+
+    def redo(self):
+        self.annotmodel.insert_row(self.row, self.values)
+
+    def undo(self):
+        self.annotmodel.remove_row(self.row)
+
+class RowDelete:
+    # Deletes one annotation row. Row values are kept to restore it
+    def __init__(self, annotmodel, row):
+        self.annotmodel = annotmodel
+        self.row = row
+        self.values = tuple(annotmodel.annot.iloc[row])
+        self.size = cmdoverhead + sum(map(getsizeof, self.values))
+
+    def redo(self):
+        self.annotmodel.remove_row(self.row)
+
+    def undo(self):
+        self.annotmodel.insert_row(self.row, self.values)
+
+class BlockChange:
+    # Sets the same rows of one or more columns at once, e.g. to relabel rows or shift segments. Old values are kept
+    # column by column
+    def __init__(self, annotmodel, rows, cols, columns):
+        self.annotmodel = annotmodel
+        self.rows = asarray(rows, dtype=int64)
+        self.cols = list(cols)
+        self.old = [annotmodel.annot.iloc[self.rows, col].to_numpy(dtype=object) for col in self.cols]
+        self.new = [asarray(values, dtype=object) for values in columns]
+        self.size = cmdoverhead + self.rows.nbytes + sum(values.nbytes for values in self.old + self.new)
+
+    def redo(self):
+        self.annotmodel.set_block(self.rows, self.cols, self.new)
+
+    def undo(self):
+        self.annotmodel.set_block(self.rows, self.cols, self.old)
+
+class RowsInsert:
+    # Inserts annotation rows so that they end up at rows, given in ascending order
+    def __init__(self, annotmodel, rows, annot):
+        self.annotmodel = annotmodel
+        self.rows = asarray(rows, dtype=int64)
+        self.annot = annot.reset_index(drop=True)
+        self.size = cmdoverhead + self.rows.nbytes + _frame_size(self.annot)
+
+    def redo(self):
+        self.annotmodel.insert_rows(self.rows, self.annot)
+
+    def undo(self):
+        self.annotmodel.remove_rows(self.rows)
+
+class RowsDelete:
+    # Deletes annotation rows, given in ascending order. Row values are kept to restore them
+    def __init__(self, annotmodel, rows):
+        self.annotmodel = annotmodel
+        self.rows = asarray(rows, dtype=int64)
+        # Labels are kept as text, as the size of a categorical counts every label registered
+        self.annot = annotmodel.annot.iloc[self.rows].reset_index(drop=True).astype({"label" : object})
+        self.size = cmdoverhead + self.rows.nbytes + _frame_size(self.annot)
+
+    def redo(self):
+        self.annotmodel.remove_rows(self.rows)
+
+    def undo(self):
+        self.annotmodel.insert_rows(self.rows, self.annot)
+
+class TableReset:
+    # Replaces all annotations, e.g. on import or when table is cleared. old defaults to the annotations in the model
+    def __init__(self, annotmodel, annot, old=None):
+        self.annotmodel = annotmodel
+        self.old = annotmodel.annot if old is None else old
+        self.new = annot
+        self.size = cmdoverhead + _frame_size(self.old) + _frame_size(self.new)
+
+    def redo(self):
+        self.annotmodel.set_annot(self.new)
+
+    def undo(self):
+        self.annotmodel.set_annot(self.old)
+
+class LabelListSwap:
+    # Replaces label drop-down list. Annotation labels are matched to the new list, and only labels that change are kept
+    def __init__(self, annotmodel, labelmodel, setlabel, oldlabel, newlabel):
+        self.annotmodel = annotmodel
+        self.labelmodel = labelmodel
+        self.setlabel = setlabel
+        self.old, self.new = oldlabel, newlabel
+        self.rows = None
+        self.oldlabels = self.newlabels = None
+        self.size = cmdoverhead + _frame_size(self.old) + _frame_size(self.new)
+
+    def redo(self):
+        self.setlabel(self.new)
+
+        if (self.new is None) or self.annotmodel.annot.empty:
+            return
+
+        # Finds changed labels on first run. Later runs start from the same annotations
+        if self.rows is None:
+            labels = self.annotmodel.annot["label"].to_numpy()
+            newlabels = self.labelmodel.canonical(self.annotmodel.annot["label"])
+            self.rows = (labels != newlabels).nonzero()[0]
+            self.oldlabels, self.newlabels = labels[self.rows], newlabels[self.rows]
+            # Labels are shared with the label list, so each is counted once
+            self.size += self.oldlabels.nbytes + self.newlabels.nbytes + sum(map(getsizeof, unique(self.newlabels)))
+
+        self.annotmodel.set_values(self.rows, 3, self.newlabels)
+
+    def undo(self):
+        if self.rows is not None:
+            self.annotmodel.set_values(self.rows, 3, self.oldlabels)
+
+        self.setlabel(self.old)
+
+class MacroCommand:
+    # Groups commands into a single undo step
+    def __init__(self, commands):
+        self.commands = list(commands)
+
+    @property
+    def size(self):
+        return sum(command.size for command in self.commands)
+
+    def redo(self):
+        for command in self.commands:
+            command.redo()
+
+    def undo(self):
+        for command in reversed(self.commands):
+            command.undo()
+
+class UndoStack:
+    # Keeps edit history in memory. Oldest commands are dropped once history exceeds maxbytes
+    def __init__(self, maxbytes=64*1024*1024):
+        self.maxbytes = maxbytes
+        self.commands = []
+        self.index = 0
+        self.nbytes = 0
+
+    def push(self, command):
+        command.redo()
+
+        # Discards commands that were undone
+        for undone in self.commands[self.index:]:
+            self.nbytes -= undone.size
+        del self.commands[self.index:]
+
+        self.commands.append(command)
+        self.index += 1
+        self.nbytes += command.size
+        self._trim()
+
+    def undo(self):
+        if not self.can_undo():
+            return None
+
+        self.index -= 1
+        command = self.commands[self.index]
+        command.undo()
+        return command
+
+    def redo(self):
+        if not self.can_redo():
+            return None
+
+        command = self.commands[self.index]
+        command.redo()
+        self.index += 1
+        return command
+
+    def can_undo(self):
+        return self.index > 0
+
+    def can_redo(self):
+        return self.index < len(self.commands)
+
+    def clear(self):
+        self.commands = []
+        self.index = 0
+        self.nbytes = 0
+
+    def _trim(self):
+        # Keeps at least the latest command so it can always be undone
+        while (self.nbytes > self.maxbytes) and (len(self.commands) > 1):
+            command = self.commands.pop(0)
+            self.nbytes -= command.size
+            self.index -= 1
@@ -0,0 +1,151 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from sys import argv, exit
+
+from numpy import int64, array, full, concatenate, nonzero, lexsort
+from pandas import DataFrame, Series
+
+from annotio import annothdg, read_table
+from timecode import format_timecode, decode_time_columns
+
+# Issues reported, with the column each one is marked on:
+#   missing     start_time or end_time is empty
+#   inverted    end_time is not after start_time. Marked on end_time
+#   duration    start_time or end_time is past the end of the video
+#   overlap     segment overlaps another segment with the same label in the same video. Marked on label
+#   gap         time between segments of a video is longer than maxgap. Marked on start_time. Only checked if maxgap is set
+issuehdg = ["row", "col", "issue", "message"]
+
+def _issues(rows, col, issue, messages):
+    # Issues are gathered as arrays and only made into a frame once all checks have run
+    rows = array(rows, dtype=int64)
+    messages = full(len(rows), messages, dtype=object) if isinstance(messages, str) else array(messages, dtype=object)
+    return rows, full(len(rows), col, dtype=int64), full(len(rows), issue, dtype=object), messages
+
+def _overlap_messages(partners, firstrow=1):
+    # Rows are numbered from firstrow, as they are shown where issues are reported
+    return ["Overlaps row %d, which has the same label." %(row + firstrow) for row in partners]
+
+def _row_issues(annot, rows, duration=None):
+    # Checks that only need the row itself. Returns list of issues
+    starts = annot["start_time"].to_numpy(dtype="float64", na_value=float("nan"))
+    ends = annot["end_time"].to_numpy(dtype="float64", na_value=float("nan"))
+    found = []
+
+    for col, times in ((1, starts), (2, ends)):
+        missing = rows[times != times]
+        found.append(_issues(missing, col, "missing", "Time is empty."))
+
+    inverted = rows[ends <= starts]
+    found.append(_issues(inverted, 2, "inverted", "End time is not after start time."))
+
+    if (duration is not None) and (duration > 0):
+        message = "Time is past the end of the video (%s)." %format_timecode(duration)
+        for col, times in ((1, starts), (2, ends)):
+            found.append(_issues(rows[times > duration], col, "duration", message))
+
+    return found
+
+def _sorted(found):
+    # Joins issues into one frame, sorted by row, then column
+    found = [_issues([], 0, "", [])] + found
+    columns = [concatenate([issues[k] for issues in found]) for k in range(len(issuehdg))]
+    order = lexsort((columns[1], columns[0]))
+
+    return DataFrame({hdg : column[order] for hdg, column in zip(issuehdg, columns)})
+
+def check_annotations(annot, duration=None, maxgap=None, firstrow=1):
+    # Checks all rows at once, column-wise. Returns one row per issue, in row order. Rows other rows are said to
+    # overlap with are numbered from firstrow
+    annot = annot.reset_index(drop=True)
+    found = _row_issues(annot, annot.index.to_numpy(), duration)
+
+    # Sorts segments with both times by video, label and start, so segments that can overlap are next to each other.
+    # Inverted segments span no time, so are left out of overlaps and gaps, as in check_rows
+    starts = annot["start_time"].to_numpy(dtype="float64", na_value=float("nan"))
+    ends = annot["end_time"].to_numpy(dtype="float64", na_value=float("nan"))
+    rows = nonzero(ends > starts)[0]
+    starts, ends = starts[rows].astype(int64), ends[rows].astype(int64)
+    videos = annot["video_file"].astype(str).to_numpy()[rows]
+    labels = annot["label"].astype(str).to_numpy()[rows]
+
+    order = lexsort((rows, starts, labels, videos))
+    rows, starts, ends, videos, labels = rows[order], starts[order], ends[order], videos[order], labels[order]
+
+    # A segment overlaps an earlier one if it starts before the latest end seen so far in its group
+    group = Series((videos != concatenate([[None], videos[:-1]])) | (labels != concatenate([[None], labels[:-1]]))).cumsum().to_numpy()
+    maxend = Series(ends).groupby(group).cummax().to_numpy()
+    maxrow = Series(rows.astype("float64")).where(ends == maxend).groupby(group).ffill().to_numpy()
+    prevend = Series(maxend).groupby(group).shift(1).to_numpy()
+    prevrow = Series(maxrow).groupby(group).shift(1).to_numpy()
+
+    overlap = (starts < prevend) & (labels != "")
+    partners = prevrow[overlap].astype(int64)
+    found.append(_issues(rows[overlap], 3, "overlap", _overlap_messages(partners, firstrow)))
+    found.append(_issues(partners, 3, "overlap", _overlap_messages(rows[overlap], firstrow)))
+
+    if maxgap is not None:
+        # Gaps are measured between segments of the same video, regardless of label
+        order = lexsort((starts, videos))
+        gstarts, gvideos, grows = starts[order], videos[order], rows[order]
+        group = Series(gvideos != concatenate([[None], gvideos[:-1]])).cumsum().to_numpy()
+        prevend = Series(ends[order]).groupby(group).cummax().groupby(group).shift(1).to_numpy()
+        gap = gstarts - prevend > maxgap
+        found.append(_issues(grows[gap], 1, "gap", "Gap before segment is longer than %s." %format_timecode(maxgap)))
+
+    issues = _sorted(found)
+    return issues.drop_duplicates(["row", "col", "issue"]).reset_index(drop=True)
+
+def check_rows(annot, intervals, rows, duration=None):
+    # Checks given rows only. Overlaps are found through the interval index instead of comparing with every row
+    rows = array(sorted(rows), dtype=int64)
+    found = _row_issues(annot.iloc[rows], rows, duration)
+
+    videos = annot["video_file"].astype(str).to_numpy()
+    labels = annot["label"].astype(str).to_numpy()
+    starts = annot["start_time"].to_numpy(dtype="float64", na_value=float("nan"))
+    ends = annot["end_time"].to_numpy(dtype="float64", na_value=float("nan"))
+    overlaprows, partners = [], []
+
+    for row in rows:
+        # Inverted segments are left out of overlaps on both sides, as in check_annotations
+        if (labels[row] == "") or not (ends[row] > starts[row]):
+            continue
+
+        others = intervals.overlap(int(starts[row]), int(ends[row]))
+        others = others[(others != row) & (labels[others] == labels[row]) & (videos[others] == videos[row]) &
+                        (ends[others] > starts[others])]
+        if len(others) > 0:
+            overlaprows.append(row)
+            partners.append(int(others.min()))
+
+    found.append(_issues(overlaprows, 3, "overlap", _overlap_messages(partners)))
+    return _sorted(found)
+
+def main(fpaths, duration=None, maxgap=None):
+    # Checks annotation files in full and prints every issue. Returns number of issues found
+    total = 0
+
+    for fpath in fpaths:
+        # Rows are not deduplicated, so issues point at lines of the file, below the header. Unreadable times are
+        # emptied, and so already reported as missing
+        df = read_table(fpath, annothdg)
+        decode_time_columns(df)
+        issues = check_annotations(df, duration, maxgap, firstrow=2)
+
+        for row, col, issue, message in issues.itertuples(index=False):
+            print("%s:%d: %s: %s: %s" %(fpath, row + 2, annothdg[col], issue, message))
+
+        total += len(issues)
+
+    print("%d issue(s) found in %d file(s)." %(total, len(fpaths)))
+    return total
+
+if __name__ == "__main__":
+    # Usage: validation.py [--duration=MS] [--maxgap=MS] file.csv ...
+    options = dict(arg[2:].split("=", 1) for arg in argv[1:] if arg.startswith("--"))
+    fpaths = [arg for arg in argv[1:] if not arg.startswith("--")]
+    duration, maxgap = (int(options[k]) if k in options else None for k in ("duration", "maxgap"))
+
+    exit(1 if main(fpaths, duration, maxgap) > 0 else 0)
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from ctypes import POINTER, cast
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from vlc import EventType, MediaParseFlag, MediaParsedStatus, Meta, TrackType, VideoTrack
+
+class EventRelay(QObject):
+    # Re-emits a libvlc event on the GUI thread. libvlc calls back on its own threads, where widgets must not be used.
+    # getvalue reads what is needed from the event inside the callback, as the event is only valid until it returns
+    fired = pyqtSignal(object)
+
+    def __init__(self, eventmanager, eventtype, getvalue=None, parent=None):
+        super(EventRelay, self).__init__(parent)
+        self.eventmanager = eventmanager
+        self.eventtype = eventtype
+        self.getvalue = getvalue
+        self.eventmanager.event_attach(self.eventtype, self._callback)
+
+    def _callback(self, event):
+        # Signal is queued to receivers on the GUI thread
+        self.fired.emit(self.getvalue(event) if self.getvalue is not None else None)
+
+    def detach(self):
+        self.eventmanager.event_detach(self.eventtype)
+
+def video_fps(media):
+    # Returns frame rate of first video track, or None if not known. libvlc holds the audio, video and subtitle track
+    # pointers in one union, at the offset python-vlc gives audio, while its video field overlaps the bitrate
+    for track in media.tracks_get() or []:
+        if (track.type == TrackType.video) and track.audio:
+            video = cast(track.audio, POINTER(VideoTrack)).contents
+            if video.frame_rate_den > 0:
+                return video.frame_rate_num / video.frame_rate_den
+
+    return None
+
+class MediaParser(QObject):
+    # Parses media metadata in the background. Emits parsed with title, duration in ms and fps, any of which may be
+    # None if not known, or failed if parsing fails or does not finish within timeout ms
+    parsed = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, media, timeout=5000, parent=None):
+        super(MediaParser, self).__init__(parent)
+        self.media = media
+        self.timeout = timeout
+        self.finished = False
+
+        self.relay = EventRelay(media.event_manager(), EventType.MediaParsedChanged, lambda event : event.u.new_status, self)
+        self.relay.fired.connect(self._on_status)
+
+        # libvlc also times out, but it does not report back if the parser thread is stuck
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(timeout + 1000)
+        self.timer.timeout.connect(lambda : self._finish(MediaParsedStatus.timeout))
+
+    def start(self):
+        self.timer.start()
+        # Local files are always parsed. Network flag also allows media on network shares
+        if self.media.parse_with_options(MediaParseFlag.network, self.timeout) == -1:
+            self._finish(MediaParsedStatus.failed)
+
+    def cancel(self):
+        # Stops parsing without reporting back, e.g. when another video is opened
+        if not self.finished:
+            self.finished = True
+            self.timer.stop()
+            self.relay.detach()
+            self.media.parse_stop()
+
+    def _on_status(self, status):
+        self._finish(status)
+
+    def _finish(self, status):
+        if self.finished:
+            return
+
+        self.finished = True
+        self.timer.stop()
+        self.relay.detach()
+
+        if status == MediaParsedStatus.done:
+            duration = self.media.get_duration()
+            self.parsed.emit({"title" : self.media.get_meta(Meta.Title), "duration" : duration if duration > 0 else None,
+                              "fps" : video_fps(self.media)})
+        elif status == MediaParsedStatus.timeout:
+            self.failed.emit("Reading video information timed out.")
+        else:
+            self.failed.emit("Video information could not be read.")
@@ -0,0 +1,272 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*
+
+from os import stat, replace, access, W_OK
+from os.path import join, dirname, abspath
+from hashlib import sha1
+from subprocess import Popen, PIPE, DEVNULL
+from tempfile import gettempdir, TemporaryFile
+
+from PyQt5.QtCore import QLine
+from PyQt5.QtGui import QPainter, QPixmap, QColor
+
+from numpy import int16, int64, float32, arange, empty, zeros, concatenate, minimum, maximum, frombuffer, fromfile, memmap, clip
+
+from media import av, BackgroundLoader
+from timeline import TimelineStrip
+
+# Audio is decoded to mono at samplerate. Finest peaks cover binsize samples, 8 ms
+samplerate = 16000
+binsize = 128
+
+# Peak file: magic, then header of int64 fields (video size, video mtime, sample rate, bin size, number of levels,
+# bins in each level), then min/max pairs of every level as int16, finest level first
+magic = b"VAPEAKS1"
+headerfields = 64
+headerbytes = len(magic) + 8 * headerfields
+
+def peaks_fpath(fpath):
+    return fpath + ".peaks"
+
+def _fallback_fpath(fpath):
+    # Peak file of a video in a read-only folder goes to the temp folder instead
+    return join(gettempdir(), sha1(fpath.encode("utf-8")).hexdigest() + ".peaks")
+
+def _decode_with_av(fpath):
+    with av.open(fpath) as container:
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=samplerate)
+        for frame in container.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                yield resampled.to_ndarray().reshape(-1)
+
+def _decode_with_ffmpeg(fpath, chunkbytes=1 << 18):
+    process = Popen(["ffmpeg", "-v", "error", "-i", fpath, "-vn", "-ac", "1", "-ar", str(samplerate), "-f", "f32le", "-"],
+                    stdout=PIPE, stderr=DEVNULL)
+    try:
+        leftover = b""
+        while True:
+            data = process.stdout.read(chunkbytes)
+            if len(data) == 0:
+                break
+            data, leftover = leftover + data, b""
+            if len(data) % 4 != 0:
+                data, leftover = data[:len(data) - len(data) % 4], data[len(data) - len(data) % 4:]
+            yield frombuffer(data, dtype=float32)
+    finally:
+        process.kill()
+        process.wait()
+
+def decode_audio(fpath):
+    # Yields mono float samples of first audio stream in chunks. Raises OSError if no decoder is available
+    try:
+        yield from (_decode_with_av(fpath) if av is not None else _decode_with_ffmpeg(fpath))
+    except FileNotFoundError as error:
+        if (av is None) and (error.filename == "ffmpeg"):
+            raise OSError("Waveform cannot be read without PyAV or ffmpeg.")
+        raise
+    except OSError:
+        raise
+    except Exception as error:
+        raise OSError("Waveform could not be read: %s" %error)
+
+class _Level:
+    # Writes bins of one level to a temporary file as they arrive, and passes pairs of bins on to the next level.
+    # Only an odd bin waiting for its partner is held in memory
+    def __init__(self):
+        self.file = TemporaryFile()
+        self.count = 0
+        self.carry = empty((0, 2), dtype=int16)
+        self.next = None
+
+    def add(self, bins):
+        if len(bins) == 0:
+            return
+
+        bins.tofile(self.file)
+        self.count += len(bins)
+
+        bins = concatenate((self.carry, bins))
+        pairs = len(bins) // 2
+        self.carry = bins[2 * pairs:]
+
+        if pairs > 0:
+            if self.next is None:
+                self.next = _Level()
+            pairs = bins[:2 * pairs].reshape(pairs, 2, 2)
+            self.next.add(concatenate((pairs[:, :, 0].min(axis=1)[:, None], pairs[:, :, 1].max(axis=1)[:, None]), axis=1))
+
+    def finish(self):
+        # Returns this level and those above it. Last odd bin of each level is passed on alone, so that each level
+        # covers all audio
+        levels, level = [], self
+        while level is not None:
+            if (len(level.carry) > 0) & (level.next is not None):
+                level.next.add(level.carry)
+                level.carry = level.carry[:0]
+            levels.append(level)
+            level = level.next
+
+        return levels
+
+def _bin_peaks(samples):
+    bins = (clip(samples, -1, 1) * 32767).astype(int16).reshape(-1, len(samples) if len(samples) < binsize else binsize)
+    return concatenate((bins.min(axis=1)[:, None], bins.max(axis=1)[:, None]), axis=1)
+
+def build_peaks(fpath, outfpath):
+    # Decodes audio in chunks into min/max pyramid and writes it to outfpath. Memory use does not grow with video length
+    info = stat(fpath)
+    base = _Level()
+    pending = empty(0, dtype=float32)
+
+    for samples in decode_audio(fpath):
+        pending = concatenate((pending, samples))
+        full = len(pending) // binsize
+        if full > 0:
+            base.add(_bin_peaks(pending[:full * binsize]))
+            pending = pending[full * binsize:]
+
+    if len(pending) > 0:
+        base.add(_bin_peaks(pending))
+
+    levels = base.finish()[:headerfields - 5]
+    header = zeros(headerfields, dtype=int64)
+    header[:5] = info.st_size, info.st_mtime_ns, samplerate, binsize, len(levels)
+    header[5:5 + len(levels)] = [level.count for level in levels]
+
+    tmpfpath = outfpath + ".tmp"
+    with open(tmpfpath, "wb") as file:
+        file.write(magic)
+        header.tofile(file)
+        for level in levels:
+            level.file.seek(0)
+            while True:
+                data = level.file.read(1 << 20)
+                if len(data) == 0:
+                    break
+                file.write(data)
+            level.file.close()
+
+    replace(tmpfpath, outfpath)
+
+class PeakPyramid:
+    # Min/max peaks of audio at halving resolutions, memory-mapped from peak file. Peaks for a view are read from the
+    # coarsest level still finer than a pixel, so reading a view costs about the same at any zoom
+    def __init__(self, fpath):
+        with open(fpath, "rb") as file:
+            if file.read(len(magic)) != magic:
+                raise ValueError("Not a peak file.")
+            self.header = fromfile(file, dtype=int64, count=headerfields)
+
+        self.samplerate, self.binsize, nlevels = map(int, self.header[2:5])
+        counts = [int(count) for count in self.header[5:5 + nlevels]]
+        total = sum(counts)
+        self.data = memmap(fpath, dtype=int16, mode="r", offset=headerbytes, shape=(total, 2)) if total > 0 else zeros((0, 2), dtype=int16)
+
+        self.levels = []
+        offset = 0
+        for count in counts:
+            self.levels.append(self.data[offset:offset + count])
+            offset += count
+
+    def matches(self, fpath):
+        info = stat(fpath)
+        return (int(self.header[0]) == info.st_size) and (int(self.header[1]) == info.st_mtime_ns)
+
+    def bin_ms(self, level):
+        return self.binsize * 2 ** level * 1000 / self.samplerate
+
+    def peaks(self, start, end, width):
+        # Returns min and max peaks between -1 and 1 for each of width pixels from start to end ms
+        if (len(self.levels) == 0) | (end <= start) | (width <= 0):
+            return zeros(max(width, 0)), zeros(max(width, 0))
+
+        mspp = (end - start) / width
+        level = 0
+        while (level + 1 < len(self.levels)) and (self.bin_ms(level + 1) <= mspp):
+            level += 1
+
+        bins = self.levels[level]
+        binms = self.bin_ms(level)
+        edges = (start + arange(width + 1) * mspp) / binms
+        edges = clip(edges.astype(int64), 0, len(bins))
+        lo, hi = int(edges[0]), int(max(edges[-1], edges[0] + 1))
+        window = bins[lo:min(hi, len(bins))]
+
+        mins, maxs = zeros(width), zeros(width)
+        if len(window) == 0:
+            return mins, maxs
+
+        # Each pixel reduces bins up to where the next pixel starts. Pixels narrower than a bin take the bin under them
+        starts = minimum(edges[:-1] - lo, len(window) - 1)
+        inside = edges[:-1] < len(bins)
+        mins[inside] = minimum.reduceat(window[:, 0], starts)[inside]
+        maxs[inside] = maximum.reduceat(window[:, 1], starts)[inside]
+        return mins / 32767, maxs / 32767
+
+def load_peaks(fpath):
+    # Returns pyramid of video from its peak file, or None if there is none or video has changed since it was written
+    for peakfpath in (peaks_fpath(fpath), _fallback_fpath(fpath)):
+        try:
+            pyramid = PeakPyramid(peakfpath)
+            if pyramid.matches(fpath):
+                return pyramid
+        except (OSError, ValueError):
+            pass
+
+    return None
+
+class WaveformLoader(BackgroundLoader):
+    # Builds peak file on a background thread, or maps an existing one if video has not changed
+    def load(self, fpath):
+        pyramid = load_peaks(fpath)
+
+        if pyramid is None:
+            outfpath = peaks_fpath(fpath) if access(dirname(abspath(fpath)), W_OK) else _fallback_fpath(fpath)
+            build_peaks(fpath, outfpath)
+            pyramid = PeakPyramid(outfpath)
+
+        return pyramid
+
+class WaveformLane(TimelineStrip):
+    # Draws audio peaks of the part of the video in view. Peaks are drawn to a pixmap when view or size changes only
+    def __init__(self, height=40, parent=None):
+        super(WaveformLane, self).__init__(height, parent)
+        self.pyramid = None
+        self.pixmap = None
+
+    def set_peaks(self, pyramid):
+        self.pyramid = pyramid
+        self._view_changed()
+
+    def _view_changed(self):
+        self.pixmap = None
+        self.update()
+
+    def _draw(self):
+        self.pixmap = QPixmap(max(self.width(), 1), self.height())
+        self.pixmap.fill(QColor(32, 32, 32))
+
+        if self.pyramid is None:
+            return
+
+        mins, maxs = self.pyramid.peaks(self.viewstart, self.viewend, self.width())
+        middle = self.height() / 2
+        tops = (middle - maxs * middle).astype(int64)
+        bottoms = (middle - mins * middle).astype(int64)
+
+        painter = QPainter(self.pixmap)
+        painter.setPen(QColor(120, 200, 140))
+        painter.drawLines([QLine(x, int(top), x, int(bottom)) for x, (top, bottom) in enumerate(zip(tops, bottoms))])
+        painter.end()
+
+    def resizeEvent(self, event):
+        self.pixmap = None
+
+    def paintEvent(self, event):
+        if self.pixmap is None:
+            self._draw()
+
+        painter = QPainter(self)
+        painter.drawPixmap(event.rect(), self.pixmap, event.rect())
+        self._draw_playhead(painter)
+        painter.end()